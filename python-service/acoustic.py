@@ -0,0 +1,200 @@
+"""
+Spectral, pitch and tone features of an answer window (classifier mode).
+
+features.py describes when somebody speaks; these describe what it sounds
+like: how noise-like the spectrum is, how much the pitch moves, how often
+the waveform crosses zero, and a coarse spectral envelope (MFCC means and
+spreads). The beep features come from the tone beep.BeepDetector tracked
+over the same window, so the classifier and the beep fast path see one
+definition of a beep.
+
+Every per-frame measurement comes out of one real FFT per frame, computed
+for all the frames of a decoded block at once. Frames keep a few float32
+numbers each, not samples, so AcousticFrames follows the block-wise
+pipeline in detector.py without holding the signal. The per-frame values
+are summarized over the answer segments once the VAD has found them.
+"""
+import numpy as np
+
+try:
+    # Single-precision transforms, several times faster than numpy.fft
+    from scipy import fft as _fft
+except ImportError:
+    _fft = np.fft
+
+N_MFCC = 12  # c1..c12; c0 is overall level, which avg_energy already covers
+N_MELS = 26
+
+ACOUSTIC_FEATURE_NAMES = (
+    "spectral_flatness_mean",
+    "spectral_flatness_std",
+    "zcr_mean",
+    "zcr_std",
+    "voiced_ratio",
+    "pitch_std",
+    "beep_duration",
+    "beep_frequency",
+) + tuple(f"mfcc{k}_mean" for k in range(1, N_MFCC + 1)) + tuple(f"mfcc{k}_std" for k in range(1, N_MFCC + 1))
+
+# Analysis band: telephone speech lives in 300-3400 Hz
+BAND_HZ = (100.0, 4000.0)
+PITCH_HZ = (60.0, 400.0)
+VOICING_THRESHOLD = 0.5
+
+# Per-frame columns
+_ZCR, _FLATNESS, _F0, _VOICING = range(4)
+_MFCC = 4
+
+
+def _mel_filterbank(sample_rate: int, n_fft: int, fmin: float, fmax: float) -> np.ndarray:
+    """Triangular (N_MELS, n_fft//2+1) filterbank on the HTK mel scale"""
+    def to_mel(hz):
+        return 2595.0 * np.log10(1.0 + np.asarray(hz) / 700.0)
+
+    def to_hz(mel):
+        return 700.0 * (10.0 ** (np.asarray(mel) / 2595.0) - 1.0)
+
+    edges = to_hz(np.linspace(to_mel(fmin), to_mel(fmax), N_MELS + 2))
+    bins = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    lower, centre, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (bins - lower) / (centre - lower)
+    falling = (upper - bins) / (upper - centre)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def _dct_matrix() -> np.ndarray:
+    """Orthonormal DCT-II rows 1..N_MFCC over N_MELS log-mel bands"""
+    n = np.arange(N_MELS)
+    k = np.arange(1, N_MFCC + 1)[:, None]
+    return (np.sqrt(2.0 / N_MELS) * np.cos(np.pi * k * (2 * n + 1) / (2 * N_MELS))).astype(np.float32)
+
+
+class AcousticFrames:
+    """Per-frame acoustic measurements of a signal pushed one block at a time.
+
+    Frames are ``frame_seconds`` long every ``hop_seconds``; only frames
+    starting inside ``[start_sample, end_sample)`` of the signal are
+    measured (the answer window), the rest are skipped. ``summarize`` turns
+    the frames into a vector ordered as ACOUSTIC_FEATURE_NAMES.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        start_sample: int = 0,
+        end_sample: int = None,
+        frame_seconds: float = 0.032,
+        hop_seconds: float = 0.032,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_length = int(round(frame_seconds * sample_rate))
+        self.hop_length = int(round(hop_seconds * sample_rate))
+        # Twice the frame so the autocorrelation (pitch) is not circular
+        self.n_fft = 1 << int(np.ceil(np.log2(2 * self.frame_length)))
+        self.end_sample = end_sample
+
+        self._window = np.hanning(self.frame_length).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.n_fft, 1.0 / sample_rate)
+        top = min(BAND_HZ[1], sample_rate / 2)
+        self._band = (freqs >= BAND_HZ[0]) & (freqs <= top)
+        self._mel = _mel_filterbank(sample_rate, self.n_fft, BAND_HZ[0], top)
+        self._dct = _dct_matrix()
+        self._lags = (int(sample_rate / PITCH_HZ[1]), min(int(sample_rate / PITCH_HZ[0]), self.frame_length - 1))
+
+        # First frame at or after start_sample, aligned to the hop grid
+        self._next_frame = -(-max(0, start_sample) // self.hop_length) * self.hop_length
+        self._pending = np.empty(0, dtype=np.float32)
+        self._pending_start = 0
+        self.starts = []
+        self._rows = []
+
+    def push(self, block: np.ndarray):
+        """Measure every frame completed by ``block`` (the next samples of the signal)"""
+        signal = np.concatenate((self._pending, block)) if len(self._pending) else block
+        signal_start = self._pending_start
+        signal_end = signal_start + len(signal)
+        if self.end_sample is not None and self._next_frame >= self.end_sample:
+            self._pending, self._pending_start = self._pending[:0], signal_end
+            return
+
+        last_start = signal_end - self.frame_length
+        if self.end_sample is not None:
+            last_start = min(last_start, self.end_sample - 1)
+        if self._next_frame <= last_start:
+            starts = np.arange(self._next_frame, last_start + 1, self.hop_length)
+            frames = np.lib.stride_tricks.sliding_window_view(signal, self.frame_length)[starts - signal_start]
+            self._rows.append(self._measure(frames))
+            self.starts.append(starts)
+            self._next_frame = int(starts[-1]) + self.hop_length
+
+        # Keep only what the next frame needs (at most one frame of samples)
+        drop = min(max(0, self._next_frame - signal_start), len(signal))
+        self._pending = signal[drop:].copy()
+        self._pending_start = signal_start + drop
+
+    def _measure(self, frames: np.ndarray) -> np.ndarray:
+        frames = frames.astype(np.float32, copy=False)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_length - 1)
+
+        spectrum = _fft.rfft(frames * self._window, n=self.n_fft, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        band = power[:, self._band]
+        flatness = np.exp(np.log(band + 1e-12).mean(axis=1)) / (band.mean(axis=1) + 1e-12)
+
+        autocorr = _fft.irfft(power, n=self.n_fft, axis=1)[:, :self._lags[1] + 1]
+        lo, hi = self._lags
+        lag = lo + np.argmax(autocorr[:, lo:hi + 1], axis=1)
+        voicing = autocorr[np.arange(len(frames)), lag] / (autocorr[:, 0] + 1e-12)
+        f0 = self.sample_rate / lag
+
+        log_mel = np.log(power @ self._mel.T + 1e-10)
+        mfcc = log_mel @ self._dct.T
+
+        measured = np.empty((len(frames), _MFCC + N_MFCC), dtype=np.float32)
+        measured[:, _ZCR] = zcr
+        measured[:, _FLATNESS] = flatness
+        measured[:, _F0] = f0
+        measured[:, _VOICING] = voicing
+        measured[:, _MFCC:] = mfcc
+        return measured
+
+    def _all(self):
+        if not self._rows:
+            return np.empty(0, dtype=np.int64), np.empty((0, _MFCC + N_MFCC), dtype=np.float32)
+        return np.concatenate(self.starts), np.concatenate(self._rows)
+
+    def summarize(self, intervals, beep=None) -> np.ndarray:
+        """Summary vector over the frames inside ``intervals``.
+
+        ``intervals`` are ``(start_sample, end_sample)`` pairs in signal
+        samples (the answer segments). Speech statistics use the frames whose
+        centre lies inside a segment. ``beep`` is the tone BeepDetector found
+        in the window (its ``longest``, a beep.Beep) or None; it follows the
+        greeting rather than being part of it, so it is not looked for
+        among the speech frames.
+        """
+        starts, rows = self._all()
+        intervals = np.asarray(intervals, dtype=np.int64).reshape(-1, 2)
+        centres = starts + self.frame_length // 2
+        slot = np.searchsorted(intervals[:, 0], centres, side="right") - 1
+        inside = (slot >= 0) & (centres < intervals[np.maximum(slot, 0), 1]) if len(intervals) else np.zeros(len(starts), bool)
+        speech = rows[inside]
+
+        vector = np.zeros(len(ACOUSTIC_FEATURE_NAMES), dtype=np.float64)
+        if len(speech):
+            vector[0] = speech[:, _FLATNESS].mean()
+            vector[1] = speech[:, _FLATNESS].std()
+            vector[2] = speech[:, _ZCR].mean()
+            vector[3] = speech[:, _ZCR].std()
+            voiced = speech[speech[:, _VOICING] > VOICING_THRESHOLD, _F0]
+            vector[4] = len(voiced) / len(speech)
+            if len(voiced) >= 2:
+                vector[5] = (12.0 * np.log2(voiced / np.median(voiced))).std()
+            vector[8:8 + N_MFCC] = speech[:, _MFCC:].mean(axis=0)
+            vector[8 + N_MFCC:] = speech[:, _MFCC:].std(axis=0)
+
+        if beep is not None:
+            vector[6] = beep.end - beep.start
+            vector[7] = beep.frequency
+        return vector
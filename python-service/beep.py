@@ -0,0 +1,222 @@
+"""
+Voicemail beep detector: the early-exit fast path ahead of the rule engine.
+
+An answering machine's record beep is a steady single-frequency tone, most
+often near 1 kHz. The detector runs a bank of narrow-band (Goertzel-style,
+one DFT bin each) filters over 50 ms frames, one filter every ~8 Hz across
+BEEP_HZ. The ~270 filters of a frame are evaluated together with one batched
+real FFT (the frame zero-padded to at least twice its length) over all the
+frames of a block, keeping only the in-band bins: at this bank size that is far
+cheaper than running the filters one by one. Frames too quiet to hold a
+beep skip the bank altogether.
+
+A frame is tonal when its strongest filter alone holds most of the energy a
+single tone would put there: the frame is one sinusoid. Speech spreads its
+energy over several harmonics, line noise over the whole band, and the dual
+tones of call progress (ringback 440+480 Hz, busy, dial tone) split it
+between two peaks 40 Hz or more apart, which a 50 ms frame resolves. A beep is a
+run of tonal frames that keeps its frequency for at least BEEP_MIN_SECONDS
+and less than BEEP_MAX_SECONDS, and then stops: a tone that hands over to
+a tone of another frequency straight away (within one frame) is part of a
+tone sequence such as the special information tones (SIT) ahead of an
+intercept announcement, and neither tone is a beep.
+
+BeepDetector is fed the decoded signal one block at a time (detector.py) or
+one media frame at a time (streaming.py) and reports the first beep one
+frame after the tone ends, so the caller can stop decoding there. In classifier mode
+detector.py keeps feeding it to the end of the window: the longest tone it
+tracked gives the classifier's beep features (acoustic.py).
+"""
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    # Single-precision transforms, several times faster than numpy.fft
+    from scipy import fft as _fft
+except ImportError:
+    _fft = np.fft
+
+# Tone range searched; filters sit on the DFT bins of a FRAME_SECONDS frame
+# zero-padded to the next power of two at least twice its length (every
+# 7.8 Hz at 8 and 16 kHz). A 50 ms frame separates tones 40 Hz apart
+# (ringback).
+BEEP_HZ = (400.0, 2500.0)
+FRAME_SECONDS = 0.05
+
+# Share of a frame's energy its strongest filter accounts for, relative to a
+# pure tone, for the frame to count as tonal (two equal tones score 0.5)
+TONALITY = 0.7
+# Tones quieter than this (RMS, full scale 1.0) are ignored
+MIN_RMS = 0.01
+BEEP_MIN_SECONDS = 0.2
+# Steady tones this long or longer are not record beeps (one US ringback
+# burst is 2 s; dial/fax tones, music)
+BEEP_MAX_SECONDS = 1.5
+# Frame-to-frame frequency wander allowed within one tone
+MAX_DRIFT_HZ = 20.0
+
+
+class Beep(NamedTuple):
+    """A detected beep, in seconds of the signal fed to the detector"""
+    start: float
+    end: float
+    frequency: float
+    confidence: float
+
+
+@lru_cache(maxsize=8)
+def _filter_bank(sample_rate: int, frame_length: int) -> tuple:
+    """Filter frequencies, the padded frame length and its rfft bins, the Hann window and its tone gain.
+
+    One extra filter on each side of BEEP_HZ gives the edge filters their
+    neighbours. The gain turns a filter's power into the share of the
+    frame's (windowed) energy a pure tone at that filter would have.
+    """
+    n_fft = 1 << int(np.ceil(np.log2(2 * frame_length)))
+    step = sample_rate / n_fft
+    top = min(BEEP_HZ[1], 0.45 * sample_rate)
+    first, last = int(BEEP_HZ[0] // step) - 1, int(top // step) + 1
+    frequencies = np.arange(first, last + 1) * step
+    window = np.hanning(frame_length + 2)[1:-1].astype(np.float32)
+    # A tone A*cos() peaks at (A * sum(w) / 2)^2 with windowed energy A^2 * sum(w^2) / 2
+    gain = 2 * float(np.sum(window ** 2)) / float(np.sum(window)) ** 2
+    return frequencies, n_fft, slice(first, last + 1), window, gain
+
+
+class BeepDetector:
+    """Goertzel-bank tone tracker over a signal pushed one block at a time.
+
+    Only frames starting inside ``[start_sample, end_sample)`` are examined.
+    ``push`` and ``finish`` return the first beep found (a Beep) or None.
+    Tones whose mean tonality (the Beep's confidence) is below
+    ``min_confidence`` are passed over. The detector keeps tracking while it
+    is fed: ``longest`` is the longest tone of beep length seen so far,
+    whatever its confidence.
+    """
+
+    def __init__(self, sample_rate: int, start_sample: int = 0, end_sample: int = None, min_confidence: float = 0.0):
+        self.sample_rate = sample_rate
+        self.min_confidence = min_confidence
+        self.frame_length = int(round(FRAME_SECONDS * sample_rate))
+        self.end_sample = end_sample
+        self.beep = None
+        self.longest = None
+        self.frequencies, self._n_fft, self._bins, self._window, self._gain = _filter_bank(
+            sample_rate, self.frame_length
+        )
+
+        self._next_frame = max(0, start_sample)
+        self._pending = np.empty(0, dtype=np.float32)
+        self._pending_start = 0
+        # Current run of tonal frames: first sample, frame count, frequencies,
+        # tonality sum, and whether it followed another tone straight away
+        self._run = None
+        # The run that ended last and its end sample, held for one frame to
+        # see whether another tone follows it straight away
+        self._ended = None
+
+    def push(self, block: np.ndarray):
+        """Examine every frame completed by ``block`` (the next samples of the signal)"""
+        if self.end_sample is not None and self._next_frame + self.frame_length > self.end_sample:
+            # Past the window: nothing more to examine or to keep
+            return self.beep
+        signal = np.concatenate((self._pending, block)) if len(self._pending) else block
+        signal_start = self._pending_start
+        signal_end = signal_start + len(signal)
+
+        last_start = signal_end - self.frame_length
+        if self.end_sample is not None:
+            last_start = min(last_start, self.end_sample - self.frame_length)
+        if self._next_frame <= last_start:
+            starts = np.arange(self._next_frame, last_start + 1, self.frame_length)
+            first = starts[0] - signal_start
+            frames = signal[first:first + len(starts) * self.frame_length].reshape(len(starts), self.frame_length)
+            self._next_frame = int(starts[-1]) + self.frame_length
+            self._track(starts, *self._measure(frames))
+
+        drop = min(max(0, self._next_frame - signal_start), len(signal))
+        self._pending = signal[drop:].copy()
+        self._pending_start = signal_start + drop
+        if self.end_sample is not None and self._next_frame + self.frame_length > self.end_sample:
+            return self.finish()
+        return self.beep
+
+    def finish(self):
+        """End of the signal: a tone still running counts if it is long enough"""
+        if self._ended is not None:
+            self._close_run(*self._ended)
+            self._ended = None
+        if self._run is not None:
+            self._close_run(self._run, self._run[0] + self._run[1] * self.frame_length)
+            self._run = None
+        return self.beep
+
+    def _measure(self, frames: np.ndarray) -> tuple:
+        frames = frames.astype(np.float32, copy=False)
+        frequency = np.zeros(len(frames))
+        tonality = np.zeros(len(frames))
+        # Quiet frames (line noise between words) cannot hold a beep; only
+        # the loud ones go through the filter bank
+        loud = np.flatnonzero(np.einsum("ij,ij->i", frames, frames) >= MIN_RMS ** 2 * self.frame_length)
+        if len(loud):
+            windowed = frames[loud] * self._window
+            energy = np.einsum("ij,ij->i", windowed, windowed)
+            spectrum = _fft.rfft(windowed, n=self._n_fft, axis=1)[:, self._bins]
+            power = spectrum.real ** 2 + spectrum.imag ** 2
+            # The strongest inner filter; its neighbours place the tone between filters
+            peak = 1 + np.argmax(power[:, 1:-1], axis=1)
+            rows = np.arange(len(loud))
+            below, top, above = power[rows, peak - 1], power[rows, peak], power[rows, peak + 1]
+            curve = below - 2 * top + above
+            shift = np.where(curve < 0, 0.5 * (below - above) / np.minimum(curve, -1e-12), 0.0)
+            frequency[loud] = self.frequencies[0] + (peak + shift) * self.sample_rate / self._n_fft
+            # One bin, not a band: a frame holding two tones scores about 0.5
+            tonality[loud] = np.minimum(self._gain * top / np.maximum(energy, 1e-12), 1.0)
+        return tonality >= TONALITY, frequency, tonality
+
+    def _track(self, starts: np.ndarray, tonal: np.ndarray, frequency: np.ndarray, tonality: np.ndarray):
+        if self._run is None and self._ended is None and not tonal.any():
+            return
+        for start, is_tonal, hz, score in zip(starts.tolist(), tonal.tolist(), frequency.tolist(), tonality.tolist()):
+            chained = False
+            ended = self._ended
+            if ended is not None and start > ended[1]:
+                # One frame after the last tone ended
+                self._ended = None
+                if is_tonal and abs(hz - ended[0][2][-1]) > MAX_DRIFT_HZ:
+                    chained = True
+                else:
+                    self._close_run(*ended)
+            run = self._run
+            if run is not None and (not is_tonal or abs(hz - run[2][-1]) > MAX_DRIFT_HZ):
+                self._run = None
+                if is_tonal:
+                    chained = True
+                else:
+                    self._ended = (run, start)
+                run = None
+            if is_tonal:
+                if run is None:
+                    self._run = [start, 1, [hz], score, chained]
+                else:
+                    run[1] += 1
+                    run[2].append(hz)
+                    run[3] += score
+
+    def _close_run(self, run: list, end: int):
+        start, count, frequencies, score, chained = run
+        seconds = (end - start) / self.sample_rate
+        if chained or not BEEP_MIN_SECONDS <= seconds < BEEP_MAX_SECONDS:
+            return
+        tone = Beep(
+            start=start / self.sample_rate,
+            end=end / self.sample_rate,
+            frequency=float(np.median(frequencies)),
+            confidence=round(score / count, 3),
+        )
+        if self.longest is None or seconds > self.longest.end - self.longest.start:
+            self.longest = tone
+        if self.beep is None and score / count >= self.min_confidence:
+            self.beep = tone
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark: in-memory decoder vs the original temp file + librosa.load path.
+
+Usage (from python-service/):
+    python benchmarks/bench_decode.py
+    python benchmarks/bench_decode.py --repeat 20 --files rec1.wav rec2.mp3
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import librosa  # noqa: E402
+
+from decoder import decode_audio  # noqa: E402
+
+
+def synth_recording(duration: float, sr: int = 8000) -> np.ndarray:
+    """Telephony-like signal: line noise plus a few voiced bursts"""
+    rng = np.random.default_rng(42)
+    audio = rng.normal(0, 0.002, int(duration * sr)).astype(np.float32)
+    t = np.arange(int(1.5 * sr)) / sr
+    burst = 0.3 * np.sin(2 * np.pi * 160 * t) * (1 + 0.5 * np.sin(2 * np.pi * 4 * t))
+    for start in np.arange(5.0, duration - 8.0, 3.0):
+        i = int(start * sr)
+        audio[i:i + len(burst)] += burst.astype(np.float32)
+    return audio
+
+
+def encode(audio: np.ndarray, sr: int, fmt: str, subtype: str = None) -> bytes:
+    buf = io.BytesIO()
+    sf.write(buf, audio, sr, format=fmt, subtype=subtype)
+    return buf.getvalue()
+
+
+def librosa_path(data: bytes):
+    """What analyze_audio used to do"""
+    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_audio:
+        temp_audio.write(data)
+        path = temp_audio.name
+    try:
+        return librosa.load(path, sr=16000, mono=True)
+    finally:
+        os.unlink(path)
+
+
+def time_it(fn, data: bytes, repeat: int) -> float:
+    fn(data)  # warm-up (imports, JIT, filter design)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(data)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--durations", type=float, nargs="+", default=[20.0, 25.0, 30.0])
+    parser.add_argument("--files", nargs="*", default=[], help="real recordings to include")
+    args = parser.parse_args()
+
+    cases = []
+    for duration in args.durations:
+        audio = synth_recording(duration)
+        cases.append((f"{duration:.0f}s wav u-law 8k", encode(audio, 8000, "WAV", "ULAW")))
+        cases.append((f"{duration:.0f}s wav pcm16 8k", encode(audio, 8000, "WAV", "PCM_16")))
+        try:
+            cases.append((f"{duration:.0f}s mp3 8k", encode(audio, 8000, "MP3")))
+        except Exception:
+            pass  # libsndfile built without MP3 support
+    for path in args.files:
+        with open(path, "rb") as f:
+            cases.append((os.path.basename(path), f.read()))
+
+    print(f"{'case':<24}{'librosa.load':>14}{'decode@16k':>12}{'decode@native':>15}{'speedup':>9}{'max|diff|':>11}")
+    for name, data in cases:
+        old_ms = time_it(librosa_path, data, args.repeat)
+        new_ms = time_it(lambda d: decode_audio(d, target_sr=16000), data, args.repeat)
+        native_ms = time_it(lambda d: decode_audio(d, target_sr=None), data, args.repeat)
+
+        old_audio, _ = librosa_path(data)
+        new_audio, _ = decode_audio(data, target_sr=16000)
+        n = min(len(old_audio), len(new_audio))
+        diff = float(np.max(np.abs(old_audio[:n] - new_audio[:n]))) if n else 0.0
+
+        print(f"{name:<24}{old_ms:>12.1f}ms{new_ms:>10.1f}ms{native_ms:>13.1f}ms"
+              f"{old_ms / new_ms:>8.1f}x{diff:>11.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark: partial vs full recording downloads from a TLS host.
+
+Serves synthetic 8 kHz PCM recordings over HTTPS (HTTP/1.1 keep-alive,
+self-signed certificate made with the openssl CLI) with an emulated round
+trip time and bandwidth: a new connection pays two round trips (TCP and
+TLS handshakes), every request one more. Each case downloads the same
+recording sequentially through one pooled client and reports the
+connections the host saw, the mean latency and the bytes received per
+download for:
+
+* partial download as the service does it (an unread tail shorter than
+  downloader.EARLY_CLOSE_MIN_BYTES is read to keep the connection)
+* partial download always closing at the end of the window
+* full download
+
+Usage (from python-service/):
+    python benchmarks/bench_download.py
+    python benchmarks/bench_download.py --rtt-ms 100 --durations 25 120 600
+"""
+import argparse
+import asyncio
+import http.server
+import io
+import os
+import socketserver
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import downloader  # noqa: E402
+from detector import DEFAULT_ANSWER_WINDOW, decode_range  # noqa: E402
+
+CHUNK_BYTES = 16384
+
+
+def synth_wav(duration: float) -> bytes:
+    audio = np.random.default_rng(0).normal(0, 0.05, int(duration * 8000)).astype(np.float32)
+    buf = io.BytesIO()
+    sf.write(buf, audio, 8000, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def start_server(files: dict, rtt: float, bytes_per_second: float, certificate: tuple) -> tuple:
+    """HTTPS server for ``files``; returns its base URL and a one-item list counting connections"""
+    connections = [0]
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*certificate)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(rtt)
+            body = files[self.path]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                for i in range(0, len(body), CHUNK_BYTES):
+                    self.wfile.write(body[i:i + CHUNK_BYTES])
+                    time.sleep(CHUNK_BYTES / bytes_per_second)
+            except (BrokenPipeError, ConnectionResetError, ssl.SSLError):
+                self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+        daemon_threads = True
+
+        def get_request(self):
+            sock, address = self.socket.accept()
+            connections[0] += 1
+            time.sleep(2 * rtt)
+            return context.wrap_socket(sock, server_side=True), address
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"https://localhost:{server.server_address[1]}", connections
+
+
+def make_certificate(directory: str) -> tuple:
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert, "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+async def run_case(url: str, cert: str, window, repeat: int, connections: list) -> tuple:
+    async with httpx.AsyncClient(verify=cert, limits=httpx.Limits(max_keepalive_connections=4)) as client:
+        connections[0] = 0
+        times = []
+        received = 0
+        for _ in range(repeat):
+            stats = {}
+            started = time.perf_counter()
+            await downloader.fetch_recording(client, url, window=window, stats=stats)
+            times.append(time.perf_counter() - started)
+            received += stats["bytes"]
+    return connections[0], 1000 * float(np.mean(times)), received / repeat / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=8)
+    parser.add_argument("--durations", type=float, nargs="+", default=[25.0, 40.0, 120.0])
+    parser.add_argument("--rtt-ms", type=float, default=40.0, help="emulated round trip time")
+    parser.add_argument("--mbps", type=float, default=32.0, help="emulated bandwidth, megabits per second")
+    args = parser.parse_args()
+
+    files = {f"/{duration:g}.wav": synth_wav(duration) for duration in args.durations}
+    window = decode_range(DEFAULT_ANSWER_WINDOW)
+    drain = downloader.EARLY_CLOSE_MIN_BYTES
+    modes = (("partial (service)", window, drain), ("partial, always close", window, 0), ("full download", None, drain))
+
+    with tempfile.TemporaryDirectory() as directory:
+        certificate = make_certificate(directory)
+        base, connections = start_server(files, args.rtt_ms / 1000, args.mbps * 1e6 / 8, certificate)
+        print(f"RTT {args.rtt_ms:g} ms, {args.mbps:g} Mbit/s, {args.repeat} sequential downloads per case\n")
+        print(f"{'recording':<12}{'size KB':>9}  {'mode':<24}{'connections':>12}{'mean ms':>10}{'KB/download':>13}")
+        for path, body in files.items():
+            for label, case_window, early_close in modes:
+                downloader.EARLY_CLOSE_MIN_BYTES = early_close
+                opened, mean_ms, kb = asyncio.run(
+                    run_case(base + path, certificate[0], case_window, args.repeat, connections)
+                )
+                print(f"{path[1:]:<12}{len(body) // 1024:>9}  {label:<24}{opened:>12}{mean_ms:>10.1f}{kb:>13.0f}")
+        downloader.EARLY_CLOSE_MIN_BYTES = drain
+
+
+if __name__ == "__main__":
+    main()
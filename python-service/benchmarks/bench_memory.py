@@ -0,0 +1,74 @@
+"""
+Peak worker memory vs recording length, block-wise vs whole-signal analysis.
+
+Every measurement runs analyze_recording in a fresh process on a synthetic
+Twilio-style recording (8 kHz u-law WAV, the trial message/answer/greeting
+layout of corpus.py, line noise in between) and reads the process's RSS
+high-water mark, so the numbers are what a DSP worker pays for that one
+recording. Block size 0 is the old behaviour: the whole window decoded,
+resampled and segmented in one go.
+
+Usage (from python-service/):
+    python benchmarks/bench_memory.py
+    python benchmarks/bench_memory.py --minutes 1 10 30 --blocks 0 5 10 30 --full
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCH_DIR)
+
+CHILD = r"""
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+sys.path.insert(0, sys.argv[2])
+from corpus import encode_wav, synth_call
+import detector
+
+audio = synth_call("machine", seed=7, duration=float(sys.argv[3]))
+data = encode_wav(audio)
+del audio
+started = time.perf_counter()
+outcome, trace = detector.analyze_recording(data, windowed=sys.argv[4] == "1")
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "start": trace["start_rss_bytes"],
+    "peak": trace["peak_rss_bytes"],
+    "bytes": len(data),
+    "result": outcome["result"],
+}))
+"""
+
+
+def measure(minutes: float, block_seconds: float, windowed: bool) -> dict:
+    env = dict(os.environ, AMD_DECODE_BLOCK_SECONDS=str(block_seconds), AMD_MAX_RECORDING_SECONDS="0",
+               AMD_LOG_LEVEL="WARNING")
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, SERVICE_DIR, BENCH_DIR, str(minutes * 60), "1" if windowed else "0"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 5, 15, 30], help="recording lengths")
+    parser.add_argument("--blocks", type=float, nargs="+", default=[0, 10], help="block sizes in seconds (0 = whole)")
+    parser.add_argument("--full", action="store_true", help="analyse the whole recording (AMD_WINDOWED_DECODE=0)")
+    args = parser.parse_args()
+
+    print(f"{'minutes':>8}{'WAV MB':>9}{'block s':>9}{'growth MB':>11}{'peak MB':>10}{'ms':>9}  result")
+    for minutes in args.minutes:
+        for block in args.blocks:
+            r = measure(minutes, block, windowed=not args.full)
+            growth = (r["peak"] - r["start"]) / 2**20
+            label = f"{block:g}" if block else "whole"
+            print(f"{minutes:>8g}{r['bytes'] / 2**20:>9.1f}{label:>9}{growth:>11.1f}{r['peak'] / 2**20:>10.1f}"
+                  f"{r['seconds'] * 1000:>9.0f}  {r['result']}")
+
+
+if __name__ == "__main__":
+    main()
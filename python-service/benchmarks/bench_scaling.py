@@ -0,0 +1,226 @@
+"""
+Multi-worker scaling load test for /analyze.
+
+Starts the service the production way (``python main.py``) with 1, 2, ...
+N web workers of one DSP process each, serves a synthetic corpus from a
+local stand-in for the Twilio recording host (in its own process), and
+drives /analyze over real HTTP with a fixed number of requests in flight
+per worker. Reports throughput, latency and scaling efficiency for every
+worker count, checks that /metrics (shared between workers) counted every
+request, and finally checks graceful draining: a SIGTERM in the middle of a
+burst must still answer every request that was already admitted.
+
+The load generator and the stand-in run on the same machine as the
+service, so near-linear scaling needs spare cores beyond the N workers (or
+the client on another host). The report flags worker counts above the
+core count.
+
+Usage (from python-service/):
+    python benchmarks/bench_scaling.py
+    python benchmarks/bench_scaling.py --workers 1 2 4 8 --requests 400
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_service import serve_corpus  # noqa: E402
+from corpus import synth_corpus  # noqa: E402
+
+
+def _stand_in(corpus: list, conn):
+    _, base_url = serve_corpus(corpus)
+    conn.send(base_url)
+    while True:
+        time.sleep(3600)
+
+
+def start_stand_in(corpus: list) -> tuple:
+    """Recording host in a separate process so it does not share the client's GIL"""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_stand_in, args=(corpus, child), daemon=True)
+    process.start()
+    return process, parent.recv()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(workers: int, port: int, in_flight: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        AMD_WEB_WORKERS=str(workers),
+        AMD_PROCESS_WORKERS="1",
+        AMD_HOST="127.0.0.1",
+        AMD_PORT=str(port),
+        AMD_MAX_IN_FLIGHT=str(in_flight),
+        AMD_CACHE_MAX_ENTRIES="0",
+        AMD_CACHE_PATH="",
+        AMD_LOG_LEVEL=os.getenv("AMD_LOG_LEVEL", "WARNING"),
+    )
+    env.setdefault("TWILIO_ACCOUNT_SID", "ACbenchmark")
+    env.setdefault("TWILIO_AUTH_TOKEN", "benchmark")
+    return subprocess.Popen(
+        [sys.executable, "main.py"], cwd=SERVICE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(client, workers: int, timeout: float = 90.0):
+    """Until /health has answered 200 from ``workers`` distinct processes"""
+    pids = set()
+    deadline = time.monotonic() + timeout
+    while len(pids) < workers:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"only {len(pids)} of {workers} workers became ready")
+        try:
+            # A new connection each time, or every probe reaches the same worker
+            response = await client.get("/health", headers={"Connection": "close"})
+            if response.status_code == 200:
+                pids.add(response.json()["pid"])
+        except Exception:
+            await asyncio.sleep(0.2)
+            continue
+        await asyncio.sleep(0.01)
+
+
+async def load(client, corpus: list, base_url: str, requests: int, concurrency: int, tag: str) -> tuple:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+
+    async def one(i: int):
+        name = corpus[i % len(corpus)][0]
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/analyze", json={
+                    "audio_url": f"{base_url}/{name}", "call_id": f"{tag}-{i}",
+                })
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return time.perf_counter() - started, latencies, statuses
+
+
+def counted_requests(metrics_text: str) -> int:
+    return int(sum(float(v) for v in re.findall(
+        r'^amd_requests_total\{endpoint="analyze",status="200"\} (\S+)$', metrics_text, re.MULTILINE
+    )))
+
+
+async def run_one(workers: int, corpus: list, base_url: str, args) -> dict:
+    import httpx
+
+    port = free_port()
+    concurrency = args.per_worker * workers
+    process = start_service(workers, port, in_flight=concurrency * 2)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120.0, limits=limits) as client:
+            await wait_ready(client, workers)
+            await load(client, corpus, base_url, concurrency * 2, concurrency, "warm")
+            wall, latencies, statuses = await load(client, corpus, base_url, args.requests, concurrency, "run")
+            await asyncio.sleep(1.5)  # let every worker publish its metrics snapshot
+            counted = counted_requests((await client.get("/metrics")).text)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+    ok = statuses.get(200, 0)
+    return {
+        "workers": workers,
+        "throughput": ok / wall,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "errors": args.requests - ok,
+        "metrics_counted": counted,
+        "expected_counted": args.requests + concurrency * 2,
+    }
+
+
+async def drain_check(workers: int, corpus: list, base_url: str, args) -> dict:
+    """SIGTERM mid-burst: every admitted request must still get its verdict"""
+    import httpx
+
+    port = free_port()
+    burst = args.per_worker * workers * 2
+    process = start_service(workers, port, in_flight=burst)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120.0) as client:
+        await wait_ready(client, workers)
+        task = asyncio.create_task(load(client, corpus, base_url, burst, burst, "drain"))
+        await asyncio.sleep(args.drain_after)
+        signalled = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        _, _, statuses = await task
+    returncode = await asyncio.get_running_loop().run_in_executor(None, process.wait, 60)
+    return {
+        "burst": burst,
+        "statuses": statuses,
+        "exit_seconds": time.perf_counter() - signalled,
+        "returncode": returncode,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, cpus} & set(range(1, cpus + 1))) or [1]
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers, help="web worker counts to test")
+    parser.add_argument("--requests", type=int, default=300, help="measured requests per worker count")
+    parser.add_argument("--per-worker", type=int, default=4, help="requests in flight per web worker")
+    parser.add_argument("--per-kind", type=int, default=10, help="synthetic recordings per kind")
+    parser.add_argument("--drain-after", type=float, default=0.3, help="seconds into the burst to send SIGTERM")
+    parser.add_argument("--no-drain-check", action="store_true")
+    args = parser.parse_args()
+
+    corpus = synth_corpus(args.per_kind)
+    stand_in, base_url = start_stand_in(corpus)
+
+    print(f"{cpus} CPUs, {len(corpus)} recordings, {args.requests} requests, {args.per_worker} in flight per worker\n")
+    print(f"{'workers':>8}{'rec/s':>10}{'speedup':>10}{'efficiency':>12}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}  metrics")
+    baseline = None
+    try:
+        for workers in args.workers:
+            r = asyncio.run(run_one(workers, corpus, base_url, args))
+            baseline = baseline or r["throughput"] / r["workers"]
+            speedup = r["throughput"] / baseline
+            note = "" if workers <= cpus else "  (more workers than CPUs)"
+            metrics_ok = "ok" if r["metrics_counted"] == r["expected_counted"] else \
+                f"counted {r['metrics_counted']}/{r['expected_counted']}"
+            print(f"{workers:>8}{r['throughput']:>10.1f}{speedup:>10.2f}{speedup / workers:>12.0%}"
+                  f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['errors']:>8}  {metrics_ok}{note}")
+
+        if not args.no_drain_check:
+            workers = max(args.workers)
+            d = asyncio.run(drain_check(workers, corpus, base_url, args))
+            answered = d["statuses"].get(200, 0)
+            print(f"\nDrain: SIGTERM {args.drain_after}s into a burst of {d['burst']} on {workers} workers -> "
+                  f"{answered}/{d['burst']} answered 200, other outcomes {({k: v for k, v in d['statuses'].items() if k != 200})}, "
+                  f"exited in {d['exit_seconds']:.1f}s with code {d['returncode']}")
+    finally:
+        stand_in.terminate()
+
+
+if __name__ == "__main__":
+    main()
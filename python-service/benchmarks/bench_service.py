@@ -0,0 +1,300 @@
+"""
+Offline end-to-end benchmark and accuracy suite for /analyze.
+
+Builds (or loads) a labeled corpus, serves it from a local HTTP stand-in for
+the Twilio recording host, and drives the real FastAPI app in-process (same
+startup hook, process pool, downloader and cache code path; the result cache
+is disabled so every request does the full work). Reports:
+
+* throughput in recordings/sec at the chosen concurrency
+* p50/p95/p99 latency per stage (from the service's own "Call analyzed"
+  log record) plus client-observed request latency
+* peak RSS of the service process and of the busiest DSP worker
+* a confusion matrix and per-kind accuracy
+
+Save a run with --save and diff a later one against it with --compare, so
+every detector change comes with a perf and accuracy diff.
+
+Usage (from python-service/):
+    python benchmarks/bench_service.py
+    python benchmarks/bench_service.py --per-kind 50 --concurrency 16 --save baseline.json
+    python benchmarks/bench_service.py --compare baseline.json
+    python benchmarks/bench_service.py --corpus /path/to/labeled --workers 4
+"""
+import argparse
+import asyncio
+import http.server
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import BEEP_NEGATIVE_KINDS, LABELS, load_corpus, synth_corpus, write_corpus  # noqa: E402
+
+STAGES = ("download", "decode", "resample", "beep", "segmentation", "scoring", "classifier", "total")
+PERCENTILES = (50, 95, 99)
+
+
+def serve_corpus(corpus: list) -> tuple:
+    """Local stand-in for the recording host; returns (server, base_url)"""
+    files = {"/" + name: data for name, _, data in corpus}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            data = files.get(self.path)
+            if data is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/x-wav")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class StageCapture(logging.Handler):
+    """Collects the stage timings the service logs for every analysed call"""
+
+    def __init__(self):
+        super().__init__()
+        self.stages = {}
+
+    def emit(self, record: logging.LogRecord):
+        stages_ms = getattr(record, "stages_ms", None)
+        if stages_ms is not None:
+            self.stages[record.call_id] = stages_ms
+
+
+async def drive(main, corpus: list, base_url: str, concurrency: int) -> tuple:
+    import httpx
+
+    await main.load_model()
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one(client, index: int, name: str, label: str):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/analyze", json={
+                "audio_url": f"{base_url}/{name}",
+                "call_id": f"bench-{index}",
+            })
+            latency = time.perf_counter() - started
+        body = response.json()
+        results.append({
+            "call_id": f"bench-{index}",
+            "name": name,
+            "kind": name.split("/")[-1].rsplit("-", 1)[0] if "/" not in name else label,
+            "label": label,
+            "status": response.status_code,
+            "predicted": body.get("result", "error") if response.status_code == 200 else "error",
+            "beep": response.status_code == 200 and body.get("beep_time") is not None,
+            "request_ms": latency * 1000,
+        })
+
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://amd.local", timeout=120.0) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(one(client, i, name, label) for i, (name, label, _) in enumerate(corpus)))
+            wall = time.perf_counter() - started
+    finally:
+        await main.release_resources()
+    return results, wall
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+
+
+def summarize(results: list, stages: dict, wall: float, args) -> dict:
+    per_stage = {}
+    for stage in STAGES:
+        per_stage[stage] = percentiles([s[stage] for s in stages.values() if stage in s])
+    per_stage["request"] = percentiles([r["request_ms"] for r in results])
+
+    columns = list(LABELS) + ["error"]
+    confusion = {truth: {predicted: 0 for predicted in columns} for truth in LABELS}
+    per_kind = {}
+    for r in results:
+        confusion[r["label"]][r["predicted"]] += 1
+        kind = per_kind.setdefault(r["kind"], {"n": 0, "correct": 0, "beep": 0})
+        kind["n"] += 1
+        kind["correct"] += r["predicted"] == r["label"]
+        kind["beep"] += r["beep"]
+    correct = sum(confusion[label][label] for label in LABELS)
+
+    # Workers have exited by now, so RUSAGE_CHILDREN holds the largest one
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    return {
+        "config": {
+            "recordings": len(results),
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "corpus": args.corpus or f"synthetic per_kind={args.per_kind} seed={args.seed}",
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "throughput": {
+            "wall_seconds": round(wall, 3),
+            "recordings_per_second": round(len(results) / wall, 2) if wall > 0 else None,
+        },
+        "latency_ms": per_stage,
+        "peak_rss_mb": {
+            "service": round(self_kb / 1024, 1),
+            "worker": round(child_kb / 1024, 1),
+        },
+        "accuracy": {
+            "overall": round(correct / len(results), 4) if results else None,
+            "per_kind": {kind: round(v["correct"] / v["n"], 4) for kind, v in sorted(per_kind.items())},
+            "confusion": confusion,
+            # Calls the beep fast path answered, by kind; tones that are not
+            # record beeps (ringback, SIT) must never be among them
+            "beep_verdicts": {kind: v["beep"] for kind, v in sorted(per_kind.items())},
+        },
+    }
+
+
+def print_report(report: dict, baseline: dict = None):
+    def delta(new, old, lower_is_better=True, fmt="{:+.1f}%"):
+        if baseline is None or new is None or old in (None, 0):
+            return ""
+        change = (new - old) / old * 100
+        better = change < 0 if lower_is_better else change > 0
+        return f"  ({fmt.format(change)}{' better' if better and abs(change) >= 1 else ''})"
+
+    def old(*path):
+        node = baseline
+        for key in path:
+            if node is None:
+                return None
+            node = node.get(key)
+        return node
+
+    config = report["config"]
+    print(f"\n{config['recordings']} recordings ({config['corpus']}), "
+          f"concurrency {config['concurrency']}, {config['workers']} DSP workers, {config['cpus']} CPUs")
+
+    rps = report["throughput"]["recordings_per_second"]
+    print(f"\nThroughput: {rps} recordings/s"
+          f"{delta(rps, old('throughput', 'recordings_per_second'), lower_is_better=False)}")
+
+    print(f"\n{'stage':<14}" + "".join(f"{f'p{p} ms':>12}" for p in PERCENTILES))
+    for stage, values in report["latency_ms"].items():
+        cells = []
+        for p in PERCENTILES:
+            value = values[f"p{p}"]
+            cells.append(f"{value:>12.2f}" if value is not None else f"{'-':>12}")
+        line = f"{stage:<14}" + "".join(cells)
+        line += delta(values["p95"], old("latency_ms", stage, "p95"))
+        print(line)
+
+    rss = report["peak_rss_mb"]
+    print(f"\nPeak RSS: service {rss['service']} MB{delta(rss['service'], old('peak_rss_mb', 'service'))}, "
+          f"worker {rss['worker']} MB{delta(rss['worker'], old('peak_rss_mb', 'worker'))}")
+
+    accuracy = report["accuracy"]
+    overall = accuracy["overall"]
+    baseline_overall = old("accuracy", "overall")
+    change = f"  ({(overall - baseline_overall) * 100:+.1f} pts)" if baseline_overall is not None else ""
+    print(f"\nAccuracy: {overall:.1%}{change}")
+    for kind, value in accuracy["per_kind"].items():
+        baseline_kind = old("accuracy", "per_kind", kind)
+        change = f"  ({(value - baseline_kind) * 100:+.1f} pts)" if baseline_kind is not None else ""
+        print(f"  {kind:<16}{value:>8.1%}{change}")
+
+    beeps = accuracy.get("beep_verdicts", {})
+    print("\nBeep verdicts: " + (", ".join(f"{kind} {n}" for kind, n in beeps.items() if n) or "none"))
+    for kind in BEEP_NEGATIVE_KINDS:
+        if beeps.get(kind):
+            print(f"  ❌ {kind}: {beeps[kind]} call(s) answered by the beep fast path")
+
+    columns = list(LABELS) + ["error"]
+    print("\n" + f"{'truth/pred':<14}" + "".join(f"{c:>10}" for c in columns))
+    for truth, row in accuracy["confusion"].items():
+        print(f"{truth:<14}" + "".join(f"{row[c]:>10}" for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-kind", type=int, default=20, help="synthetic recordings per kind")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus", help="labeled directory (<dir>/<label>/<file>) instead of synthetic calls")
+    parser.add_argument("--write-corpus", metavar="DIR", help="also dump the corpus used to DIR")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="DSP process pool size")
+    parser.add_argument("--concurrency", type=int, default=None, help="requests in flight (default 2x workers)")
+    parser.add_argument("--save", metavar="FILE", help="write the report as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="diff against a report saved with --save")
+    args = parser.parse_args()
+    args.concurrency = args.concurrency or args.workers * 2
+
+    corpus = load_corpus(args.corpus) if args.corpus else synth_corpus(args.per_kind, seed=args.seed)
+    if not corpus:
+        parser.error("empty corpus")
+    if args.write_corpus:
+        write_corpus(corpus, args.write_corpus)
+
+    # Configure the service before importing it
+    os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACbenchmark")
+    os.environ.setdefault("TWILIO_AUTH_TOKEN", "benchmark")
+    os.environ["AMD_CACHE_MAX_ENTRIES"] = "0"
+    os.environ["AMD_CACHE_PATH"] = ""
+    os.environ["AMD_PROCESS_WORKERS"] = str(args.workers)
+    os.environ["AMD_MAX_IN_FLIGHT"] = str(max(args.concurrency, args.workers))
+    os.environ.setdefault("AMD_LOG_LEVEL", "WARNING")
+
+    import main as service
+
+    capture = StageCapture()
+    service_logger = logging.getLogger("amd.service")
+    service_logger.addHandler(capture)
+    service_logger.setLevel(logging.INFO)
+    service_logger.propagate = False
+
+    server, base_url = serve_corpus(corpus)
+    try:
+        results, wall = asyncio.run(drive(service, corpus, base_url, args.concurrency))
+    finally:
+        server.shutdown()
+
+    report = summarize(results, capture.stages, wall, args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved report to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Cold-start report: import time of main, RSS per process-pool worker, and the
+latency of the first analysis with and without the startup warm-up.
+
+Each measurement runs in a fresh interpreter so nothing is already imported
+or warmed. Worker RSS is read from /proc (Linux only).
+
+Usage (from python-service/):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 5 --workers 4
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_mb(pid: int = None) -> float:
+    """Current resident set size from /proc, in MB"""
+    try:
+        with open(f"/proc/{pid or os.getpid()}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def synthetic_call() -> bytes:
+    """25s 8 kHz PCM WAV with a three-burst human-like answer"""
+    import wave
+
+    import numpy as np
+
+    sr = 8000
+    rng = np.random.default_rng(1)
+    audio = rng.normal(0, 0.002, 25 * sr)
+    t = np.arange(int(1.2 * sr)) / sr
+    for start in (6.0, 8.0, 10.0):
+        i = int(start * sr)
+        audio[i:i + len(t)] += 0.3 * np.sin(2 * np.pi * 160 * t)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sr)
+        wav.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+    return buf.getvalue()
+
+
+def child(warm: bool, workers: int) -> dict:
+    """One fresh-process measurement, mirroring what load_model does"""
+    started = time.perf_counter()
+    import main  # noqa: F401
+    import_ms = (time.perf_counter() - started) * 1000
+    rss_import = rss_mb()
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    from detector import analyze_recording, warm_up
+
+    warm_up_ms = None
+    if warm:
+        warm_up_ms = warm_up()
+
+    data = synthetic_call()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Workers are forked up front, as load_model does
+        pool.submit(os.getpid).result()
+        started = time.perf_counter()
+        pool.submit(analyze_recording, data).result()
+        first_ms = (time.perf_counter() - started) * 1000
+        pids = {pool.submit(os.getpid).result() for _ in range(workers * 4)}
+        worker_rss = [rss_mb(pid) for pid in pids]
+
+    return {
+        "import_ms": import_ms,
+        "rss_after_import_mb": rss_import,
+        "warm_up_ms": warm_up_ms,
+        "first_request_ms": first_ms,
+        "parent_rss_mb": rss_mb(),
+        "worker_rss_mb": max(worker_rss),
+    }
+
+
+def run(warm: bool, workers: int) -> dict:
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "warm" if warm else "cold", "--workers", str(workers)],
+        cwd=SERVICE_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--child", choices=["cold", "warm"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, SERVICE_DIR)
+        print(json.dumps(child(args.child == "warm", args.workers)))
+        return
+
+    fields = ["import_ms", "rss_after_import_mb", "warm_up_ms", "first_request_ms", "parent_rss_mb", "worker_rss_mb"]
+    print(f"{'mode':<6}" + "".join(f"{field:>22}" for field in fields))
+    for warm in (False, True):
+        results = [run(warm, args.workers) for _ in range(args.runs)]
+        cells = []
+        for field in fields:
+            values = [r[field] for r in results if r[field] is not None]
+            cells.append(f"{statistics.median(values):>22.1f}" if values else f"{'-':>22}")
+        print(f"{'warm' if warm else 'cold':<6}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    main()
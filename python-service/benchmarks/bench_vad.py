@@ -0,0 +1,154 @@
+"""
+Micro-benchmark: vad.detect_speech vs librosa.effects.split + per-segment RMS loop.
+
+Reports the median time of both paths and how closely the intervals agree
+(identical intervals, worst boundary offset, speech-mask IoU, worst relative
+energy difference). The alternative threshold modes are timed as well; they
+are not expected to match librosa.
+
+Usage (from python-service/):
+    python benchmarks/bench_vad.py
+    python benchmarks/bench_vad.py --repeat 50 --files rec1.wav rec2.mp3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import librosa  # noqa: E402
+
+from decoder import decode_audio  # noqa: E402
+from detector import SPLIT_FRAME_SECONDS, SPLIT_HOP_SECONDS  # noqa: E402
+from vad import THRESHOLD_MODES, detect_speech  # noqa: E402
+
+SR = 16000
+
+
+def synth_recording(duration: float, seed: int, gain: float = 1.0, noise: float = 0.002) -> np.ndarray:
+    """Line noise plus randomly placed voiced bursts of varying length and level"""
+    rng = np.random.default_rng(seed)
+    audio = rng.normal(0, noise, int(duration * SR))
+    t = 0.5 + rng.uniform(0, 1.5)
+    while t < duration - 1.0:
+        length = min(rng.uniform(0.2, 4.0), duration - t)
+        n = int(length * SR)
+        tt = np.arange(n) / SR
+        f0 = rng.uniform(100, 250)
+        level = rng.uniform(0.05, 0.4)
+        burst = level * np.sin(2 * np.pi * f0 * tt) * (1 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 6) * tt))
+        i = int(t * SR)
+        audio[i:i + n] += burst
+        t += length + rng.uniform(0.1, 2.5)
+    return (gain * audio).astype(np.float32)
+
+
+def librosa_path(audio: np.ndarray):
+    """What the detector's segmentation used to do"""
+    intervals = librosa.effects.split(
+        audio,
+        top_db=30,
+        frame_length=int(round(SPLIT_FRAME_SECONDS * SR)),
+        hop_length=int(round(SPLIT_HOP_SECONDS * SR)),
+    )
+    energies = [np.sqrt(np.mean(audio[start:end] ** 2)) for start, end in intervals]
+    return intervals, np.array(energies, dtype=np.float64)
+
+
+def vad_path(audio: np.ndarray, threshold: str = "relative"):
+    return detect_speech(audio, SR, SPLIT_FRAME_SECONDS, SPLIT_HOP_SECONDS, threshold=threshold, top_db=30)
+
+
+def time_it(fn, audio: np.ndarray, repeat: int) -> float:
+    fn(audio)  # warm-up (imports, JIT)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(audio)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def speech_mask(intervals: np.ndarray, n: int) -> np.ndarray:
+    mask = np.zeros(n, dtype=bool)
+    for start, end in intervals:
+        mask[start:end] = True
+    return mask
+
+
+def agreement(audio: np.ndarray, ref, new) -> dict:
+    ref_intervals, ref_energies = ref
+    new_intervals, new_energies = new
+    same_shape = ref_intervals.shape == new_intervals.shape
+    identical = same_shape and np.array_equal(ref_intervals, new_intervals)
+
+    ref_mask = speech_mask(ref_intervals, len(audio))
+    new_mask = speech_mask(new_intervals, len(audio))
+    union = np.count_nonzero(ref_mask | new_mask)
+    iou = np.count_nonzero(ref_mask & new_mask) / union if union else 1.0
+
+    max_offset = int(np.max(np.abs(ref_intervals - new_intervals))) if same_shape and len(ref_intervals) else None
+    energy_diff = (
+        float(np.max(np.abs(ref_energies - new_energies) / np.maximum(ref_energies, 1e-12)))
+        if same_shape and len(ref_energies) else 0.0
+    )
+    return {
+        "identical": identical,
+        "segments": f"{len(ref_intervals)}/{len(new_intervals)}",
+        "max_offset": max_offset,
+        "iou": iou,
+        "energy_diff": energy_diff,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--durations", type=float, nargs="+", default=[20.0, 30.0, 60.0])
+    parser.add_argument("--seeds", type=int, default=5, help="random recordings per duration")
+    parser.add_argument("--files", nargs="*", default=[], help="real recordings to include")
+    args = parser.parse_args()
+
+    cases = []
+    for duration in args.durations:
+        for seed in range(args.seeds):
+            cases.append((f"{duration:.0f}s seed{seed}", synth_recording(duration, seed)))
+        cases.append((f"{duration:.0f}s quiet", synth_recording(duration, 100, gain=0.05)))
+        cases.append((f"{duration:.0f}s noisy", synth_recording(duration, 101, noise=0.02)))
+    for path in args.files:
+        with open(path, "rb") as f:
+            audio, _ = decode_audio(f.read(), target_sr=SR)
+        cases.append((os.path.basename(path), audio))
+
+    other_modes = [mode for mode in THRESHOLD_MODES if mode != "relative"]
+    header = f"{'case':<16}{'librosa':>10}{'vad':>9}{'speedup':>9}{'same':>6}{'segs':>8}{'max|off|':>10}{'IoU':>8}{'energy':>10}"
+    header += "".join(f"{mode:>11}" for mode in other_modes)
+    print(header)
+
+    speedups, identical = [], 0
+    for name, audio in cases:
+        old_ms = time_it(librosa_path, audio, args.repeat)
+        new_ms = time_it(vad_path, audio, args.repeat)
+        mode_ms = [time_it(lambda a: vad_path(a, mode), audio, args.repeat) for mode in other_modes]
+
+        stats = agreement(audio, librosa_path(audio), vad_path(audio))
+        speedups.append(old_ms / new_ms)
+        identical += stats["identical"]
+
+        offset = "-" if stats["max_offset"] is None else str(stats["max_offset"])
+        line = (f"{name:<16}{old_ms:>8.2f}ms{new_ms:>7.2f}ms{old_ms / new_ms:>8.1f}x"
+                f"{'yes' if stats['identical'] else 'no':>6}{stats['segments']:>8}{offset:>10}"
+                f"{stats['iou']:>8.4f}{stats['energy_diff']:>10.1e}")
+        line += "".join(f"{ms:>9.2f}ms" for ms in mode_ms)
+        print(line)
+
+    print(f"\n{identical}/{len(cases)} cases with identical intervals; "
+          f"median speedup {statistics.median(speedups):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
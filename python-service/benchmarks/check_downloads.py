@@ -0,0 +1,126 @@
+"""
+Check of /analyze's handling of recording hosts that fail.
+
+Drives the real FastAPI app in-process against a local stand-in for the
+recording host that is unavailable (503), has no such recording (404) or
+never answers, against a port nobody listens on (connection refused), and
+with URLs that cannot be requested at all. Every case must come back with
+the expected status within the download deadline (plus a margin), and
+GET /metrics must still render afterwards with both kinds of retry counted
+(HTTP status and connection error).
+
+Usage (from python-service/):
+    python benchmarks/check_downloads.py
+"""
+import asyncio
+import http.server
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+DEADLINE_SECONDS = 2.0
+
+
+def serve_failing() -> tuple:
+    """Recording host answering 503 on /unavailable, 404 on /missing and never on /stall; returns (server, base_url)"""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path.startswith("/stall"):
+                time.sleep(3 * DEADLINE_SECONDS)
+            self.send_response(404 if self.path.startswith("/missing") else 503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_checks(main, cases: list) -> int:
+    import httpx
+
+    failures = 0
+    await main.load_model()
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://amd.local", timeout=120.0) as client:
+            for label, audio_url, expected in cases:
+                started = time.perf_counter()
+                response = await client.post("/analyze", json={"audio_url": audio_url, "call_id": label})
+                seconds = time.perf_counter() - started
+                if response.status_code != expected:
+                    failures += 1
+                    print(f"❌ {label}: {response.status_code}, expected {expected} ({response.text[:200]})")
+                if seconds > DEADLINE_SECONDS + 1.0:
+                    failures += 1
+                    print(f"❌ {label}: answered after {seconds:.1f}s, deadline {DEADLINE_SECONDS:g}s")
+
+            response = await client.get("/metrics")
+            if response.status_code != 200:
+                failures += 1
+                print(f"❌ /metrics after retries: {response.status_code}")
+            else:
+                retries = [line for line in response.text.splitlines() if line.startswith("amd_download_retries_total")]
+                for status in ("503", "error"):
+                    if not any(f'status="{status}"' in line for line in retries):
+                        failures += 1
+                        print(f"❌ /metrics has no {status} retries: {retries}")
+    finally:
+        await main.release_resources()
+    return failures
+
+
+def main():
+    # Configure the service before importing it
+    os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACcheck")
+    os.environ.setdefault("TWILIO_AUTH_TOKEN", "check")
+    os.environ["AMD_CACHE_MAX_ENTRIES"] = "0"
+    os.environ["AMD_CACHE_PATH"] = ""
+    os.environ["AMD_PROCESS_WORKERS"] = "1"
+    os.environ["AMD_DOWNLOAD_RETRIES"] = "1"
+    os.environ["AMD_DOWNLOAD_BACKOFF_MS"] = "10"
+    os.environ["AMD_DOWNLOAD_DEADLINE_SECONDS"] = str(DEADLINE_SECONDS)
+    os.environ.setdefault("AMD_LOG_LEVEL", "ERROR")
+
+    import main as service
+
+    server, base_url = serve_failing()
+    cases = [
+        ("unavailable", f"{base_url}/unavailable.wav", 502),
+        ("refused", f"http://127.0.0.1:{closed_port()}/recording.wav", 502),
+        ("missing", f"{base_url}/missing.wav", 404),
+        ("stalled", f"{base_url}/stall.wav", 504),
+        ("not_a_url", "not a url", 400),
+        ("bad_scheme", "ftp://127.0.0.1/recording.wav", 400),
+        ("bad_host", "http://[::1/recording.wav", 400),
+    ]
+    try:
+        failures = asyncio.run(run_checks(service, cases))
+    finally:
+        server.shutdown()
+
+    if failures:
+        print(f"\n{failures} download check(s) failed")
+        sys.exit(1)
+    print(f"✅ {len(cases)} download failure cases answered as expected; /metrics renders after retries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Golden check and throughput benchmark for the vectorized rule scorer.
+
+benchmarks/data/golden_rules.json holds segment lists scored by the original
+if/elif rule chain. Every case must come back with the identical result,
+confidence (bit-for-bit), score and reasoning, both through the single-call
+path and through one batch pass over the whole (N x F) matrix.
+
+Usage (from python-service/):
+    python benchmarks/check_rules.py
+    python benchmarks/check_rules.py --rows 50000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detector import score_answer_segments  # noqa: E402
+from features import extract_feature_matrix  # noqa: E402
+from rules import score_batch  # noqa: E402
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "golden_rules.json")
+
+
+def check_golden(cases: list) -> int:
+    failures = 0
+
+    for k, case in enumerate(cases):
+        expected = case["expected"]
+        got = score_answer_segments(case["segments"], answer_end=case["answer_end"])
+        for key in ("result", "confidence", "score", "voicemail_indicators", "reasoning"):
+            if got[key] != expected[key]:
+                failures += 1
+                print(f"❌ case {k} (single): {key} = {got[key]!r}, expected {expected[key]!r}")
+
+    X = extract_feature_matrix([c["segments"] for c in cases], [c["answer_end"] for c in cases])
+    batch = score_batch(X)
+    for k, case in enumerate(cases):
+        expected = case["expected"]
+        if (batch["result"][k] != expected["result"]
+                or batch["confidence"][k] != expected["confidence"]
+                or batch["score"][k] != expected["score"]):
+            failures += 1
+            print(f"❌ case {k} (batch): {batch['result'][k]} {batch['confidence'][k]!r} "
+                  f"score {batch['score'][k]}, expected {expected}")
+
+    return failures
+
+
+def bench_batch(cases: list, rows: int):
+    X = extract_feature_matrix([c["segments"] for c in cases], [c["answer_end"] for c in cases])
+    X = np.resize(X, (rows, X.shape[1]))
+
+    score_batch(X[:10])
+    started = time.perf_counter()
+    score_batch(X)
+    batch_s = time.perf_counter() - started
+
+    sample = cases[:200]
+    started = time.perf_counter()
+    for case in sample:
+        score_answer_segments(case["segments"], answer_end=case["answer_end"])
+    single_s = (time.perf_counter() - started) / len(sample)
+
+    print(f"⚡ Batch: {rows} calls in {batch_s * 1000:.1f}ms ({rows / batch_s:,.0f} calls/s)")
+    print(f"🐢 Single-call path: {single_s * 1e6:.0f}us/call ({1 / single_s:,.0f} calls/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000, help="matrix size for the batch benchmark")
+    args = parser.parse_args()
+
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        cases = json.load(f)["cases"]
+
+    failures = check_golden(cases)
+    if failures:
+        print(f"❌ {failures} mismatches against {len(cases)} golden cases")
+        sys.exit(1)
+    print(f"✅ {len(cases)} golden cases identical (single-call and batch)")
+
+    bench_batch(cases, args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Labeled recordings for the offline benchmark/accuracy suite.
+
+Synthetic calls are laid out like the recordings the service receives: an
+optional trial-account announcement in the first seconds, the callee's
+answer in the analysis window, and the TwiML greeting in the last seconds.
+What happens in the answer window decides the label:
+
+* ``human``     - one to three short bursts separated by natural pauses
+* ``machine``   - a long greeting monologue with only brief breaths
+* ``unknown``   - nothing but line noise
+* ``noisy_*``   - the human/machine cases on a much louder line
+* ``beep_machine`` - a machine greeting followed by the record beep
+* ``ringback_human`` - a last US ringback burst (440+480 Hz, 2 s) in the
+  window before the callee picks up; not a beep
+* ``sit_machine`` - special information tones (three tones back to back)
+  ahead of an intercept announcement; not a beep, so never answered by the
+  beep fast path
+
+"Speech" is a harmonic series with a wandering pitch and a syllable-rate
+envelope: not intelligible, but it has the energy structure the detector
+looks at. Everything is seeded, so a corpus is reproducible.
+
+A real corpus can be loaded from a directory laid out as
+``<dir>/<label>/<file>.(wav|mp3)``.
+"""
+import io
+import os
+
+import numpy as np
+
+SR = 8000
+LABELS = ("human", "machine", "unknown")
+KINDS = ("human", "machine", "silence", "noisy_human", "noisy_machine", "beep_machine", "ringback_human", "sit_machine")
+KIND_LABEL = {
+    "human": "human",
+    "machine": "machine",
+    "silence": "unknown",
+    "noisy_human": "human",
+    "noisy_machine": "machine",
+    "beep_machine": "machine",
+    "ringback_human": "human",
+    "sit_machine": "machine",
+}
+# Record beeps of common answering machines (Hz)
+BEEP_FREQUENCIES = (440.0, 850.0, 1000.0, 1400.0)
+# Kinds holding a tone the beep detector must not take for a record beep
+BEEP_NEGATIVE_KINDS = ("ringback_human", "sit_machine")
+RINGBACK_HZ = (440.0, 480.0)
+# (frequency Hz, seconds) of each SIT segment, played without gaps
+SIT_TONES = ((913.8, 0.274), (1370.6, 0.274), (1776.7, 0.380))
+
+
+def _tone(frequencies, seconds: float, level: float) -> np.ndarray:
+    t = np.arange(int(seconds * SR)) / SR
+    return level * sum(np.sin(2 * np.pi * f * t) for f in frequencies) / len(frequencies)
+
+
+def _speech(rng, seconds: float, level: float) -> np.ndarray:
+    n = int(seconds * SR)
+    t = np.arange(n) / SR
+    f0 = rng.uniform(95, 230) * (1 + 0.06 * np.sin(2 * np.pi * rng.uniform(0.3, 1.2) * t))
+    phase = 2 * np.pi * np.cumsum(f0) / SR
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    # 3-6 Hz syllable envelope that never quite reaches zero inside a burst
+    syllables = 0.55 + 0.45 * np.sin(2 * np.pi * rng.uniform(3, 6) * t + rng.uniform(0, np.pi))
+    ramp = np.minimum(1.0, np.minimum(t, t[::-1]) / 0.03)
+    out = voiced * syllables * ramp
+    return level * out / (np.max(np.abs(out)) or 1.0)
+
+
+def _place(audio: np.ndarray, start: float, burst: np.ndarray):
+    i = int(start * SR)
+    burst = burst[:max(0, len(audio) - i)]
+    audio[i:i + len(burst)] += burst
+
+
+def synth_call(kind: str, seed: int, duration: float = None, trial_message: bool = True) -> np.ndarray:
+    """One synthetic 8 kHz recording of the given kind"""
+    rng = np.random.default_rng(seed)
+    if duration is None:
+        duration = rng.uniform(22.0, 30.0)
+    noise = rng.uniform(0.008, 0.02) if kind.startswith("noisy") else rng.uniform(0.001, 0.004)
+    audio = rng.normal(0, noise, int(duration * SR))
+
+    if trial_message:
+        _place(audio, rng.uniform(0.2, 0.6), _speech(rng, rng.uniform(2.5, 3.8), rng.uniform(0.2, 0.35)))
+
+    # The TwiML greeting plays in the last seconds (outside the answer window)
+    _place(audio, duration - rng.uniform(6.0, 7.0), _speech(rng, rng.uniform(2.0, 4.0), rng.uniform(0.2, 0.35)))
+
+    answer_start = rng.uniform(5.3, 7.0)
+    if kind == "ringback_human":
+        # The phone is still ringing when the window opens
+        _place(audio, answer_start, _tone(RINGBACK_HZ, 2.0, rng.uniform(0.1, 0.3)))
+        answer_start += 2.0 + rng.uniform(0.6, 1.5)
+    elif kind == "sit_machine":
+        t = answer_start
+        for frequency, seconds in SIT_TONES:
+            _place(audio, t, _tone((frequency,), seconds, 0.2))
+            t += seconds
+        answer_start = t + rng.uniform(0.3, 0.8)
+    answer_budget = duration - 8.5 - answer_start
+    label = KIND_LABEL[kind]
+    if label == "human":
+        t = answer_start
+        for _ in range(rng.integers(1, 4)):
+            length = rng.uniform(0.4, 1.4)
+            if t + length > answer_start + answer_budget:
+                break
+            _place(audio, t, _speech(rng, length, rng.uniform(0.15, 0.4)))
+            t += length + rng.uniform(0.9, 2.0)
+    elif label == "machine":
+        t = answer_start
+        end = answer_start + min(answer_budget, rng.uniform(8.0, 13.0))
+        while t < end - 0.5:
+            length = min(rng.uniform(2.5, 5.0), end - t)
+            _place(audio, t, _speech(rng, length, rng.uniform(0.2, 0.35)))
+            t += length + rng.uniform(0.1, 0.25)
+        if kind == "beep_machine":
+            length = rng.uniform(0.3, 0.8)
+            start = min(t + rng.uniform(0.2, 0.5), duration - 8.2 - length)
+            tone = np.sin(2 * np.pi * rng.choice(BEEP_FREQUENCIES) * np.arange(int(length * SR)) / SR)
+            _place(audio, start, rng.uniform(0.2, 0.4) * tone)
+
+    return np.clip(audio, -1.0, 1.0).astype(np.float32)
+
+
+def encode_wav(audio: np.ndarray, subtype: str = "ULAW") -> bytes:
+    """Twilio-style mono 8 kHz WAV (G.711 u-law by default)"""
+    import soundfile as sf
+
+    buf = io.BytesIO()
+    sf.write(buf, audio, SR, format="WAV", subtype=subtype)
+    return buf.getvalue()
+
+
+def synth_corpus(per_kind: int, seed: int = 0, subtype: str = "ULAW") -> list:
+    """``per_kind`` recordings of every kind, as (name, label, bytes) tuples"""
+    corpus = []
+    for k, kind in enumerate(KINDS):
+        for i in range(per_kind):
+            audio = synth_call(kind, seed=seed * 100003 + k * 1009 + i)
+            corpus.append((f"{kind}-{i:04d}.wav", KIND_LABEL[kind], encode_wav(audio, subtype)))
+    return corpus
+
+
+def load_corpus(directory: str) -> list:
+    """Read ``<dir>/<label>/<file>`` recordings as (name, label, bytes) tuples"""
+    corpus = []
+    for label in LABELS:
+        label_dir = os.path.join(directory, label)
+        if not os.path.isdir(label_dir):
+            continue
+        for name in sorted(os.listdir(label_dir)):
+            if name.lower().endswith((".wav", ".mp3")):
+                with open(os.path.join(label_dir, name), "rb") as f:
+                    corpus.append((f"{label}/{name}", label, f.read()))
+    return corpus
+
+
+def write_corpus(corpus: list, directory: str):
+    """Dump a corpus in the layout load_corpus reads"""
+    for name, label, data in corpus:
+        path = os.path.join(directory, label, os.path.basename(name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
@@ -0,0 +1,139 @@
+"""
+Train a classifier-mode model (classifier.py) on a labeled corpus.
+
+Every recording goes through detector.analyze_recording with the acoustic
+pass switched on, so the model is fitted on exactly the feature vectors the
+service computes. Recordings without speech in the answer window are left
+out (the service answers those from the rule set anyway). A seeded,
+per-label holdout split is scored three ways: the rule set alone, the
+model alone, and the service's classifier mode (model when confident,
+rule set otherwise). The feature pass latency is reported against the
+per-call budget.
+
+Usage (from python-service/):
+    python benchmarks/train_classifier.py --corpus /path/to/labeled --version clf-2025-11
+    python benchmarks/train_classifier.py --per-kind 60 --out /tmp/synthetic.json
+Then serve it with AMD_DETECTOR_MODE=classifier AMD_CLASSIFIER_MODEL=<file>.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, SERVICE_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import LABELS, load_corpus, synth_corpus  # noqa: E402
+
+
+def extract(corpus: list) -> tuple:
+    from detector import analyze_recording
+
+    vectors, labels, rule_results, feature_ms = [], [], [], []
+    skipped = 0
+    for name, label, data in corpus:
+        # Beep detection off: beep calls are features like any other here
+        outcome, trace = analyze_recording(data, acoustic=True, beep=False)
+        if "features" not in trace:
+            skipped += 1
+            continue
+        vectors.append(trace["features"])
+        labels.append(label)
+        rule_results.append(outcome["result"])
+        feature_ms.append(trace["stages"]["classifier"] * 1000)
+    return np.array(vectors), labels, rule_results, feature_ms, skipped
+
+
+def split(labels: list, test_fraction: float, seed: int) -> tuple:
+    """Per-label shuffled split so every class shows up on both sides"""
+    rng = np.random.default_rng(seed)
+    train, test = [], []
+    for label in LABELS:
+        members = [i for i, value in enumerate(labels) if value == label]
+        rng.shuffle(members)
+        cut = int(round(len(members) * test_fraction))
+        test.extend(members[:cut])
+        train.extend(members[cut:])
+    return np.array(sorted(train)), np.array(sorted(test))
+
+
+def accuracy(predicted: list, truth: list) -> float:
+    return float(np.mean([p == t for p, t in zip(predicted, truth)])) if truth else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="labeled directory (<dir>/<label>/<file>) instead of synthetic calls")
+    parser.add_argument("--per-kind", type=int, default=40, help="synthetic recordings per kind")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--test-fraction", type=float, default=0.3)
+    parser.add_argument("--version", default="acoustic-v1")
+    parser.add_argument("--description", default="")
+    parser.add_argument("--l2", type=float, default=1e-2)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--min-confidence", type=float, default=0.7)
+    parser.add_argument("--out", help="model file to write (default models/<version>.json)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AMD_LOG_LEVEL", "WARNING")
+    from classifier import Classifier, train_classifier
+    from detector import CLASSIFIER_BUDGET_SECONDS
+
+    corpus = load_corpus(args.corpus) if args.corpus else synth_corpus(args.per_kind, seed=args.seed)
+    if not corpus:
+        parser.error("empty corpus")
+
+    started = time.perf_counter()
+    X, labels, rule_results, feature_ms, skipped = extract(corpus)
+    print(f"{len(corpus)} recordings, {len(labels)} with answer speech ({skipped} left to the rules), "
+          f"features in {time.perf_counter() - started:.1f}s")
+    budget_ms = CLASSIFIER_BUDGET_SECONDS * 1000
+    over = sum(ms > budget_ms for ms in feature_ms)
+    print(f"Acoustic pass per call: p50 {np.percentile(feature_ms, 50):.1f} ms, "
+          f"p95 {np.percentile(feature_ms, 95):.1f} ms, max {max(feature_ms):.1f} ms "
+          f"({over} over the {budget_ms:.0f} ms budget)")
+
+    train, test = split(labels, args.test_fraction, args.seed)
+    spec = train_classifier(
+        X[train], [labels[i] for i in train], args.version,
+        l2=args.l2, iterations=args.iterations, min_confidence=args.min_confidence,
+        description=args.description or f"Trained on {args.corpus or 'the synthetic corpus'}",
+    )
+    model = Classifier(spec)
+
+    truth = [labels[i] for i in test]
+    rules = [rule_results[i] for i in test]
+    decisions = [model.classify(X[i]) for i in test]
+    alone = [d["result"] for d in decisions]
+    served = [d["result"] if d["probability"] >= model.min_confidence else r for d, r in zip(decisions, rules)]
+    spec["trained"]["holdout"] = {
+        "recordings": len(test),
+        "rules_accuracy": round(accuracy(rules, truth), 4),
+        "model_accuracy": round(accuracy(alone, truth), 4),
+        "served_accuracy": round(accuracy(served, truth), 4),
+        "decided_by_model": round(float(np.mean([d["probability"] >= model.min_confidence for d in decisions])), 4),
+    }
+
+    print(f"\nHoldout ({len(test)} recordings):")
+    for key, value in spec["trained"]["holdout"].items():
+        if key != "recordings":
+            print(f"  {key:<18}{value:>8.1%}")
+    print("\n" + f"{'truth/served':<14}" + "".join(f"{c:>10}" for c in LABELS))
+    for label in LABELS:
+        row = [sum(t == label and s == c for t, s in zip(truth, served)) for c in LABELS]
+        print(f"{label:<14}" + "".join(f"{n:>10}" for n in row))
+
+    out = args.out or os.path.join(SERVICE_DIR, "models", f"{args.version}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(spec, f, indent=1)
+    print(f"\nSaved model to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Two-level AMD result cache.
+
+Level 1 is keyed by the recording URL + call id, so Twilio webhook retries
+are answered before anything is downloaded. Level 2 is keyed by a hash of
+the downloaded audio bytes, so the same recording behind a different URL
+skips decoding and scoring. Both keys are namespaced by the decode
+configuration and carry the rule-set variant (version + content
+fingerprint), so a threshold change never serves stale verdicts and A/B
+arms never see each other's results.
+
+Entries live in an in-memory LRU with a TTL; an optional SQLite file backs
+it so results survive restarts (and web workers share them). The file is only
+touched from one thread of its own, never from the event loop: lookups that
+miss in memory await it, writes are queued to it. Expired rows are deleted
+and the table is cut back to ``max_disk_entries`` (oldest first) every
+PRUNE_SECONDS, as part of a write.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+PRUNE_SECONDS = 60.0
+
+
+def audio_digest(audio_bytes: bytes) -> str:
+    """Content hash of a downloaded recording"""
+    return hashlib.blake2b(audio_bytes, digest_size=20).hexdigest()
+
+
+class ResultCache:
+    """TTL + LRU cache of AMD outcome dicts with optional on-disk backing"""
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = 10000,
+        ttl_seconds: float = 86400.0,
+        path: str = None,
+        max_disk_entries: int = 100000,
+    ):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+
+        self._entries = OrderedDict()
+        self.hits = {"url": 0, "audio": 0, "disk": 0}
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.disk_errors = 0
+
+        self._db = None
+        self._io = None
+        self._pruned_at = 0.0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS amd_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS amd_cache_expires_at ON amd_cache (expires_at)")
+            self._prune()
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="amd-cache")
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _key(self, level: str, key: str, variant: str = "") -> str:
+        return f"{self.namespace}|{variant}|{level}|{key}"
+
+    async def _get(self, key: str):
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at >= now:
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+            self.expired += 1
+
+        if self._io is not None:
+            row = await asyncio.get_running_loop().run_in_executor(self._io, self._read, key)
+            if row is not None and row[1] >= now:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                self.hits["disk"] += 1
+                return value
+
+        return None
+
+    def _remember(self, key: str, value: dict, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _put(self, keys: list, value: dict):
+        expires_at = time.time() + self.ttl_seconds
+        for key in keys:
+            self._remember(key, value, expires_at)
+        if self._io is not None:
+            data = json.dumps(value)
+            self._io.submit(self._write, [(key, data, expires_at) for key in keys])
+
+    # The methods below run on the cache's I/O thread
+
+    def _read(self, key: str):
+        try:
+            return self._db.execute("SELECT value, expires_at FROM amd_cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            self.disk_errors += 1
+            return None
+
+    def _write(self, rows: list):
+        try:
+            # Both levels of an outcome in one transaction
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO amd_cache (key, value, expires_at) VALUES (?, ?, ?)", rows)
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+            if time.time() - self._pruned_at >= PRUNE_SECONDS:
+                self._prune()
+        except sqlite3.Error:
+            # A lost write only costs a later re-analysis
+            self.disk_errors += 1
+
+    def _prune(self):
+        self._pruned_at = time.time()
+        self._db.execute("DELETE FROM amd_cache WHERE expires_at < ?", (self._pruned_at,))
+        if self.max_disk_entries > 0:
+            # Everything older than the newest max_disk_entries rows
+            self._db.execute(
+                "DELETE FROM amd_cache WHERE expires_at < ("
+                "SELECT expires_at FROM amd_cache ORDER BY expires_at DESC LIMIT 1 OFFSET ?)",
+                (self.max_disk_entries - 1,),
+            )
+
+    @staticmethod
+    def recording_key(audio_url: str, call_id: str) -> str:
+        return f"{call_id}|{audio_url}"
+
+    async def get_by_recording(self, audio_url: str, call_id: str, variant: str = ""):
+        """Level 1 lookup; returns the cached outcome dict or None"""
+        if not self.enabled:
+            return None
+        value = await self._get(self._key("url", self.recording_key(audio_url, call_id), variant))
+        if value is not None:
+            self.hits["url"] += 1
+        return value
+
+    async def get_by_audio(self, digest: str, variant: str = ""):
+        """Level 2 lookup; counts a miss when neither level had the result"""
+        if not self.enabled:
+            return None
+        value = await self._get(self._key("audio", digest, variant))
+        if value is not None:
+            self.hits["audio"] += 1
+        else:
+            self.misses += 1
+        return value
+
+    def put(self, audio_url: str, call_id: str, digest: str, outcome: dict, variant: str = ""):
+        """Store an outcome under both levels (the disk write is queued)"""
+        if not self.enabled:
+            return
+        keys = [self._key("url", self.recording_key(audio_url, call_id), variant)]
+        if digest:
+            keys.append(self._key("audio", digest, variant))
+        self._put(keys, outcome)
+
+    def stats(self) -> dict:
+        hits = self.hits["url"] + self.hits["audio"]
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "namespace": self.namespace,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_path": self.path,
+            "max_disk_entries": self.max_disk_entries,
+            "disk_errors": self.disk_errors,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+    def close(self):
+        """Finish the queued writes and close the file"""
+        if self._io is not None:
+            self._io.shutdown(wait=True)
+            self._io = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
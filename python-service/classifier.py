@@ -0,0 +1,201 @@
+"""
+Classifier mode: a small trained model over timing and acoustic features.
+
+A model is a JSON file like a rule set: the feature names it reads (from
+features.FEATURE_NAMES and acoustic.ACOUSTIC_FEATURE_NAMES), their
+standardization, and the weights of a multinomial logistic regression over
+the verdict classes. Scoring is one (classes x features) dot product, so it
+costs microseconds next to the feature extraction. Training is plain numpy
+gradient descent (see benchmarks/train_classifier.py for the corpus side),
+so a model can be fitted and loaded on any box the service runs on.
+
+The rule engine stays in charge whenever the model cannot or should not
+decide: detector.py falls back to the rule-set verdict when there is no
+speech to classify or the feature pass runs over its latency budget, and
+uses it as the tie-breaker when the model's top probability is below the
+model's ``min_confidence``.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from acoustic import ACOUSTIC_FEATURE_NAMES
+from features import FEATURE_NAMES
+
+# Every feature a model may read, in the order detector.py assembles them
+CLASSIFIER_FEATURE_NAMES = FEATURE_NAMES + ACOUSTIC_FEATURE_NAMES
+CLASSIFIER_FEATURE_INDEX = {name: i for i, name in enumerate(CLASSIFIER_FEATURE_NAMES)}
+CLASSES = ("human", "machine", "unknown")
+
+# model_used for classifier verdicts is this name plus the model version
+CLASSIFIER_NAME = "acoustic-classifier"
+
+
+class ClassifierError(Exception):
+    """Raised when a model file is missing, malformed or refers to unknown features"""
+
+
+class Classifier:
+    """One loaded model version"""
+
+    def __init__(self, spec: dict, source: str = None):
+        where = source or "classifier"
+        version = spec.get("version")
+        if not isinstance(version, str) or not version:
+            raise ClassifierError(f"{where}: missing version")
+        self.spec = spec
+        self.source = source
+        self.version = version
+        self.description = spec.get("description", "")
+        self.fingerprint = hashlib.blake2b(
+            json.dumps(spec, sort_keys=True, ensure_ascii=False).encode(), digest_size=6
+        ).hexdigest()
+
+        self.classes = tuple(spec.get("classes") or ())
+        unknown = [c for c in self.classes if c not in CLASSES]
+        if len(self.classes) < 2 or unknown:
+            raise ClassifierError(f"{version}: classes must be two or more of {', '.join(CLASSES)}")
+        self.features = tuple(spec.get("features") or ())
+        missing = [name for name in self.features if name not in CLASSIFIER_FEATURE_INDEX]
+        if not self.features or missing:
+            raise ClassifierError(f"{version}: unknown features {', '.join(missing) or '(none given)'}")
+        self.columns = np.array([CLASSIFIER_FEATURE_INDEX[name] for name in self.features])
+
+        try:
+            self.mean = np.asarray(spec["mean"], dtype=np.float64)
+            self.scale = np.asarray(spec["scale"], dtype=np.float64)
+            self.coef = np.asarray(spec["coef"], dtype=np.float64)
+            self.intercept = np.asarray(spec["intercept"], dtype=np.float64)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ClassifierError(f"{version}: bad weights ({e})")
+        n_features, n_classes = len(self.features), len(self.classes)
+        if (self.mean.shape != (n_features,) or self.scale.shape != (n_features,)
+                or self.coef.shape != (n_classes, n_features) or self.intercept.shape != (n_classes,)):
+            raise ClassifierError(f"{version}: weight shapes do not match {n_classes} classes x {n_features} features")
+        if not np.all(self.scale > 0):
+            raise ClassifierError(f"{version}: scale must be positive")
+
+        self.min_confidence = float(spec.get("min_confidence", 0.7))
+
+    def __repr__(self):
+        return f"Classifier({self.version!r}, fingerprint={self.fingerprint!r})"
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.version}#{self.fingerprint}"
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "description": self.description,
+            "source": self.source,
+            "classes": list(self.classes),
+            "features": len(self.features),
+            "min_confidence": self.min_confidence,
+            "trained": self.spec.get("trained"),
+        }
+
+    def _standardize(self, X: np.ndarray) -> np.ndarray:
+        return (X[..., self.columns] - self.mean) / self.scale
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities for one CLASSIFIER_FEATURE_NAMES vector (or an (N, F) matrix)"""
+        logits = self._standardize(np.asarray(X, dtype=np.float64)) @ self.coef.T + self.intercept
+        logits -= logits.max(axis=-1, keepdims=True)
+        odds = np.exp(logits)
+        return odds / odds.sum(axis=-1, keepdims=True)
+
+    def classify(self, vector: np.ndarray) -> dict:
+        """Top class, its probability, every probability and the features that pushed it most"""
+        z = self._standardize(np.asarray(vector, dtype=np.float64))
+        probabilities = self.predict_proba(vector)
+        best = int(np.argmax(probabilities))
+        # Contribution of each feature to the winner's logit relative to the average class
+        pull = z * (self.coef[best] - self.coef.mean(axis=0))
+        drivers = [self.features[i] for i in np.argsort(pull)[::-1][:3] if pull[i] > 0]
+        return {
+            "result": self.classes[best],
+            "probability": float(probabilities[best]),
+            "probabilities": {c: round(float(p), 4) for c, p in zip(self.classes, probabilities)},
+            "drivers": drivers,
+        }
+
+
+def load_classifier(path: str) -> Classifier:
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ClassifierError(f"{path}: {e}")
+    if not isinstance(spec, dict):
+        raise ClassifierError(f"{path}: expected a JSON object")
+    return Classifier(spec, source=os.path.basename(path))
+
+
+def train_classifier(
+    X: np.ndarray,
+    labels: list,
+    version: str,
+    features: tuple = CLASSIFIER_FEATURE_NAMES,
+    l2: float = 1e-2,
+    iterations: int = 2000,
+    learning_rate: float = 0.5,
+    min_confidence: float = 0.7,
+    description: str = "",
+) -> dict:
+    """Fit a multinomial logistic regression; returns the model spec (load with Classifier).
+
+    ``X`` is an (N, len(CLASSIFIER_FEATURE_NAMES)) matrix and ``labels``
+    the N true classes. Classes are weighted inversely to their frequency
+    so a corpus with few silent calls still learns "unknown".
+    """
+    X = np.asarray(X, dtype=np.float64)
+    classes = tuple(c for c in CLASSES if c in set(labels))
+    if len(classes) < 2:
+        raise ClassifierError("training needs at least two classes")
+    columns = np.array([CLASSIFIER_FEATURE_INDEX[name] for name in features])
+    X = X[:, columns]
+
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale < 1e-9] = 1.0
+    Z = (X - mean) / scale
+
+    y = np.array([classes.index(label) for label in labels])
+    onehot = np.eye(len(classes))[y]
+    counts = onehot.sum(axis=0)
+    weights = (len(y) / (len(classes) * counts))[y][:, None]
+
+    coef = np.zeros((len(classes), len(features)))
+    intercept = np.zeros(len(classes))
+    for _ in range(iterations):
+        logits = Z @ coef.T + intercept
+        logits -= logits.max(axis=1, keepdims=True)
+        p = np.exp(logits)
+        p /= p.sum(axis=1, keepdims=True)
+        error = (p - onehot) * weights / len(y)
+        coef -= learning_rate * (error.T @ Z + l2 * coef)
+        intercept -= learning_rate * error.sum(axis=0)
+
+    predicted = np.argmax(Z @ coef.T + intercept, axis=1)
+    return {
+        "version": version,
+        "description": description,
+        "classes": list(classes),
+        "features": list(features),
+        "mean": mean.round(8).tolist(),
+        "scale": scale.round(8).tolist(),
+        "coef": coef.round(8).tolist(),
+        "intercept": intercept.round(8).tolist(),
+        "min_confidence": min_confidence,
+        "trained": {
+            "recordings": len(y),
+            "per_class": {c: int(n) for c, n in zip(classes, counts)},
+            "training_accuracy": round(float(np.mean(predicted == y)), 4),
+            "l2": l2,
+            "iterations": iterations,
+        },
+    }
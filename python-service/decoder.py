@@ -0,0 +1,441 @@
+"""
+In-memory audio decoding for Twilio recordings.
+
+Twilio serves recordings as WAV (8 kHz, 16-bit PCM or G.711 u-law/A-law) or
+MP3. WAV payloads are parsed straight out of the downloaded buffer with
+numpy views, so the common case needs no temp file, no ffmpeg subprocess and
+no full-signal high-quality resample. Everything else goes through
+soundfile on a BytesIO, with librosa/audioread as the last resort.
+WindowDecoder hands the signal out in fixed-size blocks so long recordings
+are analysed in bounded memory.
+"""
+import io
+import os
+import struct
+import tempfile
+import time
+from math import gcd
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_ALAW = 0x0006
+WAVE_FORMAT_MULAW = 0x0007
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class DecodeError(Exception):
+    """Raised when a buffer cannot be decoded into audio samples"""
+
+
+def _mulaw_table() -> np.ndarray:
+    """G.711 u-law byte -> float32 sample lookup table"""
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    samples = np.where(u & 0x80, -magnitude, magnitude)
+    return (samples / 32768.0).astype(np.float32)
+
+
+def _alaw_table() -> np.ndarray:
+    """G.711 A-law byte -> float32 sample lookup table"""
+    a = np.arange(256, dtype=np.int32) ^ 0x55
+    exponent = (a >> 4) & 0x07
+    mantissa = a & 0x0F
+    magnitude = np.where(
+        exponent == 0,
+        (mantissa << 4) + 8,
+        ((mantissa << 4) + 0x108) << np.maximum(exponent - 1, 0),
+    )
+    samples = np.where(a & 0x80, magnitude, -magnitude)
+    return (samples / 32768.0).astype(np.float32)
+
+
+MULAW_TABLE = _mulaw_table()
+ALAW_TABLE = _alaw_table()
+
+
+def sniff_format(data) -> str:
+    """Identify the container from its magic bytes rather than the URL suffix"""
+    head = bytes(data[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:3] == b"ID3" or (len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0):
+        return "mp3"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"fLaC":
+        return "flac"
+    return "unknown"
+
+
+def _parse_wav(data: memoryview):
+    """Return (format_tag, channels, sample_rate, bits, samples_view) for a RIFF/WAVE buffer"""
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = bytes(data[offset:offset + 4])
+        chunk_size = struct.unpack_from("<I", data, offset + 4)[0]
+        body = offset + 8
+
+        if chunk_id == b"fmt ":
+            format_tag, channels, sample_rate = struct.unpack_from("<HHI", data, body)
+            bits = struct.unpack_from("<H", data, body + 14)[0]
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                # The real format lives in the first two bytes of the SubFormat GUID
+                format_tag = struct.unpack_from("<H", data, body + 24)[0]
+            fmt = (format_tag, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise DecodeError("WAV data chunk precedes fmt chunk")
+            # Streamed recordings may carry a placeholder size; clamp to what we have
+            end = min(body + chunk_size, len(data))
+            return fmt + (data[body:end],)
+
+        # Chunks are word-aligned
+        offset = body + chunk_size + (chunk_size & 1)
+
+    raise DecodeError("WAV buffer has no data chunk")
+
+
+def wav_byte_range(head, total_bytes: int, start: float = None, end: float = None):
+    """Bytes of a WAV file that decoding ``[start, end)`` seconds reads.
+
+    ``head`` is the first bytes of the file and ``total_bytes`` its full
+    length. Returns ``(first, last)`` byte offsets, the header up to the
+    data chunk not included, or None while ``head`` does not yet reach the
+    data chunk (or is no WAV the fast path decodes, or the length is unknown).
+    """
+    head = memoryview(head).cast("B")
+    if not total_bytes or sniff_format(head) != "wav":
+        return None
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(head):
+        chunk_id = bytes(head[offset:offset + 4])
+        chunk_size = struct.unpack_from("<I", head, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            if body + 16 > len(head):
+                return None
+            format_tag, channels, sample_rate = struct.unpack_from("<HHI", head, body)
+            bits = struct.unpack_from("<H", head, body + 14)[0]
+            if format_tag == WAVE_FORMAT_EXTENSIBLE:
+                if chunk_size < 40 or body + 26 > len(head):
+                    return None
+                format_tag = struct.unpack_from("<H", head, body + 24)[0]
+            fmt = (format_tag, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None or _convert_wav(b"", fmt[0], fmt[1], fmt[3]) is None:
+                return None
+            frame_bytes = max(1, fmt[1] * fmt[3] // 8)
+            # Same clamp as _parse_wav: a placeholder size ends at the end of the file
+            payload = min(chunk_size, max(0, total_bytes - body))
+            first, last = _frame_range(payload // frame_bytes, fmt[2], start, end)
+            return body + first * frame_bytes, body + last * frame_bytes
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _frame_range(n_frames: int, sample_rate: int, start: float = None, end: float = None):
+    """Clamp a ``[start, end)`` window in seconds to frame indices.
+
+    ``end`` may be negative to count back from the end of the recording,
+    like a slice index.
+    """
+    first = 0 if start is None else int(max(0.0, start) * sample_rate)
+    if end is None:
+        last = n_frames
+    elif end < 0:
+        last = n_frames + int(end * sample_rate)
+    else:
+        last = int(end * sample_rate)
+    first = min(first, n_frames)
+    return first, min(max(last, first), n_frames)
+
+
+def _convert_wav(payload, format_tag: int, channels: int, bits: int):
+    """PCM/float/G.711 payload bytes -> mono float32, or None for formats left to libsndfile"""
+    if format_tag == WAVE_FORMAT_MULAW and bits == 8:
+        audio = MULAW_TABLE[np.frombuffer(payload, dtype=np.uint8)]
+    elif format_tag == WAVE_FORMAT_ALAW and bits == 8:
+        audio = ALAW_TABLE[np.frombuffer(payload, dtype=np.uint8)]
+    elif format_tag == WAVE_FORMAT_PCM and bits == 16:
+        audio = np.frombuffer(payload, dtype="<i2").astype(np.float32) / 32768.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 8:
+        audio = (np.frombuffer(payload, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 32:
+        audio = np.frombuffer(payload, dtype="<i4").astype(np.float32) / 2147483648.0
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        audio = np.frombuffer(payload, dtype="<f4").astype(np.float32)
+    else:
+        # 24-bit PCM and other rarities: let libsndfile handle them
+        return None
+
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    return audio
+
+
+class _WavSource:
+    """Frames straight out of the WAV payload view; only the frames read are converted"""
+
+    blockwise = True
+
+    def __init__(self, data: memoryview, start: float = None, end: float = None):
+        self.format_tag, self.channels, self.sample_rate, self.bits, self._payload = _parse_wav(data)
+        self.supported = _convert_wav(b"", self.format_tag, self.channels, self.bits) is not None
+        self._frame_bytes = max(1, self.channels * self.bits // 8)
+        self.n_frames = len(self._payload) // self._frame_bytes
+        self.first, self.last = _frame_range(self.n_frames, self.sample_rate, start, end)
+        self._position = self.first
+
+    def read(self, count: int) -> np.ndarray:
+        stop = min(self._position + count, self.last)
+        payload = self._payload[self._position * self._frame_bytes:stop * self._frame_bytes]
+        self._position = stop
+        return _convert_wav(payload, self.format_tag, self.channels, self.bits)
+
+    def close(self):
+        pass
+
+
+class _SoundFileSource:
+    """Any libsndfile-supported container (incl. MP3) from memory, seeked to the window"""
+
+    def __init__(self, data, start: float = None, end: float = None):
+        import soundfile as sf
+
+        self._file = sf.SoundFile(io.BytesIO(data))
+        try:
+            # libsndfile's MPEG decoder (1.2.0) misplaces samples when a
+            # stream is read in several calls, so MP3 windows are read whole
+            self.blockwise = not self._file.subtype.startswith("MPEG_LAYER")
+            self.sample_rate = self._file.samplerate
+            self.n_frames = self._file.frames
+            self.first, self.last = _frame_range(self.n_frames, self.sample_rate, start, end)
+            if self.first and self._file.seekable():
+                self._file.seek(self.first)
+            else:
+                self.first = 0
+        except Exception:
+            self._file.close()
+            raise
+
+    def read(self, count: int) -> np.ndarray:
+        audio = self._file.read(count, dtype="float32", always_2d=True)
+        return audio.mean(axis=1, dtype=np.float32)
+
+    def close(self):
+        self._file.close()
+
+
+class _AudioreadSource:
+    """Last resort: the old temp file + librosa/audioread path.
+
+    Decodes the whole recording up front (there is no seeking and the
+    duration is only known afterwards), so it is not memory-bounded; only
+    containers libsndfile cannot read end up here.
+    """
+
+    def __init__(self, data, suffix: str, start: float = None, end: float = None):
+        import librosa
+
+        temp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_audio:
+                temp_audio.write(data)
+                temp_path = temp_audio.name
+            self._audio, self.sample_rate = librosa.load(temp_path, sr=None, mono=True)
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+        self.n_frames = len(self._audio)
+        self.first, self.last = _frame_range(self.n_frames, self.sample_rate, start, end)
+        self._position = self.first
+
+    def read(self, count: int) -> np.ndarray:
+        stop = min(self._position + count, self.last)
+        audio = self._audio[self._position:stop]
+        self._position = stop
+        return audio
+
+    def close(self):
+        self._audio = None
+
+
+class _BlockResampler:
+    """Resample a signal that arrives in consecutive blocks.
+
+    libsoxr's stream interface keeps the filter state between blocks, so the
+    output is identical to resampling the whole signal at once. The scipy
+    fallback resamples each block on its own (slight edge effects at block
+    boundaries, harmless for energy envelopes).
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int):
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        self._stream = None
+        if target_sr and orig_sr != target_sr:
+            try:
+                import soxr
+            except ImportError:
+                pass
+            else:
+                self._stream = soxr.ResampleStream(orig_sr, target_sr, 1, dtype="float32", quality="LQ")
+
+    def __call__(self, block: np.ndarray, last: bool = False) -> np.ndarray:
+        if self._stream is not None:
+            return self._stream.resample_chunk(block, last=last)
+        return resample(block, self.orig_sr, self.target_sr)
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """Cheap polyphase resample; the detector only looks at energy envelopes.
+
+    Uses libsoxr's low-quality polyphase mode (soxr ships with librosa) and
+    falls back to scipy's integer-ratio resample_poly when it is missing.
+    """
+    if not target_sr or orig_sr == target_sr:
+        return audio
+
+    try:
+        import soxr
+    except ImportError:
+        from scipy.signal import resample_poly
+
+        factor = gcd(orig_sr, target_sr)
+        return resample_poly(audio, target_sr // factor, orig_sr // factor).astype(np.float32, copy=False)
+
+    return soxr.resample(audio, orig_sr, target_sr, quality="LQ")
+
+
+def preload():
+    """Import the optional codec/resampler modules now instead of on first use"""
+    for module in ("soundfile", "soxr"):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+
+class WindowDecoder:
+    """Decode ``[start, end)`` seconds of an in-memory recording block by block.
+
+    Opening reads only the container header (WAV, libsndfile) so the
+    duration and window are known before any sample is converted, and
+    ``blocks`` then decodes and resamples a bounded number of frames at a
+    time: peak memory depends on the block size, not the recording length.
+    MP3 and the audioread fallback are the exception (see their sources)
+    and come out as a single block.
+    ``end`` may be negative to count back from the end of the recording.
+
+    Attributes: ``container``, ``sample_rate`` (of the blocks), ``offset``
+    (where the window starts in the recording, seconds), ``duration`` (of
+    the full recording, seconds) and ``frames`` (native frames in the window).
+    """
+
+    def __init__(self, data, start: float = None, end: float = None, target_sr: int = 16000):
+        started = time.perf_counter()
+        view = memoryview(data).cast("B")
+        self.container = sniff_format(view)
+
+        source = None
+        try:
+            if self.container == "wav":
+                source = _WavSource(view, start, end)
+                if not source.supported:
+                    source = None
+            if source is None:
+                try:
+                    source = _SoundFileSource(view, start, end)
+                except Exception:
+                    suffix = f".{self.container}" if self.container != "unknown" else ".mp3"
+                    source = _AudioreadSource(view, suffix, start, end)
+        except DecodeError:
+            raise
+        except Exception as e:
+            raise DecodeError(f"Could not decode {self.container} audio: {e}")
+
+        self._source = source
+        self.native_sr = int(source.sample_rate)
+        self.sample_rate = int(target_sr or self.native_sr)
+        self.offset = source.first / self.native_sr
+        self.duration = source.n_frames / self.native_sr
+        self.frames = source.last - source.first
+        self._open_seconds = time.perf_counter() - started
+
+    def blocks(self, block_seconds: float = None, timings: dict = None):
+        """Yield the window as mono float32 blocks at ``sample_rate``.
+
+        Each block covers ``block_seconds`` of audio (the whole window in
+        one block if None). If ``timings`` is given, the seconds spent in
+        ``decode`` and ``resample`` are added to it once the blocks are
+        exhausted or the generator is closed.
+        """
+        remaining = self.frames
+        if block_seconds and self._source.blockwise:
+            per_block = max(1, int(block_seconds * self.native_sr))
+        else:
+            per_block = max(1, remaining)
+        resampler = _BlockResampler(self.native_sr, self.sample_rate)
+        decode_seconds = self._open_seconds
+        resample_seconds = 0.0
+        try:
+            while remaining > 0:
+                started = time.perf_counter()
+                count = min(per_block, remaining)
+                try:
+                    audio = self._source.read(count)
+                except Exception as e:
+                    raise DecodeError(f"Could not decode {self.container} audio: {e}")
+                # A short read means the container overstated its length
+                remaining = remaining - count if len(audio) == count else 0
+                decoded_at = time.perf_counter()
+                audio = resampler(audio, last=remaining == 0)
+                decode_seconds += decoded_at - started
+                resample_seconds += time.perf_counter() - decoded_at
+                if len(audio):
+                    yield audio
+        finally:
+            self._source.close()
+            if timings is not None:
+                timings["decode"] = timings.get("decode", 0.0) + decode_seconds
+                timings["resample"] = timings.get("resample", 0.0) + resample_seconds
+
+
+def decode_window(data, start: float = None, end: float = None, target_sr: int = 16000, timings: dict = None):
+    """Decode only ``[start, end)`` seconds of an in-memory recording.
+
+    ``end`` may be negative to count back from the end. WAV payloads are
+    sliced before conversion and libsndfile formats are seeked, so samples
+    outside the window are never decoded or resampled. ``timings`` works as
+    for decode_audio.
+    Returns ``(audio, sample_rate, offset_seconds, duration_seconds)`` where
+    the offset is where the window starts in the full recording and the
+    duration is that of the full recording.
+    """
+    decoder = WindowDecoder(data, start, end, target_sr)
+    blocks = list(decoder.blocks(timings=timings))
+    if len(blocks) == 1:
+        audio = blocks[0]
+    else:
+        audio = np.concatenate(blocks) if blocks else np.empty(0, dtype=np.float32)
+    return audio, decoder.sample_rate, decoder.offset, decoder.duration
+
+
+def decode_audio(data, target_sr: int = 16000, timings: dict = None):
+    """Decode an in-memory recording to a mono float32 signal.
+
+    ``data`` may be bytes, bytearray or a memoryview. Pass ``target_sr=None``
+    (or 0) to keep the native rate and skip resampling entirely. If
+    ``timings`` is given, the seconds spent in ``decode`` and ``resample``
+    are stored in it.
+    Returns ``(audio, sample_rate)``.
+    """
+    audio, sample_rate, _, _ = decode_window(data, target_sr=target_sr, timings=timings)
+    return audio, sample_rate
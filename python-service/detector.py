@@ -0,0 +1,602 @@
+"""
+CPU-bound AMD analysis.
+
+Everything in this module runs inside the process pool owned by main.py, so
+it must stay free of FastAPI/asyncio state and only take/return picklable
+values.
+"""
+import io
+import logging
+import os
+import signal
+import time
+import wave
+from typing import NamedTuple
+
+import numpy as np
+
+from acoustic import ACOUSTIC_FEATURE_NAMES, AcousticFrames
+from beep import Beep, BeepDetector
+from classifier import CLASSIFIER_NAME, Classifier
+from decoder import DecodeError, WindowDecoder, preload, sniff_format
+from features import FEATURE_NAMES, as_dict, extract_features
+from logs import configure_logging, get_logger
+from rules import RULESETS, RuleSet
+from vad import BlockVAD
+
+# Rate the detector runs at. The segmentation framing below was tuned at
+# 16 kHz; set AMD_DECODE_SR=0 to analyse at the recording's native rate
+# (8 kHz for Twilio) and skip resampling altogether.
+DECODE_SAMPLE_RATE = int(os.getenv("AMD_DECODE_SR", "16000")) or None
+
+# librosa.effects.split defaults at 16 kHz (128 ms frames, 32 ms hop)
+SPLIT_FRAME_SECONDS = 2048 / 16000
+SPLIT_HOP_SECONDS = 512 / 16000
+
+# Speech/silence threshold (see vad.py): "relative" reproduces
+# librosa.effects.split(top_db=30); "absolute" and "adaptive" judge quiet
+# and loud lines on the same scale
+VAD_THRESHOLD = os.getenv("AMD_VAD_THRESHOLD", "relative")
+
+# Windowed mode decodes and segments only the answer window (plus a margin
+# so segments crossing its edges are still seen as crossing them) instead
+# of the whole recording. The VAD's relative threshold is then measured
+# against the loudest frame of the window rather than of the recording.
+WINDOWED_DECODE = os.getenv("AMD_WINDOWED_DECODE", "1") not in ("0", "false", "no")
+WINDOW_MARGIN_SECONDS = 0.5
+
+# Recordings are decoded, resampled and segmented this many seconds at a
+# time, so a worker's memory does not grow with the recording length
+# (0 = the whole window in one block)
+DECODE_BLOCK_SECONDS = float(os.getenv("AMD_DECODE_BLOCK_SECONDS", "10")) or None
+
+# Recordings longer than this are refused from their header, before any
+# sample is decoded (0 = no limit)
+MAX_RECORDING_SECONDS = float(os.getenv("AMD_MAX_RECORDING_SECONDS", "1800"))
+
+# Classifier mode (classifier.py): the acoustic feature pass may spend this
+# long on a recording before the call falls back to the rule-set verdict
+CLASSIFIER_BUDGET_SECONDS = float(os.getenv("AMD_CLASSIFIER_BUDGET_MS", "50")) / 1000
+
+# Voicemail beep fast path (beep.py): every block is searched for a record
+# beep before it reaches the VAD, and a beep at least this confident ends
+# the analysis with a machine verdict (AMD_BEEP_DETECTION=0 turns it off)
+BEEP_DETECTION = os.getenv("AMD_BEEP_DETECTION", "1") not in ("0", "false", "no")
+BEEP_MIN_CONFIDENCE = float(os.getenv("AMD_BEEP_MIN_CONFIDENCE", "0.85"))
+
+# model_used is this name plus the rule-set version that produced the verdict
+MODEL_NAME = "librosa-smart-detection"
+# ... and this one for beep verdicts
+BEEP_MODEL_NAME = "goertzel-beep-detector"
+
+logger = get_logger("detector")
+
+
+class AnalysisError(Exception):
+    """Raised when the recording cannot be decoded or is unusable"""
+
+
+class RecordingTooLong(AnalysisError):
+    """Raised when a recording is longer than MAX_RECORDING_SECONDS"""
+
+
+class AnswerWindow(NamedTuple):
+    """Where the callee's answer is expected in a recording.
+
+    Speech must start at or after ``start`` seconds (trial message usually
+    done) and end at least ``end_margin`` seconds before the end of the
+    recording (TwiML greeting area).
+    """
+    start: float = 5.0
+    end_margin: float = 8.0
+
+
+DEFAULT_ANSWER_WINDOW = AnswerWindow()
+
+
+def init_worker(memory_mb: int = 0):
+    """Process-pool initializer.
+
+    Gives the worker its own log writer thread (threads do not survive the
+    fork) and ignores SIGINT/SIGTERM: a shutdown signal sent to the whole
+    process group must not kill analyses mid-flight, the parent drains and
+    then shuts the pool down. ``memory_mb`` caps the worker's data segment
+    (RLIMIT_DATA), so an oversized recording fails its own request with
+    MemoryError instead of taking the host into swap or the OOM killer.
+    """
+    configure_logging()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    if memory_mb:
+        try:
+            import resource
+        except ImportError:
+            logger.warning("per-worker memory limit not supported on this platform")
+            return
+        _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+        limit = memory_mb * 1024 * 1024
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, hard))
+
+
+def analyze_recording(
+    audio_bytes: bytes,
+    window: AnswerWindow = DEFAULT_ANSWER_WINDOW,
+    windowed: bool = None,
+    ruleset: RuleSet = None,
+    classifier: Classifier = None,
+    acoustic: bool = None,
+    beep: bool = None,
+    explain: bool = False,
+    variants: list = None,
+):
+    """Decode a downloaded recording and run the voicemail/human rules on it.
+
+    ``window`` is the answer window (per campaign); with ``windowed``
+    (default WINDOWED_DECODE) only that region is decoded and analysed.
+    ``ruleset`` defaults to the default version in rules.RULESETS.
+    The signal is decoded, resampled and segmented DECODE_BLOCK_SECONDS at
+    a time and never held in full.
+    With a ``classifier`` (classifier mode) the acoustic features of the
+    answer window are measured in the same pass and the model decides, the
+    rule set being the fallback and tie-breaker. ``acoustic`` (default: only
+    with a classifier) measures them without deciding, for training.
+    With ``beep`` (default BEEP_DETECTION) every block is first searched for
+    a voicemail beep; a confident one stops decoding there and answers
+    ``machine`` with ``beep_time`` (recording seconds where the beep ended)
+    without running the VAD, rules or classifier.
+    Returns ``(outcome, trace)``. ``outcome`` holds the AMDResponse fields
+    except ``detection_time``, which the caller measures end-to-end (download
+    included). ``trace`` carries per-stage seconds, the rules that fired and
+    the worker's peak RSS back to the parent process for metrics, plus
+    ``classifier`` (who decided and why) and ``features`` (the classifier
+    input vector) when acoustic features were measured, and ``beep`` when a
+    beep was found.
+    With ``explain`` the trace also gets ``explain``: every speech segment
+    with its energy, the answer segments, the named features and each
+    rule's contribution to the score (see RuleSet.explain), for the
+    service's debug traces.
+    ``variants`` are more ``(name, ruleset, classifier)`` detectors judged
+    on the same decode and segmentation (shadow evaluation); the trace gets
+    ``variants``, each name's outcome plus ``decided_by`` and the
+    ``seconds`` its own judging took. Classifier variants need ``acoustic``.
+    Only the variants are judged then: ``outcome`` is None and ``ruleset``
+    and ``classifier`` go unused.
+    """
+    if windowed is None:
+        windowed = WINDOWED_DECODE
+    if ruleset is None:
+        ruleset = RULESETS.get()
+    if acoustic is None:
+        acoustic = classifier is not None
+    if beep is None:
+        beep = BEEP_DETECTION
+    start, end = decode_range(window, windowed)
+
+    trace = {"stages": {}, "rules_fired": []}
+    if classifier is not None:
+        trace["classifier"] = {"decided_by": "heuristic", "reason": "no_speech"}
+    if explain:
+        trace["explain"] = {}
+    start_rss, _ = _reset_peak_rss()
+    container = sniff_format(audio_bytes)
+    try:
+        decoder = WindowDecoder(audio_bytes, start, end, target_sr=DECODE_SAMPLE_RATE)
+        if MAX_RECORDING_SECONDS and decoder.duration > MAX_RECORDING_SECONDS:
+            raise RecordingTooLong(
+                f"Recording is {decoder.duration:.0f}s long (limit {MAX_RECORDING_SECONDS:.0f}s)"
+            )
+        if decoder.duration == 0:
+            raise AnalysisError("Audio file is empty")
+
+        sample_rate = decoder.sample_rate
+        vad = _block_vad(sample_rate)
+        frames = _acoustic_frames(decoder, window) if acoustic else None
+        # In classifier mode the tone tracker runs over the whole window even
+        # without the fast path: its longest tone is a classifier feature
+        beeps = BeepDetector(
+            sample_rate, *_window_samples(decoder, window), BEEP_MIN_CONFIDENCE
+        ) if beep or frames is not None else None
+        found = None
+        segmentation = 0.0
+        blocks = decoder.blocks(DECODE_BLOCK_SECONDS, timings=trace["stages"])
+        for block in blocks:
+            if beeps is not None:
+                started = time.perf_counter()
+                first = beeps.push(block)
+                trace["stages"]["beep"] = trace["stages"].get("beep", 0.0) + time.perf_counter() - started
+                if beep and first is not None:
+                    found = first
+                    # The rest of the recording is never decoded
+                    blocks.close()
+                    break
+            started = time.perf_counter()
+            vad.push(block)
+            segmentation += time.perf_counter() - started
+            if frames is not None:
+                started = time.perf_counter()
+                frames.push(block)
+                classifying = trace["stages"].get("classifier", 0.0) + time.perf_counter() - started
+                trace["stages"]["classifier"] = classifying
+                if classifier is not None and classifying > CLASSIFIER_BUDGET_SECONDS:
+                    frames = None
+                    trace["classifier"] = {"decided_by": "heuristic", "reason": "over_budget"}
+    except DecodeError as e:
+        logger.warning("decode failed", extra={"container": container, "error": str(e)})
+        raise AnalysisError(f"Audio processing failed: {str(e)}")
+    offset, duration = decoder.offset, decoder.duration
+    logger.debug("decoded", extra={
+        "container": container, "samples": vad.n, "sample_rate": sample_rate,
+        "offset": offset, "duration": duration,
+    })
+    tone = None
+    if beeps is not None and found is None:
+        # A tone still running where the window ends
+        first = beeps.finish()
+        found = first if beep else None
+        tone = beeps.longest
+
+    if found is not None:
+        trace["window"] = (offset, offset + found.end)
+        trace["stages"]["segmentation"] = segmentation
+        trace["beep"] = found._replace(start=offset + found.start, end=offset + found.end)._asdict()
+        if classifier is not None:
+            trace["classifier"] = {"decided_by": "beep", "reason": "beep"}
+        beep_outcome = _beep_outcome(trace["beep"])
+
+        def judge(ruleset, frames, classifier, trace):
+            return beep_outcome
+    elif windowed and vad.n == 0:
+        # Recording too short to contain an answer window at all
+        trace["window"] = (offset, offset)
+
+        def judge(ruleset, frames, classifier, trace):
+            return _no_answer_outcome(ruleset)
+    else:
+        trace["window"] = (offset, offset + vad.n / sample_rate)
+        started = time.perf_counter()
+        intervals, energies = vad.finish()
+        trace["stages"]["segmentation"] = segmentation + time.perf_counter() - started
+
+        def judge(ruleset, frames, classifier, trace):
+            return _judge_segments(
+                intervals, energies, vad.n, sample_rate, trace, window, offset, duration, ruleset, frames, classifier, tone
+            )
+
+    if variants:
+        # Shadow evaluation: the caller already has the live verdict
+        trace["variants"] = _judge_variants(judge, variants, frames, "beep" in trace)
+        outcome = None
+    else:
+        outcome = judge(ruleset, frames, classifier, trace)
+    trace["start_rss_bytes"], trace["peak_rss_bytes"] = start_rss, _peak_rss()
+    return outcome, trace
+
+
+def _judge_variants(judge, variants: list, frames: AcousticFrames, beep: bool) -> dict:
+    """Outcome of every ``(name, ruleset, classifier)`` variant from the shared segmentation"""
+    judged = {}
+    for name, ruleset, classifier in variants:
+        trace = {"stages": {"segmentation": 0.0}, "rules_fired": []}
+        if classifier is not None:
+            trace["classifier"] = {"decided_by": "heuristic", "reason": "no_speech"}
+        started = time.perf_counter()
+        outcome = judge(ruleset, frames if classifier is not None else None, classifier, trace)
+        decided_by = "beep" if beep else trace["classifier"]["decided_by"] if classifier is not None else "heuristic"
+        judged[name] = {**outcome, "decided_by": decided_by, "seconds": time.perf_counter() - started}
+    return judged
+
+
+def decode_range(window: AnswerWindow = DEFAULT_ANSWER_WINDOW, windowed: bool = None) -> tuple:
+    """``(start, end)`` seconds of a recording that analyze_recording decodes.
+
+    None means the start/end of the recording; a negative ``end`` counts
+    back from the end. The downloader uses it to fetch only those bytes.
+    """
+    if windowed is None:
+        windowed = WINDOWED_DECODE
+    start = end = None
+    if windowed:
+        start = max(0.0, window.start - WINDOW_MARGIN_SECONDS)
+        if window.end_margin > WINDOW_MARGIN_SECONDS:
+            end = -(window.end_margin - WINDOW_MARGIN_SECONDS)
+    return start, end
+
+
+def _window_samples(decoder: WindowDecoder, window: AnswerWindow) -> tuple:
+    """The answer window as ``(start, end)`` samples of the decoded signal"""
+    sample_rate = decoder.sample_rate
+    return (
+        int(round((window.start - decoder.offset) * sample_rate)),
+        int(round((decoder.duration - window.end_margin - decoder.offset) * sample_rate)),
+    )
+
+
+def _acoustic_frames(decoder: WindowDecoder, window: AnswerWindow) -> AcousticFrames:
+    """Frame measurements limited to the answer window, in decoded-signal samples"""
+    start_sample, end_sample = _window_samples(decoder, window)
+    return AcousticFrames(decoder.sample_rate, start_sample=start_sample, end_sample=end_sample)
+
+
+def _reset_peak_rss():
+    """Restart this process's RSS high-water mark; returns ``(rss, peak)`` bytes before the reset.
+
+    Pool workers run one analysis at a time, so the mark read back by
+    _peak_rss is that analysis's peak. Linux only; None elsewhere.
+    """
+    rss = _rss_status()
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    return rss
+
+
+def _peak_rss():
+    """RSS high-water mark in bytes since the last _reset_peak_rss, or None"""
+    return _rss_status()[1]
+
+
+def _rss_status():
+    rss = peak = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return rss, peak
+
+
+def warm_up() -> float:
+    """Run the full decode -> resample -> segment -> score path once on a synthetic call.
+
+    Pays the one-off costs (lazy imports, first-call allocations) before the
+    first real request. Call it in the parent before the process pool forks
+    so every worker inherits the warm state. Returns the time taken in ms.
+    """
+    started = time.perf_counter()
+    preload()
+
+    # 20s of 8 kHz PCM line noise with a short greeting in the answer window
+    sr = 8000
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0, 0.002, 20 * sr)
+    t = np.arange(sr) / sr
+    audio[6 * sr:7 * sr] += 0.3 * np.sin(2 * np.pi * 160 * t)
+
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sr)
+        wav.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+
+    analyze_recording(buf.getvalue())
+
+    return (time.perf_counter() - started) * 1000
+
+
+def _no_answer_outcome(ruleset: RuleSet) -> dict:
+    return {
+        "result": "unknown",
+        "confidence": 0.70,
+        "reasoning": "No speech detected in expected answer window - likely silent or call quality issue",
+        "model_used": f"{MODEL_NAME}-{ruleset.version}",
+    }
+
+
+def _beep_outcome(beep: dict) -> dict:
+    return {
+        "result": "machine",
+        "confidence": round(min(0.99, beep["confidence"]), 2),
+        "reasoning": f"Voicemail beep: {beep['frequency']:.0f} Hz tone at {beep['start']:.2f}s "
+                     f"for {beep['end'] - beep['start']:.2f}s",
+        "model_used": BEEP_MODEL_NAME,
+        "beep_time": round(beep["end"], 3),
+    }
+
+
+def _block_vad(sample_rate: int) -> BlockVAD:
+    # Framing is scaled with the rate so segment timing does not depend on it
+    return BlockVAD(
+        sample_rate,
+        frame_seconds=SPLIT_FRAME_SECONDS,
+        hop_seconds=SPLIT_HOP_SECONDS,
+        threshold=VAD_THRESHOLD,
+        top_db=30,
+    )
+
+
+def _judge_segments(
+    all_intervals: np.ndarray,
+    all_energies: np.ndarray,
+    n_samples: int,
+    sample_rate: int,
+    trace: dict,
+    window: AnswerWindow,
+    offset: float,
+    full_duration: float,
+    ruleset: RuleSet,
+    frames: AcousticFrames = None,
+    classifier: Classifier = None,
+    tone: Beep = None,
+) -> dict:
+    """Answer-window filter and rule engine over the VAD output for ``n_samples`` of signal.
+
+    With acoustic ``frames`` the classifier features of the answer segments
+    are assembled too (``tone`` is the longest tone BeepDetector tracked in
+    the window), and a ``classifier`` gets to overrule the rules.
+    """
+    # Validate audio
+    if n_samples == 0:
+        raise AnalysisError("Audio file is empty")
+
+    if full_duration is None:
+        full_duration = n_samples / sample_rate
+    windowed = offset > 0 or n_samples < round(full_duration * sample_rate)
+    offset_samples = int(round(offset * sample_rate))
+    explain = trace.get("explain")
+    started = time.perf_counter()
+
+    if len(all_intervals) == 0:
+        if explain is not None:
+            explain.update(segments=[], answer_segments=[])
+        trace["stages"]["segmentation"] += time.perf_counter() - started
+        if windowed:
+            logger.debug("no speech in answer window", extra={"duration": full_duration})
+            return _no_answer_outcome(ruleset)
+        logger.debug("no speech in recording", extra={"duration": full_duration})
+        return {
+            "result": "unknown",
+            "confidence": 0.65,
+            "reasoning": "No speech detected in entire recording - possible silence or connection issue",
+            "model_used": f"{MODEL_NAME}-{ruleset.version}",
+        }
+
+    # Analyze each segment
+    segment_info = []
+    for i, ((start, end), segment_energy) in enumerate(zip(all_intervals.tolist(), all_energies.tolist())):
+        start += offset_samples
+        end += offset_samples
+        segment_info.append({
+            'index': i,
+            'start_time': start / sample_rate,
+            'end_time': end / sample_rate,
+            'duration': (end - start) / sample_rate,
+            'energy': segment_energy,
+            'start_sample': start,
+            'end_sample': end
+        })
+
+    # The answer is typically:
+    # - After 5-10 seconds (after trial message)
+    # - Before the last 8 seconds (before TwiML greeting)
+    # - Has reasonable energy (not background noise)
+
+    # Filter segments that could be the answer
+    potential_answer_segments = []
+
+    for seg in segment_info:
+        # Must start after 5 seconds (trial message usually done)
+        # Must end before total_duration - 8 seconds (TwiML greeting area)
+        # (both offsets configurable per campaign via ``window``)
+        if seg['start_time'] >= window.start and seg['end_time'] <= (full_duration - window.end_margin):
+            # Must have reasonable energy (not just noise)
+            if seg['energy'] > ruleset.segment_min_energy:
+                potential_answer_segments.append(seg)
+
+    trace["stages"]["segmentation"] += time.perf_counter() - started
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("segments", extra={
+            "duration": full_duration,
+            "segments": [(round(s['start_time'], 2), round(s['end_time'], 2), round(s['energy'], 4)) for s in segment_info],
+            "answer_segments": [s['index'] for s in potential_answer_segments],
+        })
+    if explain is not None:
+        explain["segments"] = [
+            [round(s['start_time'], 3), round(s['end_time'], 3), round(s['energy'], 5)] for s in segment_info
+        ]
+        explain["answer_segments"] = [s['index'] for s in potential_answer_segments]
+
+    if len(potential_answer_segments) == 0:
+        logger.debug("no speech in answer window", extra={"window": tuple(window)})
+        return _no_answer_outcome(ruleset)
+
+    # ====== ANALYZE THE ANSWER SEGMENTS ======
+
+    started = time.perf_counter()
+    verdict = score_answer_segments(potential_answer_segments, ruleset=ruleset)
+    trace["stages"]["scoring"] = time.perf_counter() - started
+    trace["rules_fired"] = verdict['rules_fired']
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("scored", extra={
+            "features": {name: round(verdict[name], 4) for name in FEATURE_NAMES},
+            "score": verdict['score'],
+            "voicemail_indicators": verdict['voicemail_indicators'],
+            "reasons": verdict['reasons'],
+            "result": verdict['result'],
+            "confidence": verdict['confidence'],
+        })
+    if explain is not None:
+        explain["features"] = {name: round(float(verdict[name]), 4) for name in FEATURE_NAMES}
+        explain.update(ruleset.explain(np.array([verdict[name] for name in FEATURE_NAMES])))
+
+    outcome = {
+        "result": verdict['result'],
+        "confidence": verdict['confidence'],
+        "reasoning": verdict['reasoning'],
+        "model_used": f"{MODEL_NAME}-{ruleset.version}",
+    }
+    if frames is not None:
+        outcome = _classify(
+            outcome, verdict, potential_answer_segments, offset_samples, frames, tone, classifier, trace
+        )
+    return outcome
+
+
+def _classify(
+    outcome: dict,
+    verdict: dict,
+    segments: list,
+    offset_samples: int,
+    frames: AcousticFrames,
+    tone: Beep,
+    classifier: Classifier,
+    trace: dict,
+) -> dict:
+    """Classifier-mode verdict for the answer segments, or the rule-set ``outcome`` when the model is unsure"""
+    started = time.perf_counter()
+    intervals = [(seg['start_sample'] - offset_samples, seg['end_sample'] - offset_samples) for seg in segments]
+    acoustic_vector = frames.summarize(intervals, tone)
+    vector = np.concatenate((np.array([verdict[name] for name in FEATURE_NAMES]), acoustic_vector))
+    trace["features"] = vector
+    decision = classifier.classify(vector) if classifier is not None else None
+    trace["stages"]["classifier"] = trace["stages"].get("classifier", 0.0) + time.perf_counter() - started
+    if decision is None:
+        return outcome
+
+    confident = decision["probability"] >= classifier.min_confidence
+    trace["classifier"] = {
+        "decided_by": "classifier" if confident else "heuristic",
+        "reason": "confident" if confident else "tie_break",
+        "result": decision["result"],
+        "probabilities": decision["probabilities"],
+    }
+    logger.debug("classified", extra={**trace["classifier"], "drivers": decision["drivers"], "rules": outcome["result"]})
+    if "explain" in trace:
+        trace["explain"]["acoustic_features"] = {
+            name: round(float(value), 4) for name, value in zip(ACOUSTIC_FEATURE_NAMES, acoustic_vector)
+        }
+        trace["explain"]["classifier_drivers"] = decision["drivers"]
+    if not confident:
+        return outcome
+
+    cues = f" - strongest cues: {', '.join(decision['drivers'])}" if decision["drivers"] else ""
+    return {
+        "result": decision["result"],
+        "confidence": round(decision["probability"], 2),
+        "reasoning": f"Acoustic classifier: {decision['result']} ({decision['probability']:.0%}){cues}; "
+                     f"rules say {outcome['result']}",
+        "model_used": f"{CLASSIFIER_NAME}-{classifier.version}",
+    }
+
+
+def score_answer_segments(potential_answer_segments: list, answer_end: float = None, ruleset: RuleSet = None) -> dict:
+    """Apply the voicemail/human rules to the speech segments of the answer window.
+
+    Each segment is a dict with ``start_time``, ``end_time``, ``duration`` and
+    ``energy``. ``answer_end`` defaults to the end of the last segment; the
+    streaming detector passes the current time so trailing silence counts.
+    ``ruleset`` defaults to the default version in rules.RULESETS.
+    """
+    features = extract_features(potential_answer_segments, answer_end=answer_end)
+    verdict = (ruleset or RULESETS.get()).score_features(features)
+    verdict.update(as_dict(features))
+    return verdict
@@ -0,0 +1,234 @@
+"""
+Non-blocking recording download.
+
+A single pooled httpx.AsyncClient is shared by every request so keep-alive
+connections to api.twilio.com are reused instead of re-doing TCP+TLS per call.
+The body is streamed into one buffer and abandoned as soon as it exceeds the
+size limit, so an oversized recording never lands in memory.
+
+Only the bytes the analysis decodes are needed. The WAV header in the first
+chunk says where the decode window's samples sit, so once the end of the
+window has arrived the transfer can stop (the TwiML greeting at the end of
+the recording is not needed). Abandoning a response closes its connection
+instead of returning it to the pool, though, and the next download then pays
+a new TCP+TLS handshake (and the redirect hop), so the transfer only stops
+early when at least EARLY_CLOSE_MIN_BYTES would be left unread; a shorter
+tail is read to keep the connection. When the host honours byte ranges and
+the window starts far enough in, the bytes before it are skipped with a
+Range request as well. Bytes left out stay zero in the returned buffer, which
+keeps the recording's length and layout for the decoder. Other containers (MP3
+needs the whole file to know its duration) are downloaded in full.
+
+Recordings are often not ready on the host yet when the status callback
+fires: throttling, 5xx answers and connection errors are retried with
+jittered exponential backoff, and so is a 404 during the first
+NOT_FOUND_RETRY_SECONDS (a recording still missing after that is not
+coming). A URL the client cannot request at all (malformed, not http(s))
+fails at once. All attempts together are bounded by one deadline.
+"""
+import asyncio
+import random
+
+import httpx
+
+from decoder import wav_byte_range
+
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+MAX_BACKOFF_SECONDS = 4.0
+# A 404 is retried only this long after the first attempt: long enough for
+# a recording that is still being written, not for one that does not exist
+NOT_FOUND_RETRY_SECONDS = 5.0
+
+# A WAV header that has not reached its data chunk within this many bytes is
+# not worth waiting for; the recording is then read in full
+HEADER_MAX_BYTES = 64 * 1024
+# A second (ranged) request costs a round trip; skipping fewer bytes than
+# this with one is not worth it
+RANGE_MIN_SKIP_BYTES = 256 * 1024
+# Closing a response early costs its keep-alive connection; leaving fewer
+# bytes than this unread is not worth a new handshake on the next download
+EARLY_CLOSE_MIN_BYTES = 256 * 1024
+
+
+class DownloadError(Exception):
+    """Raised when the recording host does not return the audio"""
+
+    def __init__(self, message: str, status_code: int = 0, retryable: bool = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = status_code in RETRY_STATUSES if retryable is None else retryable
+
+
+class RecordingTooLarge(DownloadError):
+    """Raised when a recording is bigger than the download size limit"""
+
+    def __init__(self, message: str):
+        super().__init__(message, status_code=413)
+
+
+class DownloadTimeout(DownloadError):
+    """Raised when the download deadline passes before the recording arrives"""
+
+    def __init__(self, message: str):
+        super().__init__(message, status_code=504, retryable=False)
+
+
+def create_client(account_sid: str, auth_token: str, max_connections: int) -> httpx.AsyncClient:
+    """Build the shared, connection-pooled client with Twilio basic auth"""
+    auth = (account_sid, auth_token) if account_sid and auth_token else None
+    return httpx.AsyncClient(
+        auth=auth,
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60.0,
+        ),
+        # Twilio answers recording URLs with a redirect to the media host
+        follow_redirects=True,
+    )
+
+
+async def fetch_recording(
+    client: httpx.AsyncClient,
+    audio_url: str,
+    max_bytes: int = None,
+    window: tuple = None,
+    retries: int = 0,
+    backoff: float = 0.25,
+    deadline: float = None,
+    stats: dict = None,
+) -> bytearray:
+    """Download a recording without blocking the event loop.
+
+    ``max_bytes`` (None = no limit) is checked against the recording's length
+    up front and against the bytes received while streaming.
+    ``window`` is the ``(start, end)`` seconds the analysis decodes (see
+    detector.decode_range); WAV bytes outside it are not fetched. None
+    fetches everything.
+    A failed attempt that may succeed later is retried up to ``retries``
+    times, waiting a random 0 to ``backoff * 2**attempt`` seconds (at most
+    MAX_BACKOFF_SECONDS) before each retry. ``deadline`` (None = none)
+    bounds all attempts and waits together, in seconds: an attempt still
+    running then raises DownloadTimeout, and a retry that could not start
+    before it is not made.
+    If ``stats`` is given it receives ``attempts``, ``retried`` (the status
+    of every failed attempt, 0 for connection errors), ``bytes`` (received)
+    and ``skipped`` (bytes of the recording never fetched).
+    """
+    if stats is None:
+        stats = {}
+    stats.update(attempts=0, retried=[], bytes=0, skipped=0)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    give_up = None if deadline is None else started + deadline
+    while True:
+        stats["attempts"] += 1
+        try:
+            return await asyncio.wait_for(
+                _fetch(client, audio_url, max_bytes, window, stats),
+                None if give_up is None else max(0.0, give_up - loop.time()),
+            )
+        except asyncio.TimeoutError:
+            raise DownloadTimeout(f"Failed to download audio: no recording within {deadline:g}s")
+        except DownloadError as e:
+            not_ready = e.status_code == 404 and loop.time() - started < NOT_FOUND_RETRY_SECONDS
+            if not (e.retryable or not_ready) or stats["attempts"] > retries:
+                raise
+            delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, backoff * 2 ** (stats["attempts"] - 1)))
+            if give_up is not None and loop.time() + delay >= give_up:
+                raise
+            stats["retried"].append(e.status_code)
+        await asyncio.sleep(delay)
+
+
+async def _fetch(client: httpx.AsyncClient, audio_url: str, max_bytes: int, window: tuple, stats: dict) -> bytearray:
+    stats["bytes"] = stats["skipped"] = 0
+    ranged = None
+    try:
+        async with client.stream("GET", audio_url) as response:
+            _check_status(response)
+            total = _length(response)
+            if max_bytes and total is not None and total > max_bytes:
+                raise RecordingTooLarge(f"Recording is {total} bytes (limit {max_bytes})")
+
+            if window is None or total is None:
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if max_bytes and len(body) > max_bytes:
+                        raise RecordingTooLarge(f"Recording exceeds {max_bytes} bytes")
+                stats["bytes"] = len(body)
+                return body
+
+            body = bytearray(total)
+            received = 0
+            needed = None
+            async for chunk in response.aiter_bytes():
+                if received + len(chunk) > total:
+                    raise DownloadError("Failed to download audio: more bytes than Content-Length")
+                body[received:received + len(chunk)] = chunk
+                received += len(chunk)
+                if needed is None:
+                    needed = wav_byte_range(memoryview(body)[:received], total, *window)
+                    if needed is None and received >= HEADER_MAX_BYTES:
+                        needed = (0, total)
+                if needed is not None:
+                    first, last = needed
+                    if (received >= last or first >= last) and total - received >= EARLY_CLOSE_MIN_BYTES:
+                        break
+                    if first - received >= RANGE_MIN_SKIP_BYTES and response.headers.get("accept-ranges") == "bytes":
+                        ranged = needed
+                        break
+            # Leaving the block early closes the response: the rest is never transferred
+
+        if ranged is not None:
+            received += await _fetch_range(client, audio_url, body, *ranged)
+    except (httpx.InvalidURL, httpx.UnsupportedProtocol, httpx.LocalProtocolError) as e:
+        # The URL or request itself is bad: no retry can fix it
+        raise DownloadError(f"Invalid recording URL: {e}", retryable=False)
+    except httpx.HTTPError as e:
+        raise DownloadError(f"Failed to download audio: {e}", retryable=isinstance(e, httpx.TransportError))
+
+    stats["bytes"] = received
+    stats["skipped"] = total - received
+    return body
+
+
+async def _fetch_range(client: httpx.AsyncClient, audio_url: str, body: bytearray, first: int, last: int) -> int:
+    """Fill ``body[first:last]`` with one ranged GET; returns the bytes received"""
+    async with client.stream("GET", audio_url, headers={"Range": f"bytes={first}-{last - 1}"}) as response:
+        _check_status(response, ok=(200, 206))
+        position = 0
+        if response.status_code == 206:
+            content_range = response.headers.get("content-range", "")
+            if not content_range.startswith(f"bytes {first}-"):
+                raise DownloadError(f"Failed to download audio: unexpected Content-Range {content_range!r}")
+            position = first
+        received = 0
+        async for chunk in response.aiter_bytes():
+            chunk = chunk[:len(body) - position]
+            body[position:position + len(chunk)] = chunk
+            position += len(chunk)
+            received += len(chunk)
+            if position >= last:
+                break
+        if position < last:
+            raise DownloadError("Failed to download audio: range ended early", retryable=True)
+    return received
+
+
+def _check_status(response: httpx.Response, ok: tuple = (200,)):
+    if response.status_code not in ok:
+        raise DownloadError(
+            f"Failed to download audio: HTTP {response.status_code}",
+            status_code=response.status_code,
+        )
+
+
+def _length(response: httpx.Response):
+    """Size of the recording, or None when the host does not say (or compresses it)"""
+    length = response.headers.get("content-length", "")
+    if not length.isdigit() or response.headers.get("content-encoding", "identity") != "identity":
+        return None
+    return int(length)
@@ -0,0 +1,77 @@
+"""
+Fixed-length numeric features of an answer window.
+
+The rule engine (rules.py) only ever looks at these numbers, so historical
+calls can be re-scored from a stored (N_calls x F) matrix without touching
+the audio again.
+"""
+import numpy as np
+
+FEATURE_NAMES = (
+    "n_segments",
+    "total_speech_duration",
+    "answer_duration",
+    "speech_ratio",
+    "avg_segment_duration",
+    "max_segment_duration",
+    "duration_std",
+    "duration_var",
+    "avg_energy",
+    "avg_gap",
+    "first_onset",
+    "answer_start",
+    "answer_end",
+)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+
+def extract_features(segments: list, answer_end: float = None) -> np.ndarray:
+    """Turn answer-window speech segments into a float64 vector ordered as FEATURE_NAMES.
+
+    Each segment is a dict with ``start_time``, ``end_time``, ``duration`` and
+    ``energy``. ``answer_end`` defaults to the end of the last segment.
+    The arithmetic mirrors the original inline rule chain operation for
+    operation so scores stay bit-identical.
+    """
+    durations = [seg['duration'] for seg in segments]
+
+    answer_start = segments[0]['start_time']
+    if answer_end is None:
+        answer_end = segments[-1]['end_time']
+    answer_duration = answer_end - answer_start
+
+    total_speech_duration = sum(durations)
+    speech_ratio = total_speech_duration / answer_duration if answer_duration > 0 else 0
+
+    gaps = [segments[i + 1]['start_time'] - segments[i]['end_time'] for i in range(len(segments) - 1)]
+
+    return np.array([
+        len(segments),
+        total_speech_duration,
+        answer_duration,
+        speech_ratio,
+        np.mean(durations),
+        max(durations),
+        # Spread is only meaningful (and only consulted) with 2+ segments
+        np.std(durations) if len(segments) >= 2 else 0.0,
+        np.var(durations) if len(segments) >= 2 else 0.0,
+        np.mean([seg['energy'] for seg in segments]),
+        np.mean(gaps) if len(gaps) > 0 else 0,
+        segments[0]['start_time'],
+        answer_start,
+        answer_end,
+    ], dtype=np.float64)
+
+
+def extract_feature_matrix(segment_lists: list, answer_ends: list = None) -> np.ndarray:
+    """Stack feature vectors for many calls into an (N, F) matrix"""
+    if answer_ends is None:
+        answer_ends = [None] * len(segment_lists)
+    if not segment_lists:
+        return np.empty((0, len(FEATURE_NAMES)), dtype=np.float64)
+    return np.vstack([extract_features(s, e) for s, e in zip(segment_lists, answer_ends)])
+
+
+def as_dict(features: np.ndarray) -> dict:
+    """Named view of one feature vector as plain Python floats"""
+    return {name: float(features[i]) for name, i in FEATURE_INDEX.items()}
@@ -0,0 +1,92 @@
+"""
+Leveled JSON logging.
+
+One JSON object per line on stdout. Records are formatted where they are
+logged but written by a background QueueListener thread, so a slow stdout
+never blocks the event loop or a DSP worker. Per-request detail (segment
+lists, scoring breakdowns) is logged at DEBUG and costs only a level check
+at the default AMD_LOG_LEVEL=INFO.
+
+Keyword fields passed via ``extra=`` become top-level JSON keys.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+# Attributes every LogRecord has; anything else came from ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+_listener_pid = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _PreformattedQueueHandler(logging.handlers.QueueHandler):
+    """Queue the finished JSON line; the listener thread only writes it"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        line = self.format(record)
+        return logging.makeLogRecord({"msg": line, "levelno": record.levelno, "levelname": record.levelname})
+
+
+def configure_logging(level: str = None):
+    """Install the JSON handler on the ``amd`` logger tree.
+
+    ``level`` defaults to AMD_LOG_LEVEL (read at call time, after .env).
+
+    Safe to call again in a forked process-pool worker (the parent's listener
+    thread does not survive the fork, so each process needs its own).
+    """
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+
+    records = queue.SimpleQueue()
+    handler = _PreformattedQueueHandler(records)
+    handler.setFormatter(JsonFormatter())
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter("%(message)s"))
+    _listener = logging.handlers.QueueListener(records, stream)
+    _listener.start()
+    _listener_pid = os.getpid()
+
+    root = logging.getLogger("amd")
+    root.handlers[:] = [handler]
+    root.setLevel((level or os.getenv("AMD_LOG_LEVEL", "INFO")).upper())
+    root.propagate = False
+
+
+def flush_logging():
+    """Drain queued records (at shutdown)"""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"amd.{name}")
+
+
+atexit.register(flush_logging)
@@ -1,23 +1,218 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
+import asyncio
+import functools
+import hashlib
+import json
 import os
-import requests
+import random
+import shutil
+import signal
 import tempfile
-import torch
-import librosa
-import numpy as np
-from typing import Literal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Literal, Optional
 import time
 from dotenv import load_dotenv
 
+import metrics
+from cache import ResultCache, audio_digest
+from classifier import ClassifierError, load_classifier
+from detector import (
+    BEEP_DETECTION,
+    BEEP_MIN_CONFIDENCE,
+    DECODE_SAMPLE_RATE,
+    DEFAULT_ANSWER_WINDOW,
+    VAD_THRESHOLD,
+    WINDOWED_DECODE,
+    AnalysisError,
+    AnswerWindow,
+    RecordingTooLong,
+    analyze_recording,
+    decode_range,
+    init_worker,
+    warm_up,
+)
+from downloader import DownloadError, DownloadTimeout, RecordingTooLarge, create_client, fetch_recording
+from logs import configure_logging, flush_logging, get_logger
+from rules import RULESETS, RuleSet, RuleSetError
+from shared import RecentStore, ReloadMarker
+from singleflight import SingleFlight
+from streaming import StreamingDetector
+
 # Load environment variables
 load_dotenv()
 
+# JSON logs on stdout, level from AMD_LOG_LEVEL
+configure_logging()
+logger = get_logger("service")
+
 # Get Twilio credentials
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 
+# Production launch (python main.py, see serve()): AMD_WEB_WORKERS uvicorn
+# worker processes ("auto" = one per core). The web workers share the result
+# cache through a SQLite file, /metrics through AMD_METRICS_DIR, and rule-set
+# reloads, debug traces and streaming verdicts through AMD_STATE_DIR (see
+# shared.py), so any worker can answer for another. On
+# SIGTERM a worker stops taking new work and gives in-flight analyses up to
+# AMD_DRAIN_SECONDS to finish.
+_web_workers = os.getenv("AMD_WEB_WORKERS", "1")
+WEB_WORKERS = (os.cpu_count() or 1) if _web_workers == "auto" else max(1, int(_web_workers))
+HOST = os.getenv("AMD_HOST", "0.0.0.0")
+PORT = int(os.getenv("AMD_PORT", "8000"))
+DRAIN_SECONDS = float(os.getenv("AMD_DRAIN_SECONDS", "30"))
+METRICS_DIR = os.getenv("AMD_METRICS_DIR") or None
+METRICS_PUBLISH_SECONDS = 1.0
+STATE_DIR = os.getenv("AMD_STATE_DIR") or None
+
+# Concurrency: each web worker runs DSP in a process pool, sized so the
+# pools of all web workers together use every core once. At most
+# AMD_MAX_IN_FLIGHT analyses (download + DSP) are admitted per web worker.
+# AMD_WORKER_MEMORY_MB caps the memory of every DSP process (0 = no cap).
+PROCESS_WORKERS = int(os.getenv("AMD_PROCESS_WORKERS", max(1, (os.cpu_count() or 1) // WEB_WORKERS)))
+MAX_IN_FLIGHT = int(os.getenv("AMD_MAX_IN_FLIGHT", PROCESS_WORKERS * 4))
+WORKER_MEMORY_MB = int(os.getenv("AMD_WORKER_MEMORY_MB", "1024"))
+
+# Recording limits: downloads bigger than AMD_MAX_RECORDING_BYTES are cut off
+# (0 = no limit) and recordings longer than AMD_MAX_RECORDING_SECONDS are
+# refused from their header (detector.py); both answer 413. Analysis memory
+# is bounded by AMD_DECODE_BLOCK_SECONDS, the decode/segmentation block size.
+MAX_RECORDING_BYTES = int(os.getenv("AMD_MAX_RECORDING_BYTES", 64 * 1024 * 1024))
+
+# Downloads fetch only the bytes of a WAV recording the analysis decodes
+# (AMD_PARTIAL_DOWNLOAD=0 fetches whole recordings). A recording that is not
+# there yet (404 in the first seconds), a throttled or failing host and
+# connection errors are retried AMD_DOWNLOAD_RETRIES times with jittered
+# exponential backoff starting at AMD_DOWNLOAD_BACKOFF_MS (see downloader.py).
+# All attempts of one download share AMD_DOWNLOAD_DEADLINE_SECONDS (0 = no
+# limit); after it the request is answered 504.
+PARTIAL_DOWNLOAD = os.getenv("AMD_PARTIAL_DOWNLOAD", "1") not in ("0", "false", "no")
+DOWNLOAD_RETRIES = int(os.getenv("AMD_DOWNLOAD_RETRIES", "4"))
+DOWNLOAD_BACKOFF_SECONDS = float(os.getenv("AMD_DOWNLOAD_BACKOFF_MS", "250")) / 1000
+DOWNLOAD_DEADLINE_SECONDS = float(os.getenv("AMD_DOWNLOAD_DEADLINE_SECONDS", "30"))
+
+# Concurrent identical requests (same call, recording, campaign, rule set
+# and trace flag) share one download + analysis and all get its response
+# (see singleflight.py); AMD_COALESCE_REQUESTS=0 runs each one separately
+COALESCE_REQUESTS = os.getenv("AMD_COALESCE_REQUESTS", "1") not in ("0", "false", "no")
+
+# Streaming AMD: seconds of lead-in to ignore, confidence needed for an early
+# verdict, and the point (seconds after answer) where we decide regardless
+STREAM_SKIP_SECONDS = float(os.getenv("AMD_STREAM_SKIP_SECONDS", "0"))
+STREAM_CONFIDENCE = float(os.getenv("AMD_STREAM_CONFIDENCE", "0.85"))
+STREAM_DEADLINE = float(os.getenv("AMD_STREAM_DEADLINE", "4.0"))
+STREAM_RESULTS_MAX = 1000
+
+# Batch re-processing: items per request, and how many batch items, over all
+# batches together, are downloading/analysing at once (defaults to one pool's
+# worth so backlog runs never queue more than that ahead of live /analyze
+# calls). Running batch items count as in flight like /analyze calls.
+BATCH_MAX_ITEMS = int(os.getenv("AMD_BATCH_MAX_ITEMS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("AMD_BATCH_CONCURRENCY", PROCESS_WORKERS))
+
+# Result cache: AMD_CACHE_MAX_ENTRIES=0 disables it, AMD_CACHE_PATH adds a
+# SQLite file so cached verdicts survive restarts, holding at most
+# AMD_CACHE_MAX_DISK_ENTRIES of them (oldest dropped first, 0 = no cap)
+CACHE_MAX_ENTRIES = int(os.getenv("AMD_CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("AMD_CACHE_TTL_SECONDS", "86400"))
+CACHE_PATH = os.getenv("AMD_CACHE_PATH") or None
+CACHE_MAX_DISK_ENTRIES = int(os.getenv("AMD_CACHE_MAX_DISK_ENTRIES", "100000"))
+
+# Answer window per campaign, as JSON (inline or a file path), e.g.
+# {"paid-account": {"start": 0.5, "end_margin": 8}}. Requests name their
+# campaign; unknown or missing campaigns use the 5s / last-8s default.
+def load_campaign_windows(spec: str) -> dict:
+    if not spec:
+        return {}
+    if not spec.lstrip().startswith("{"):
+        with open(spec) as f:
+            spec = f.read()
+    return {
+        name: AnswerWindow(
+            start=float(cfg.get("start", DEFAULT_ANSWER_WINDOW.start)),
+            end_margin=float(cfg.get("end_margin", DEFAULT_ANSWER_WINDOW.end_margin)),
+        )
+        for name, cfg in json.loads(spec).items()
+    }
+
+CAMPAIGN_WINDOWS = load_campaign_windows(os.getenv("AMD_CAMPAIGN_WINDOWS", ""))
+
+# Rule sets (rules.py): AMD_RULESET_DIR holds the versioned JSON files and
+# AMD_RULESET names the default. AMD_RULESET_SPLIT sends a share of traffic
+# to other versions for A/B tests, as JSON percentages, e.g.
+# {"v3-candidate": 10}; a call always lands in the same arm (hash of its
+# call_id). A request's own `ruleset` field overrides both.
+def load_ruleset_split(spec: str) -> list:
+    if not spec:
+        return []
+    split = [(version, float(percent)) for version, percent in json.loads(spec).items()]
+    if sum(percent for _, percent in split) > 100:
+        raise ValueError("AMD_RULESET_SPLIT percentages add up to more than 100")
+    return split
+
+RULESET_SPLIT = load_ruleset_split(os.getenv("AMD_RULESET_SPLIT", ""))
+
+# Detector mode: "heuristic" scores with the rule sets only; "classifier"
+# lets the model in AMD_CLASSIFIER_MODEL (trained with
+# benchmarks/train_classifier.py) decide from timing and acoustic features,
+# with the rule set as fallback and tie-breaker (see classifier.py).
+# AMD_CLASSIFIER_BUDGET_MS caps the acoustic pass per call (detector.py).
+DETECTOR_MODE = os.getenv("AMD_DETECTOR_MODE", "heuristic")
+CLASSIFIER_MODEL = os.getenv("AMD_CLASSIFIER_MODEL", "")
+
+# Debug traces: a request with "trace": true, and a random AMD_TRACE_SAMPLE_RATE
+# share (0-1) of all others, records a structured trace of its analysis
+# (segments, features, every rule's contribution, stage timings) instead of
+# needing debug logging in production. Each web worker keeps the last
+# AMD_TRACE_MAX_ENTRIES traces it recorded for GET /trace/{call_id}, which
+# any worker answers.
+TRACE_SAMPLE_RATE = float(os.getenv("AMD_TRACE_SAMPLE_RATE", "0"))
+TRACE_MAX_ENTRIES = int(os.getenv("AMD_TRACE_MAX_ENTRIES", "500"))
+
+# Shadow evaluation: AMD_SHADOW_VARIANTS names detectors to run on live
+# traffic next to the one that answers, comma-separated: a rule-set version,
+# "heuristic" (the default rule set alone), "classifier" (AMD_CLASSIFIER_MODEL
+# over the default rule set) or "<version>+classifier". Once a call is
+# answered, one extra pool job decodes its recording once and judges every
+# variant on that decode; their verdicts, agreement with the live verdict and
+# latencies go to the log and /metrics, never to the caller. A share
+# AMD_SHADOW_SAMPLE_RATE of calls is shadowed, and at most
+# AMD_SHADOW_MAX_IN_FLIGHT shadow jobs are queued or running at once (calls
+# beyond that are not shadowed). Shadow jobs go through the same first-in,
+# first-out process pool as live calls, so a live call can wait behind up to
+# that many of them; keep it well under AMD_PROCESS_WORKERS.
+SHADOW_VARIANTS = [name.strip() for name in os.getenv("AMD_SHADOW_VARIANTS", "").split(",") if name.strip()]
+SHADOW_SAMPLE_RATE = float(os.getenv("AMD_SHADOW_SAMPLE_RATE", "1"))
+SHADOW_MAX_IN_FLIGHT = int(os.getenv("AMD_SHADOW_MAX_IN_FLIGHT", max(1, PROCESS_WORKERS // 2)))
+
+process_pool = None
+http_client = None
+in_flight = 0
+joined = 0
+stream_results = RecentStore(STREAM_RESULTS_MAX, STATE_DIR and os.path.join(STATE_DIR, "streams"))
+traces = RecentStore(TRACE_MAX_ENTRIES, STATE_DIR and os.path.join(STATE_DIR, "traces"))
+rules_reload = ReloadMarker(os.path.join(STATE_DIR, "rules-reload")) if STATE_DIR else None
+flights = SingleFlight()
+result_cache = None
+ready = False
+draining = False
+warm_up_ms = None
+metrics_publisher = None
+classifier = None
+shadow_classifier = None
+shadow_in_flight = 0
+shadow_tasks = set()
+batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+metrics.IN_FLIGHT.set_function(lambda: in_flight)
+metrics.JOINED_IN_FLIGHT.set_function(lambda: joined)
+if METRICS_DIR:
+    metrics.configure_multiprocess(METRICS_DIR)
+
 # Initialize FastAPI
 app = FastAPI(title="AMD HuggingFace Service", version="2.0.0")
 
@@ -35,6 +230,9 @@ class AMDRequest(BaseModel):
     """Request model for AMD analysis"""
     audio_url: str = Field(..., description="URL to the audio recording")
     call_id: str = Field(..., min_length=1, description="Unique call identifier")
+    campaign: Optional[str] = Field(default=None, description="Campaign name selecting the answer window offsets")
+    ruleset: Optional[str] = Field(default=None, description="Rule-set version to score with (default: server default / A/B split)")
+    trace: bool = Field(default=False, description="Record a debug trace of this analysis, served at /trace/{call_id}")
 
 class AMDResponse(BaseModel):
     """Response model for AMD analysis"""
@@ -43,19 +241,184 @@ class AMDResponse(BaseModel):
     reasoning: str = Field(..., min_length=1, description="Human-readable explanation")
     detection_time: int = Field(..., ge=0, description="Processing time in milliseconds")
     model_used: str = Field(default="heuristic-based", description="Model or method used")
+    beep_time: Optional[float] = Field(default=None, description="Seconds into the recording where the voicemail beep ended (time to drop a message); beep verdicts only")
+
+class AMDBatchRequest(BaseModel):
+    """Request model for re-analysing many stored recordings"""
+    items: List[AMDRequest] = Field(..., min_length=1, description="Recordings to analyse")
+
+class AMDBatchItem(BaseModel):
+    """One NDJSON line of a batch response, emitted as soon as that item finishes"""
+    call_id: str
+    ok: bool
+    response: Optional[AMDResponse] = None
+    error: Optional[str] = None
+    status_code: int = Field(default=200, description="HTTP status the item would have had on /analyze")
 
 # Initialize model on startup
 @app.on_event("startup")
 async def load_model():
-    print("🤖 AMD HuggingFace Service starting...")
-    print(f"🔐 Twilio SID configured: {bool(TWILIO_ACCOUNT_SID)}")
-    print(f"🔐 Twilio Token configured: {bool(TWILIO_AUTH_TOKEN)}")
+    global process_pool, http_client, result_cache, ready, warm_up_ms, metrics_publisher, classifier, shadow_classifier
+    logger.info("AMD service starting", extra={
+        "twilio_sid_configured": bool(TWILIO_ACCOUNT_SID),
+        "twilio_token_configured": bool(TWILIO_AUTH_TOKEN),
+    })
     
     if not TWILIO_ACCOUNT_SID or not TWILIO_AUTH_TOKEN:
-        print("⚠️ WARNING: Twilio credentials not found in .env!")
-        print("   Make sure TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN are set")
+        logger.warning("Twilio credentials not found in .env; set TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN")
+    
+    # Compile every rule set before anything is served; a broken file here
+    # is a startup failure, a broken file on reload keeps the old set
+    rulesets = RULESETS.reload()
+    missing = [version for version, _ in RULESET_SPLIT if version not in rulesets]
+    if missing:
+        raise RuleSetError(f"AMD_RULESET_SPLIT names unknown rule sets: {', '.join(missing)}")
+    logger.info("Rule sets loaded", extra={
+        "default": RULESETS.default,
+        "versions": {version: rs.fingerprint for version, rs in rulesets.items()},
+        "split": dict(RULESET_SPLIT),
+    })
+    
+    if DETECTOR_MODE not in ("heuristic", "classifier"):
+        raise ValueError(f"AMD_DETECTOR_MODE must be heuristic or classifier, not {DETECTOR_MODE!r}")
+    if DETECTOR_MODE == "classifier":
+        if not CLASSIFIER_MODEL:
+            raise ClassifierError("AMD_DETECTOR_MODE=classifier needs a model file in AMD_CLASSIFIER_MODEL")
+        classifier = load_classifier(CLASSIFIER_MODEL)
+        logger.info("Classifier loaded", extra=classifier.describe())
+    
+    if SHADOW_VARIANTS:
+        unknown = [name for name in SHADOW_VARIANTS if (shadow_variant(name)[0] or RULESETS.default) not in rulesets]
+        if unknown:
+            raise RuleSetError(f"AMD_SHADOW_VARIANTS names unknown rule sets: {', '.join(unknown)}")
+        if any(shadow_variant(name)[1] for name in SHADOW_VARIANTS):
+            if not CLASSIFIER_MODEL:
+                raise ClassifierError("AMD_SHADOW_VARIANTS has classifier variants but no model in AMD_CLASSIFIER_MODEL")
+            shadow_classifier = classifier or load_classifier(CLASSIFIER_MODEL)
+        logger.info("Shadow variants", extra={
+            "variants": SHADOW_VARIANTS, "sample_rate": SHADOW_SAMPLE_RATE, "max_in_flight": SHADOW_MAX_IN_FLIGHT,
+        })
+    
+    # Warm the DSP path here, before the pool forks, so every worker starts
+    # with it already imported and exercised
+    try:
+        warm_up_ms = warm_up()
+        logger.info("DSP path warmed up", extra={"warm_up_ms": round(warm_up_ms)})
+    except Exception:
+        logger.exception("Warm-up failed, first request will be slower")
+    
+    process_pool = create_pool()
+    # Start the workers now rather than on the first request
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(process_pool, os.getpid) for _ in range(PROCESS_WORKERS)))
+    http_client = create_client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, MAX_IN_FLIGHT)
+    logger.info("DSP workers started", extra={
+        "workers": PROCESS_WORKERS, "max_in_flight": MAX_IN_FLIGHT, "worker_memory_mb": WORKER_MEMORY_MB,
+    })
+    
+    result_cache = ResultCache(
+        namespace=(
+            f"{DECODE_SAMPLE_RATE or 'native'}{'/windowed' if WINDOWED_DECODE else ''}/vad-{VAD_THRESHOLD}"
+            f"{f'/beep{BEEP_MIN_CONFIDENCE:g}' if BEEP_DETECTION else ''}"
+        ),
+        max_entries=CACHE_MAX_ENTRIES,
+        ttl_seconds=CACHE_TTL_SECONDS,
+        path=CACHE_PATH,
+        max_disk_entries=CACHE_MAX_DISK_ENTRIES,
+    )
+    logger.info("Result cache ready", extra={
+        "max_entries": CACHE_MAX_ENTRIES, "ttl_seconds": CACHE_TTL_SECONDS, "disk_path": CACHE_PATH,
+        "max_disk_entries": CACHE_MAX_DISK_ENTRIES,
+    })
+    
+    logger.info("Answer windows", extra={
+        "windowed_decode": WINDOWED_DECODE,
+        "default": DEFAULT_ANSWER_WINDOW._asdict(),
+        "campaigns": {name: w._asdict() for name, w in CAMPAIGN_WINDOWS.items()},
+    })
     
-    print("✅ Service ready with enhanced voicemail detection!")
+    if METRICS_DIR:
+        metrics_publisher = asyncio.create_task(publish_metrics())
+    install_drain_handler(loop)
+    
+    # SIGHUP to a web worker reloads the rule sets of every worker, like POST
+    # /rules/reload (only possible when the loop runs in the main thread;
+    # failures are already logged, and retrieving the exception keeps asyncio
+    # quiet)
+    try:
+        loop.add_signal_handler(
+            signal.SIGHUP,
+            lambda: loop.run_in_executor(None, reload_rulesets).add_done_callback(lambda f: f.exception()),
+        )
+    except (AttributeError, NotImplementedError, RuntimeError):
+        logger.debug("SIGHUP reload unavailable in this process")
+    
+    ready = True
+    logger.info("Service ready")
+
+@app.on_event("shutdown")
+async def release_resources():
+    # Runs once uvicorn has drained the in-flight requests; pending shadow
+    # evaluations are dropped rather than waited for
+    for task in list(shadow_tasks):
+        task.cancel()
+    if http_client is not None:
+        await http_client.aclose()
+    if process_pool is not None:
+        process_pool.shutdown(wait=True)
+    if result_cache is not None:
+        result_cache.close()
+    traces.close()
+    stream_results.close()
+    if metrics_publisher is not None:
+        metrics_publisher.cancel()
+        metrics.write_snapshot()
+    logger.info("Service stopped", extra={"pid": os.getpid()})
+    flush_logging()
+
+def create_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=PROCESS_WORKERS, initializer=init_worker, initargs=(WORKER_MEMORY_MB,))
+
+def replace_broken_pool(pool: ProcessPoolExecutor):
+    """A DSP worker died (OOM kill, segfault): start a fresh pool once, for every caller that hit it"""
+    global process_pool
+    if process_pool is pool:
+        logger.error("DSP worker died, restarting the process pool")
+        pool.shutdown(wait=False, cancel_futures=True)
+        process_pool = create_pool()
+
+async def publish_metrics():
+    """Keep this worker's metrics snapshot fresh for whichever worker gets scraped"""
+    while True:
+        metrics.write_snapshot()
+        await asyncio.sleep(METRICS_PUBLISH_SECONDS)
+
+def install_drain_handler(loop: asyncio.AbstractEventLoop):
+    """Flag the worker as draining on SIGTERM/SIGINT, then let uvicorn shut down as usual.
+
+    uvicorn stops accepting connections and waits (up to
+    timeout_graceful_shutdown) for open requests; the flag makes /health
+    report it and turns away work that has not started yet (new requests on
+    kept-alive connections, batch items still queued) with a retryable 503.
+    Signal handlers can only be set from the main thread, so this is a no-op
+    under test clients that run the app in a thread.
+    """
+    def on_signal(signum, frame, previous):
+        global draining
+        if not draining:
+            draining = True
+            loop.call_soon_threadsafe(lambda: logger.info("Draining before shutdown", extra={
+                "signal": signal.Signals(signum).name, "in_flight": in_flight, "drain_seconds": DRAIN_SECONDS,
+            }))
+        if callable(previous):
+            previous(signum, frame)
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        try:
+            signal.signal(sig, lambda signum, frame, previous=previous: on_signal(signum, frame, previous))
+        except ValueError:
+            return
 
 @app.get("/")
 async def root():
@@ -69,19 +432,162 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {
-        "status": "healthy",
-        "twilio_auth": bool(TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN)
+    health = {
+        "status": "draining" if draining else "healthy" if ready else "starting",
+        "ready": ready,
+        "warm_up_ms": round(warm_up_ms) if warm_up_ms is not None else None,
+        "twilio_auth": bool(TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN),
+        "in_flight": in_flight,
+        "joined_in_flight": joined,
+        "max_in_flight": MAX_IN_FLIGHT,
+        "ruleset": RULESETS.default,
+        "mode": DETECTOR_MODE,
+        "classifier": classifier.version if classifier is not None else None,
+        "shadow_variants": SHADOW_VARIANTS,
+        "pid": os.getpid(),
     }
+    # Not ready until warm-up is done (or once draining), so load balancers hold traffic back
+    if not ready or draining:
+        return JSONResponse(status_code=503, content=health)
+    return health
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape target"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/rules")
+async def list_rulesets():
+    await follow_rules_reload()
+    return {**RULESETS.describe(), "split": dict(RULESET_SPLIT)}
+
+@app.post("/rules/reload")
+async def reload_rules():
+    """Recompile the rule-set directory and swap it in; in-flight calls finish on the old rules"""
+    loop = asyncio.get_running_loop()
+    try:
+        rulesets = await loop.run_in_executor(None, reload_rulesets)
+    except RuleSetError as e:
+        raise HTTPException(status_code=400, detail=f"Reload failed, keeping current rule sets: {e}")
+    return {"reloaded": True, "versions": {version: rs.fingerprint for version, rs in rulesets.items()}}
+
+def reload_rulesets(broadcast: bool = True) -> dict:
+    """Reload this worker's rule sets and, with ``broadcast``, have the other web workers follow"""
+    try:
+        rulesets = RULESETS.reload()
+    except RuleSetError as e:
+        metrics.RULESET_RELOADS.inc(status="error")
+        logger.error("Rule-set reload failed, keeping current rule sets", extra={"error": str(e)})
+        raise
+    metrics.RULESET_RELOADS.inc(status="ok")
+    logger.info("Rule sets reloaded", extra={"versions": {version: rs.fingerprint for version, rs in rulesets.items()}})
+    if broadcast and rules_reload is not None:
+        rules_reload.signal()
+    return rulesets
+
+async def follow_rules_reload():
+    """Reload the rule sets if another web worker has since it was last checked (one stat)"""
+    if rules_reload is not None and rules_reload.changed():
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, reload_rulesets, False)
+        except RuleSetError:
+            # Logged; this worker keeps its current rule sets
+            pass
+
+def select_ruleset(request: AMDRequest) -> RuleSet:
+    """The request's own version, else its A/B arm, else the default"""
+    if request.ruleset:
+        try:
+            return RULESETS.get(request.ruleset)
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"Unknown rule set: {request.ruleset}")
+    if RULESET_SPLIT:
+        digest = hashlib.blake2b(request.call_id.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest, "big") % 10000 / 100
+        for version, percent in RULESET_SPLIT:
+            if bucket < percent:
+                try:
+                    return RULESETS.get(version)
+                except KeyError:
+                    # Removed by a reload; the call falls back to the default
+                    break
+            bucket -= percent
+    return RULESETS.get()
 
 @app.post("/analyze", response_model=AMDResponse)
 async def analyze_audio(request: AMDRequest) -> AMDResponse:
+    global in_flight, joined
+
+    if draining:
+        metrics.REQUESTS.inc(endpoint="analyze", status=503)
+        raise HTTPException(status_code=503, detail="AMD service shutting down, retry", headers={"Retry-After": "1"})
+    await follow_rules_reload()
+
+    # Backpressure: shed load instead of queueing unboundedly behind the pool
+    # (a duplicate of a call in flight adds no work, it only waits for it, so
+    # it is neither turned away nor counted)
+    joining = joins_flight(request)
+    if in_flight >= MAX_IN_FLIGHT and not joining:
+        logger.warning("Rejecting call: service saturated", extra={"call_id": request.call_id, "in_flight": in_flight})
+        metrics.REQUESTS.inc(endpoint="analyze", status=503)
+        raise HTTPException(
+            status_code=503,
+            detail=f"AMD service saturated ({in_flight} analyses in flight), retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    if joining:
+        joined += 1
+    else:
+        in_flight += 1
+    try:
+        response = await run_analysis(request)
+    except HTTPException as e:
+        metrics.REQUESTS.inc(endpoint="analyze", status=e.status_code)
+        raise
+    finally:
+        if joining:
+            joined -= 1
+        else:
+            in_flight -= 1
+    metrics.REQUESTS.inc(endpoint="analyze", status=200)
+    return response
+
+async def run_analysis(request: AMDRequest) -> AMDResponse:
+    """Analyse one request, joining an identical one already in flight if there is one"""
+    if not COALESCE_REQUESTS:
+        return await analyze_request(request)
     start_time = time.time()
-    temp_audio_path = None
-    
+    key = coalescing_key(request)
+    if key not in flights:
+        return await flights.run(key, lambda: analyze_request(request))
+    metrics.COALESCED_REQUESTS.inc()
+    response = await flights.run(key, lambda: analyze_request(request))
+    detection_time = int((time.time() - start_time) * 1000)
+    logger.info("Call coalesced with an in-flight analysis", extra={
+        "call_id": request.call_id, "result": response.result, "detection_time_ms": detection_time,
+    })
+    return response.model_copy(update={"detection_time": detection_time})
+
+def coalescing_key(request: AMDRequest) -> tuple:
+    """Requests with the same key get the same response, so they can share one analysis"""
+    return (request.call_id, request.audio_url, request.campaign, request.ruleset, request.trace)
+
+def joins_flight(request: AMDRequest) -> bool:
+    """Whether run_analysis would join an identical analysis already in flight instead of starting one"""
+    return COALESCE_REQUESTS and coalescing_key(request) in flights
+
+async def analyze_request(request: AMDRequest) -> AMDResponse:
+    start_time = time.time()
+    debug = start_trace(request)
+
     try:
-        print(f"\n🎙️ Analyzing call: {request.call_id}")
-        print(f"📡 Audio URL: {request.audio_url}")
+        logger.debug("Analyzing call", extra={"call_id": request.call_id, "audio_url": request.audio_url})
         
         # Validate Twilio credentials
         if not TWILIO_ACCOUNT_SID or not TWILIO_AUTH_TOKEN:
@@ -90,426 +596,469 @@ async def analyze_audio(request: AMDRequest) -> AMDResponse:
                 detail="Twilio credentials not configured. Check .env file."
             )
         
-        # Download audio from Twilio
-        print("📥 Downloading audio with Twilio auth...")
-        audio_response = requests.get(
-            request.audio_url,
-            auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
-            timeout=30
-        )
-        
-        if audio_response.status_code != 200:
-            print(f"❌ Download failed: HTTP {audio_response.status_code}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Failed to download audio: HTTP {audio_response.status_code}"
-            )
+        # Pin the rule set now: a reload while this call is in flight does not
+        # change the rules it is scored with
+        ruleset = select_ruleset(request)
+        model = classifier
+        variant = ruleset.cache_key if model is None else f"{ruleset.cache_key}+{model.cache_key}"
+        window = CAMPAIGN_WINDOWS.get(request.campaign, DEFAULT_ANSWER_WINDOW)
+        # The same recording under another campaign's window is a different
+        # result, at both cache levels
+        scope = "" if window == DEFAULT_ANSWER_WINDOW else f"@{window.start:g}-{window.end_margin:g}"
+        recording = f"{request.audio_url}{scope}"
+        if debug is not None:
+            debug.update(ruleset=ruleset.cache_key, mode=DETECTOR_MODE, window=window._asdict())
+        # A trace the caller asked for re-runs the analysis, so there is something to explain
+        use_cache = not request.trace
         
-        print(f"✅ Downloaded {len(audio_response.content)} bytes")
+        # Webhook retries for the same recording never reach the network
+        cached = await result_cache.get_by_recording(recording, request.call_id, variant) if use_cache else None
+        if cached is not None:
+            return cached_response(request, cached, start_time, "recording", ruleset, debug)
         
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_audio:
-            temp_audio.write(audio_response.content)
-            temp_audio_path = temp_audio.name
-        
-        print(f"💾 Saved to: {temp_audio_path}")
-        
-        # Load and process audio
-        print("🔊 Loading audio with librosa...")
+        # Download audio from Twilio, only as much of it as the analysis reads
+        download = {}
+        download_started = time.perf_counter()
         try:
-            audio, sample_rate = librosa.load(temp_audio_path, sr=16000, mono=True)
-            print(f"✅ Loaded: {len(audio)} samples at {sample_rate}Hz")
-        except Exception as e:
-            print(f"❌ librosa error: {e}")
-            raise HTTPException(status_code=400, detail=f"Audio processing failed: {str(e)}")
-        
-        # Validate audio
-        if len(audio) == 0:
-            raise HTTPException(status_code=400, detail="Audio file is empty")
-        
-        full_duration = len(audio) / sample_rate
-        print(f"⏱️ Full Duration: {full_duration:.2f}s")
-        
-        # ====== SMART DETECTION: FIND ALL SPEECH SEGMENTS ======
-        
-        # Detect all speech segments in the entire audio
-        all_intervals = librosa.effects.split(audio, top_db=30)
-        
-        if len(all_intervals) == 0:
-            print("⚠️ No speech detected in entire recording")
-            return AMDResponse(
-                result="unknown",
-                confidence=0.65,
-                reasoning="No speech detected in entire recording - possible silence or connection issue",
-                detection_time=int((time.time() - start_time) * 1000),
-                model_used="librosa-smart-detection-v2"
+            audio_bytes = await fetch_recording(
+                http_client,
+                request.audio_url,
+                MAX_RECORDING_BYTES or None,
+                window=decode_range(window) if PARTIAL_DOWNLOAD else None,
+                retries=DOWNLOAD_RETRIES,
+                backoff=DOWNLOAD_BACKOFF_SECONDS,
+                deadline=DOWNLOAD_DEADLINE_SECONDS or None,
+                stats=download,
             )
-        
-        print(f"\n🔍 Found {len(all_intervals)} speech segments in full recording:")
-        
-        # Analyze each segment
-        segment_info = []
-        for i, (start, end) in enumerate(all_intervals):
-            start_time_sec = start / sample_rate
-            end_time_sec = end / sample_rate
-            duration_sec = (end - start) / sample_rate
-            segment_audio = audio[start:end]
-            segment_energy = np.sqrt(np.mean(segment_audio**2))
-            
-            print(f"   Segment {i+1}: {start_time_sec:.2f}s - {end_time_sec:.2f}s "
-                  f"(duration: {duration_sec:.2f}s, energy: {segment_energy:.4f})")
-            
-            segment_info.append({
-                'index': i,
-                'start_time': start_time_sec,
-                'end_time': end_time_sec,
-                'duration': duration_sec,
-                'energy': segment_energy,
-                'start_sample': start,
-                'end_sample': end
+        except DownloadError as e:
+            logger.warning("Download failed", extra={
+                "call_id": request.call_id, "error": str(e), "attempts": download.get("attempts"),
             })
+            raise HTTPException(status_code=download_status(e), detail=str(e))
+        finally:
+            for status in download.get("retried", ()):
+                metrics.DOWNLOAD_RETRIES.inc(status=str(status) if status else "error")
+            if debug is not None:
+                debug["download"] = download
+        download_seconds = time.perf_counter() - download_started
+        metrics.STAGE_SECONDS.observe(download_seconds, stage="download")
+        metrics.DOWNLOAD_BYTES.inc(download["bytes"])
+        metrics.DOWNLOAD_SKIPPED_BYTES.inc(download["skipped"])
         
-        # The answer is typically:
-        # - After 5-10 seconds (after trial message)
-        # - Before the last 8 seconds (before TwiML greeting)
-        # - Has reasonable energy (not background noise)
-        
-        # Filter segments that could be the answer
-        potential_answer_segments = []
+        # Identical audio behind a different URL skips decode + scoring
+        digest = f"{audio_digest(audio_bytes)}{scope}"
+        cached = await result_cache.get_by_audio(digest, variant) if use_cache else None
+        if cached is not None:
+            result_cache.put(recording, request.call_id, digest, cached, variant)
+            return cached_response(request, cached, start_time, "audio", ruleset, debug)
         
-        for seg in segment_info:
-            # Must start after 5 seconds (trial message usually done)
-            # Must end before total_duration - 8 seconds (TwiML greeting area)
-            if seg['start_time'] >= 5.0 and seg['end_time'] <= (full_duration - 8.0):
-                # Must have reasonable energy (not just noise)
-                if seg['energy'] > 0.015:
-                    potential_answer_segments.append(seg)
-                    print(f"   ✅ Segment {seg['index']+1} is potential answer "
-                          f"({seg['start_time']:.1f}s-{seg['end_time']:.1f}s)")
-        
-        if len(potential_answer_segments) == 0:
-            print("\n⚠️ No speech in answer window (5s to -8s from end)")
-            return AMDResponse(
-                result="unknown",
-                confidence=0.70,
-                reasoning="No speech detected in expected answer window - likely silent or call quality issue",
-                detection_time=int((time.time() - start_time) * 1000),
-                model_used="librosa-smart-detection-v2"
-            )
-        
-        # ====== ANALYZE THE ANSWER SEGMENTS ======
-        
-        # Combine all potential answer segments for analysis
-        answer_start = potential_answer_segments[0]['start_time']
-        answer_end = potential_answer_segments[-1]['end_time']
-        answer_duration = answer_end - answer_start
-        
-        # Extract the answer region
-        answer_start_sample = int(answer_start * sample_rate)
-        answer_end_sample = int(answer_end * sample_rate)
-        answer_audio = audio[answer_start_sample:answer_end_sample]
-        
-        print(f"\n🎯 Analyzing answer region: {answer_start:.2f}s to {answer_end:.2f}s")
-        print(f"📏 Answer duration: {answer_duration:.2f}s")
-        print(f"🗣️ Number of speech bursts in answer: {len(potential_answer_segments)}")
-        
-        # Calculate statistics for answer segments
-        total_speech_duration = sum(seg['duration'] for seg in potential_answer_segments)
-        silence_in_answer = answer_duration - total_speech_duration
-        speech_ratio = total_speech_duration / answer_duration if answer_duration > 0 else 0
-        
-        avg_segment_duration = np.mean([seg['duration'] for seg in potential_answer_segments])
-        max_segment_duration = max([seg['duration'] for seg in potential_answer_segments])
-        avg_energy = np.mean([seg['energy'] for seg in potential_answer_segments])
-        
-        # Calculate gaps between segments (silence patterns)
-        gaps = []
-        for i in range(len(potential_answer_segments) - 1):
-            gap = potential_answer_segments[i+1]['start_time'] - potential_answer_segments[i]['end_time']
-            gaps.append(gap)
-        avg_gap = np.mean(gaps) if len(gaps) > 0 else 0
-        
-        print(f"\n📊 Answer Analysis:")
-        print(f"   Total speech: {total_speech_duration:.2f}s ({speech_ratio:.1%})")
-        print(f"   Silence: {silence_in_answer:.2f}s ({1-speech_ratio:.1%})")
-        print(f"   Speech bursts: {len(potential_answer_segments)}")
-        print(f"   Avg burst length: {avg_segment_duration:.2f}s")
-        print(f"   Max burst length: {max_segment_duration:.2f}s")
-        print(f"   Avg energy: {avg_energy:.4f}")
-        print(f"   Avg gap between bursts: {avg_gap:.2f}s")
-        
-        # ====== ENHANCED DECISION LOGIC WITH VOICEMAIL DETECTION ======
-        
-        score = 0
-        reasons = []
-        voicemail_indicators = 0  # Track strong voicemail signs
-        
-        # ========== VOICEMAIL-SPECIFIC DETECTION ==========
-        
-        # VOICEMAIL RULE 1: Long continuous speech (biggest indicator!)
-        # Humans rarely speak >6s continuously, voicemails often do
-        if max_segment_duration > 8.0:
-            score -= 10
-            voicemail_indicators += 3
-            reasons.append(f"⚠️ VOICEMAIL: Extremely long continuous speech ({max_segment_duration:.1f}s)")
-        elif max_segment_duration > 6.0:
-            score -= 7
-            voicemail_indicators += 3
-            reasons.append(f"⚠️ VOICEMAIL: Very long continuous speech ({max_segment_duration:.1f}s)")
-        elif max_segment_duration > 4.5:
-            score -= 4
-            voicemail_indicators += 2
-            reasons.append(f"⚠️ VOICEMAIL: Long continuous speech ({max_segment_duration:.1f}s)")
-        elif max_segment_duration > 3.5:
-            score -= 2
-            voicemail_indicators += 1
-            reasons.append(f"Moderately long speech segment ({max_segment_duration:.1f}s)")
-        
-        # VOICEMAIL RULE 2: High speech ratio (voicemails talk a lot!)
-        # Only penalize if VERY high ratio - humans can talk too
-        if speech_ratio > 0.90:
-            score -= 8
-            voicemail_indicators += 3
-            reasons.append(f"⚠️ VOICEMAIL: Almost continuous talking ({speech_ratio:.0%})")
-        elif speech_ratio > 0.80:
-            score -= 5
-            voicemail_indicators += 2
-            reasons.append(f"⚠️ VOICEMAIL: Mostly continuous speech ({speech_ratio:.0%})")
-        elif speech_ratio > 0.70:
-            score -= 2
-            voicemail_indicators += 1
-            reasons.append(f"High speech ratio ({speech_ratio:.0%})")
-        
-        # VOICEMAIL RULE 3: Few speech segments with long duration
-        # This is key: Voicemails = 1-2 long segments, Humans = multiple shorter
-        if len(potential_answer_segments) == 1 and total_speech_duration > 5.0:
-            score -= 9
-            voicemail_indicators += 3
-            reasons.append(f"⚠️ VOICEMAIL: Single very long message ({total_speech_duration:.1f}s)")
-        elif len(potential_answer_segments) <= 2 and total_speech_duration > 6.0:
-            score -= 7
-            voicemail_indicators += 3
-            reasons.append(f"⚠️ VOICEMAIL: Few segments ({len(potential_answer_segments)}) but very long duration ({total_speech_duration:.1f}s)")
-        elif len(potential_answer_segments) <= 2 and total_speech_duration > 4.0:
-            score -= 4
-            voicemail_indicators += 1
-            reasons.append(f"Limited segments with long duration")
-        
-        # VOICEMAIL RULE 4: Total speech duration
-        # Humans typically talk 1-4s when answering, voicemails 6-15s
-        if total_speech_duration > 9.0:
-            score -= 9
-            voicemail_indicators += 3
-            reasons.append(f"⚠️ VOICEMAIL: Very extended talking time ({total_speech_duration:.1f}s)")
-        elif total_speech_duration > 7.0:
-            score -= 6
-            voicemail_indicators += 2
-            reasons.append(f"⚠️ VOICEMAIL: Extended talking time ({total_speech_duration:.1f}s)")
-        elif total_speech_duration > 5.5:
-            score -= 3
-            voicemail_indicators += 1
-            reasons.append(f"Long talking duration ({total_speech_duration:.1f}s)")
-        
-        # VOICEMAIL RULE 5: Very small gaps (scripted speech has minimal pauses)
-        # Only penalize VERY small gaps - humans can speak quickly too
-        if len(gaps) > 0 and avg_gap < 0.2:
-            score -= 4
-            voicemail_indicators += 2
-            reasons.append(f"⚠️ VOICEMAIL: Almost no pauses ({avg_gap:.2f}s) - scripted flow")
-        elif len(gaps) > 0 and avg_gap < 0.4:
-            score -= 2
-            voicemail_indicators += 1
-            reasons.append(f"Very short pauses - possibly scripted")
-        
-        # VOICEMAIL RULE 6: Consistent segment lengths (machines are uniform)
-        if len(potential_answer_segments) >= 2:
-            segment_durations = [seg['duration'] for seg in potential_answer_segments]
-            duration_std = np.std(segment_durations)
-            duration_variance = np.var(segment_durations)
-            
-            if duration_std < 0.3 and avg_segment_duration > 2.0:
-                score -= 5
-                voicemail_indicators += 2
-                reasons.append(f"⚠️ VOICEMAIL: Uniform long segments - scripted pattern")
-            elif duration_variance < 0.15:
-                score -= 2
-                voicemail_indicators += 1
-                reasons.append("Consistent segment lengths")
-        
-        # VOICEMAIL RULE 7: Answer region is too long
-        # Humans greet quickly (1-4s), voicemails are longer (7-15s)
-        if answer_duration > 10.0 and speech_ratio > 0.7:
-            score -= 7
-            voicemail_indicators += 3
-            reasons.append(f"⚠️ VOICEMAIL: Very extended answer window ({answer_duration:.1f}s) with high speech")
-        elif answer_duration > 7.0 and speech_ratio > 0.6:
-            score -= 4
-            voicemail_indicators += 2
-            reasons.append(f"⚠️ VOICEMAIL: Extended answer window ({answer_duration:.1f}s) with high speech")
-        elif answer_duration > 5.5 and speech_ratio > 0.5:
-            score -= 2
-            voicemail_indicators += 1
-            reasons.append(f"Long answer window ({answer_duration:.1f}s)")
-        
-        # ========== HUMAN-SPECIFIC DETECTION ==========
-        
-        # HUMAN RULE 1: Very brief responses (typical "Hello?")
-        if total_speech_duration < 1.5 and len(potential_answer_segments) <= 2:
-            score += 8
-            reasons.append(f"✅ HUMAN: Brief greeting ({total_speech_duration:.1f}s)")
-        elif total_speech_duration < 3.0 and len(potential_answer_segments) <= 3:
-            score += 6
-            reasons.append(f"✅ HUMAN: Short response ({total_speech_duration:.1f}s)")
-        elif total_speech_duration < 4.5:
-            score += 3
-            reasons.append(f"✅ HUMAN: Reasonable response length ({total_speech_duration:.1f}s)")
-        
-        # HUMAN RULE 2: Multiple short bursts (conversation pattern)
-        # Humans often have 2-5 segments when responding
-        if len(potential_answer_segments) >= 4 and avg_segment_duration < 2.0:
-            score += 7
-            reasons.append(f"✅ HUMAN: Multiple brief utterances ({len(potential_answer_segments)} bursts)")
-        elif len(potential_answer_segments) >= 3 and avg_segment_duration < 2.5:
-            score += 5
-            reasons.append(f"✅ HUMAN: Conversational pattern ({len(potential_answer_segments)} bursts)")
-        elif len(potential_answer_segments) >= 2 and avg_segment_duration < 1.5:
-            score += 4
-            reasons.append(f"✅ HUMAN: Quick back-and-forth pattern")
-        
-        # HUMAN RULE 3: Low speech ratio with multiple segments (listening more than talking)
-        if speech_ratio < 0.35 and len(potential_answer_segments) >= 2:
-            score += 6
-            reasons.append(f"✅ HUMAN: Mostly listening ({speech_ratio:.0%}) - responding to caller")
-        elif speech_ratio < 0.50:
-            score += 3
-            reasons.append(f"Balanced listening/speaking ({speech_ratio:.0%})")
-        
-        # HUMAN RULE 4: Long gaps (thinking/listening pauses)
-        if len(gaps) > 0 and avg_gap > 1.0:
-            score += 5
-            reasons.append(f"✅ HUMAN: Long pauses ({avg_gap:.2f}s) - natural conversation")
-        elif len(gaps) > 0 and avg_gap > 0.7:
-            score += 3
-            reasons.append(f"Natural pauses between responses")
-        
-        # HUMAN RULE 5: Quick initial response
-        first_segment_start = potential_answer_segments[0]['start_time']
-        if first_segment_start < 6.5 and total_speech_duration < 3.0:
-            score += 5
-            reasons.append(f"✅ HUMAN: Quick brief greeting")
-        elif first_segment_start < 7.5 and total_speech_duration < 5.0:
-            score += 3
-            reasons.append(f"✅ HUMAN: Prompt response")
-        elif first_segment_start < 8.0:
-            score += 1
-            reasons.append("Reasonable response time")
-        
-        # HUMAN RULE 6: Variable segment lengths (natural speech varies)
-        if len(potential_answer_segments) >= 3:
-            segment_durations = [seg['duration'] for seg in potential_answer_segments]
-            duration_std = np.std(segment_durations)
-            
-            if duration_std > 0.5:
-                score += 4
-                reasons.append(f"✅ HUMAN: Highly varied speech patterns")
-            elif duration_std > 0.3:
-                score += 2
-                reasons.append("Natural variation in speech")
-        
-        # HUMAN RULE 7: Good energy but not too perfect
-        if 0.030 < avg_energy < 0.070:
-            score += 3
-            reasons.append("✅ HUMAN: Natural voice energy")
-        elif avg_energy < 0.020:
-            score -= 2
-            reasons.append("Weak signal")
-        
-        # ========== OVERRIDE LOGIC ==========
-        
-        # If we have 3+ strong voicemail indicators, force machine result
-        if voicemail_indicators >= 3:
-            score = min(score, -10)  # Ensure negative score
-            print(f"🚨 VOICEMAIL OVERRIDE: {voicemail_indicators} strong indicators detected")
-        
-        # If score is negative and we have voicemail indicators, boost the negative score
-        if score < 0 and voicemail_indicators >= 2:
-            score -= 3
-            print(f"⚠️ Voicemail pattern reinforcement: {voicemail_indicators} indicators")
-        
-        print(f"\n🎯 Final Score: {score}")
-        print(f"🤖 Voicemail Indicators: {voicemail_indicators}")
-        print(f"📝 Scoring breakdown:")
-        for reason in reasons:
-            print(f"   - {reason}")
-        
-        # ====== FINAL DECISION WITH IMPROVED THRESHOLDS ======
+        # Decode, segment and score in the process pool so the event loop
+        # keeps serving other calls while this one is on a CPU
+        loop = asyncio.get_running_loop()
+        pool = process_pool
+        try:
+            outcome, trace = await loop.run_in_executor(pool, functools.partial(
+                analyze_recording, audio_bytes, window, ruleset=ruleset, classifier=model, explain=debug is not None
+            ))
+        except RecordingTooLong as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except AnalysisError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except MemoryError:
+            logger.warning("Analysis hit the worker memory limit", extra={
+                "call_id": request.call_id, "bytes": len(audio_bytes), "worker_memory_mb": WORKER_MEMORY_MB,
+            })
+            raise HTTPException(status_code=413, detail=f"Recording needs more than {WORKER_MEMORY_MB} MB to analyse")
+        except BrokenProcessPool:
+            replace_broken_pool(pool)
+            raise HTTPException(status_code=503, detail="DSP worker died, retry shortly", headers={"Retry-After": "1"})
         
-        if score >= 8:
-            result = "human"
-            confidence = min(0.95, 0.80 + (score - 8) * 0.02)
-            reasoning = "Strong human indicators: " + "; ".join([r for r in reasons if "✅ HUMAN" in r][:3])
-        elif score >= 4:
-            result = "human"
-            confidence = 0.70 + (score - 4) * 0.025
-            reasoning = "Likely human: " + "; ".join([r for r in reasons if "✅ HUMAN" in r or "VOICEMAIL" not in r][:3])
-        elif score <= -8:
-            result = "machine"
-            confidence = min(0.95, 0.80 + (abs(score) - 8) * 0.02)
-            reasoning = "Strong voicemail indicators: " + "; ".join([r for r in reasons if "⚠️ VOICEMAIL" in r][:3])
-        elif score <= -4:
-            result = "machine"
-            confidence = 0.70 + (abs(score) - 4) * 0.025
-            reasoning = "Likely voicemail: " + "; ".join([r for r in reasons if "⚠️ VOICEMAIL" in r or "HUMAN" not in r][:3])
-        elif score <= -1:
-            result = "machine"
-            confidence = 0.60 + abs(score) * 0.03
-            reasoning = "Voicemail pattern detected: " + "; ".join([r for r in reasons if "⚠️" in r][:2])
-        elif score >= 1:
-            result = "human"
-            confidence = 0.60 + score * 0.03
-            reasoning = "Human pattern detected: " + "; ".join([r for r in reasons if "✅" in r][:2])
-        else:
-            result = "unknown"
-            confidence = 0.50
-            reasoning = "Ambiguous pattern: " + "; ".join(reasons[:2])
+        result_cache.put(recording, request.call_id, digest, outcome, variant)
         
-        # Additional confidence adjustment based on voicemail indicators
-        if result == "machine" and voicemail_indicators >= 3:
-            confidence = min(0.95, confidence + 0.10)
+        stages = {"download": download_seconds, **trace["stages"], "total": time.time() - start_time}
+        for stage, seconds in stages.items():
+            metrics.STAGE_SECONDS.observe(seconds, stage=stage)
+        for rule in trace["rules_fired"]:
+            metrics.RULES_FIRED.inc(rule=rule)
+        metrics.VERDICTS.inc(result=outcome["result"], source="analysis", ruleset=ruleset.version)
+        decision = trace.get("classifier")
+        if decision is not None:
+            metrics.CLASSIFIER_DECISIONS.inc(decided_by=decision["decided_by"], reason=decision["reason"])
+        if "beep" in trace:
+            metrics.BEEP_VERDICTS.inc(source="analysis")
+        peak_rss = trace.get("peak_rss_bytes")
+        if peak_rss is not None:
+            metrics.WORKER_PEAK_RSS.observe(peak_rss)
         
         detection_time = int((time.time() - start_time) * 1000)
+        logger.info("Call analyzed", extra={
+            "call_id": request.call_id,
+            "result": outcome["result"],
+            "confidence": outcome["confidence"],
+            "ruleset": ruleset.version,
+            "decided_by": "beep" if "beep" in trace else decision["decided_by"] if decision is not None else "heuristic",
+            "beep_time": outcome.get("beep_time"),
+            "detection_time_ms": detection_time,
+            "bytes": download["bytes"],
+            "skipped_bytes": download["skipped"],
+            "download_attempts": download["attempts"],
+            "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in stages.items()},
+            "peak_rss_mb": round(peak_rss / 2**20, 1) if peak_rss is not None else None,
+            "rss_growth_mb": round((peak_rss - trace["start_rss_bytes"]) / 2**20, 1) if peak_rss is not None else None,
+        })
         
-        print(f"\n✅ FINAL RESULT: {result.upper()}")
-        print(f"📊 Confidence: {confidence:.2f} ({confidence*100:.0f}%)")
-        print(f"💭 Reasoning: {reasoning}")
-        print(f"⏱️ Processing time: {detection_time}ms\n")
-        
-        return AMDResponse(
-            result=result,
-            confidence=confidence,
-            reasoning=reasoning,
-            detection_time=detection_time,
-            model_used="librosa-smart-detection-v2-voicemail-enhanced"
-        )
+        response = AMDResponse(detection_time=detection_time, **outcome)
+        if SHADOW_VARIANTS:
+            schedule_shadow(request.call_id, audio_bytes, window, outcome, "beep" in trace)
+        if debug is not None:
+            debug.update(
+                cache=None,
+                decoded_window=trace["window"],
+                stages_ms={stage: round(seconds * 1000, 2) for stage, seconds in stages.items()},
+                rules_fired=trace["rules_fired"],
+                beep=trace.get("beep"),
+                classifier=decision,
+                peak_rss_mb=round(peak_rss / 2**20, 1) if peak_rss is not None else None,
+                analysis=trace.get("explain"),
+            )
+            store_trace(debug, response=response)
+        return response
         
-    except HTTPException:
+    except HTTPException as e:
+        if debug is not None:
+            store_trace(debug, error=e)
         raise
     
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
-    
-    finally:
-        if temp_audio_path and os.path.exists(temp_audio_path):
+        logger.exception("Unexpected error", extra={"call_id": request.call_id})
+        error = HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+        if debug is not None:
+            store_trace(debug, error=error)
+        raise error
+
+def shadow_variant(name: str) -> tuple:
+    """``(rule-set version or None for the default, uses the classifier)`` of a shadow variant name"""
+    version, plus, model = name.partition("+")
+    if version in ("heuristic", "classifier") and not plus:
+        return None, version == "classifier"
+    if plus and model != "classifier":
+        raise ValueError(f"Unknown shadow variant {name!r}: only <version>+classifier combines")
+    return version, bool(plus)
+
+def schedule_shadow(call_id: str, audio_bytes: bytearray, window: AnswerWindow, live: dict, beep: bool):
+    """Evaluate the shadow variants on this call in the background, if it is sampled and there is room"""
+    global shadow_in_flight
+    if beep:
+        # Every variant shares the beep fast path: there is nothing to compare
+        metrics.SHADOW_SKIPPED.inc(reason="beep")
+        return
+    if SHADOW_SAMPLE_RATE < 1 and random.random() >= SHADOW_SAMPLE_RATE:
+        return
+    if shadow_in_flight >= SHADOW_MAX_IN_FLIGHT:
+        metrics.SHADOW_SKIPPED.inc(reason="busy")
+        return
+    # Counted from now, not from when the task first runs, so calls answered
+    # in the same loop iteration cannot all slip under the cap
+    shadow_in_flight += 1
+    task = asyncio.create_task(run_shadow(call_id, audio_bytes, window, live))
+    shadow_tasks.add(task)
+    task.add_done_callback(finish_shadow)
+
+def finish_shadow(task: asyncio.Task):
+    global shadow_in_flight
+    shadow_in_flight -= 1
+    shadow_tasks.discard(task)
+
+async def run_shadow(call_id: str, audio_bytes: bytearray, window: AnswerWindow, live: dict):
+    """Decode the recording once more and judge every shadow variant on it; results go to logs and metrics"""
+    variants = []
+    for name in SHADOW_VARIANTS:
+        version, uses_model = shadow_variant(name)
+        try:
+            variants.append((name, RULESETS.get(version), shadow_classifier if uses_model else None))
+        except KeyError:
+            # Removed by a reload since startup
+            metrics.SHADOW_SKIPPED.inc(reason="unknown_ruleset")
+
+    loop = asyncio.get_running_loop()
+    pool = process_pool
+    try:
+        _, trace = await loop.run_in_executor(pool, functools.partial(
+            analyze_recording, audio_bytes, window,
+            acoustic=any(model is not None for _, _, model in variants), beep=False, variants=variants,
+        ))
+    except BrokenProcessPool:
+        replace_broken_pool(pool)
+        return
+    except Exception as e:
+        logger.warning("Shadow evaluation failed", extra={"call_id": call_id, "error": str(e)})
+        return
+
+    judged = {}
+    for name, verdict in trace["variants"].items():
+        agrees = verdict["result"] == live["result"]
+        metrics.SHADOW_VERDICTS.inc(variant=name, result=verdict["result"], agrees=str(agrees).lower())
+        metrics.SHADOW_SECONDS.observe(verdict["seconds"], variant=name)
+        judged[name] = {
+            "result": verdict["result"],
+            "confidence": verdict["confidence"],
+            "model_used": verdict["model_used"],
+            "decided_by": verdict["decided_by"],
+            "agrees": agrees,
+            "ms": round(verdict["seconds"] * 1000, 3),
+        }
+    logger.info("Shadow verdicts", extra={
+        "call_id": call_id,
+        "live": {"result": live["result"], "confidence": live["confidence"], "model_used": live["model_used"]},
+        "shared_stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in trace["stages"].items()},
+        "variants": judged,
+    })
+
+def download_status(e: DownloadError) -> int:
+    """HTTP status for a failed download: 404, 413 or 504 (deadline), 502 when the host kept failing, else 400"""
+    if isinstance(e, (RecordingTooLarge, DownloadTimeout)) or e.status_code == 404:
+        return e.status_code
+    return 502 if e.retryable else 400
+
+def cached_response(
+    request: AMDRequest, cached: dict, start_time: float, level: str, ruleset: RuleSet, debug: dict = None
+) -> AMDResponse:
+    metrics.VERDICTS.inc(result=cached["result"], source="cache", ruleset=ruleset.version)
+    metrics.STAGE_SECONDS.observe(time.time() - start_time, stage="total")
+    detection_time = int((time.time() - start_time) * 1000)
+    logger.info("Call answered from cache", extra={
+        "call_id": request.call_id, "cache_level": level, "result": cached["result"], "detection_time_ms": detection_time,
+    })
+    response = AMDResponse(detection_time=detection_time, **cached)
+    if debug is not None:
+        debug.update(cache=level, stages_ms={"total": round((time.time() - start_time) * 1000, 2)})
+        store_trace(debug, response=response)
+    return response
+
+def start_trace(request: AMDRequest) -> Optional[dict]:
+    """The debug trace to fill in for this call if it asked for one or was sampled, else None"""
+    if request.trace:
+        reason = "requested"
+    elif TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE:
+        reason = "sampled"
+    else:
+        return None
+    return {"call_id": request.call_id, "audio_url": request.audio_url, "reason": reason, "recorded_at": time.time()}
+
+def store_trace(debug: dict, response: AMDResponse = None, error: HTTPException = None):
+    """Keep a finished trace for /trace/{call_id}, bounded to TRACE_MAX_ENTRIES"""
+    if response is not None:
+        debug["response"] = response.model_dump()
+    if error is not None:
+        debug["error"] = {"status_code": error.status_code, "detail": error.detail}
+    metrics.TRACES_RECORDED.inc(reason=debug["reason"])
+    traces.put(debug["call_id"], debug)
+
+@app.get("/trace/{call_id}")
+async def get_trace(call_id: str):
+    """Debug trace of a traced call's latest analysis (recorded by any web worker)"""
+    debug = await traces.get(call_id)
+    if debug is None:
+        raise HTTPException(status_code=404, detail="No trace for this call (not traced, or evicted)")
+    return debug
+
+@app.post("/analyze/batch")
+async def analyze_batch(batch: AMDBatchRequest) -> StreamingResponse:
+    """Analyse a list of recordings, streaming one NDJSON line per item as it completes.
+
+    Downloads are pipelined with decoding/scoring in the process pool, and a
+    failing item yields an error line instead of failing the whole batch.
+    The last line is a summary with throughput.
+    """
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(batch.items)} items (max {BATCH_MAX_ITEMS})"
+        )
+
+    await follow_rules_reload()
+    logger.info("Batch received", extra={"items": len(batch.items), "concurrency": BATCH_CONCURRENCY})
+    return StreamingResponse(run_batch(batch.items), media_type="application/x-ndjson")
+
+async def run_batch(items: List[AMDRequest]):
+    started = time.time()
+
+    async def analyze_item(item: AMDRequest) -> AMDBatchItem:
+        global in_flight, joined
+        async with batch_slots:
+            if draining:
+                line = AMDBatchItem(call_id=item.call_id, ok=False, error="AMD service shutting down, retry", status_code=503)
+                metrics.REQUESTS.inc(endpoint="batch", status=503)
+                return line
+            joining = joins_flight(item)
+            if joining:
+                joined += 1
+            else:
+                in_flight += 1
             try:
-                os.unlink(temp_audio_path)
-                print("🗑️ Cleaned up temp file")
-            except Exception as e:
-                print(f"⚠️ Cleanup warning: {e}")
+                line = AMDBatchItem(call_id=item.call_id, ok=True, response=await run_analysis(item))
+            except HTTPException as e:
+                line = AMDBatchItem(call_id=item.call_id, ok=False, error=str(e.detail), status_code=e.status_code)
+            finally:
+                if joining:
+                    joined -= 1
+                else:
+                    in_flight -= 1
+            metrics.REQUESTS.inc(endpoint="batch", status=line.status_code)
+            return line
 
-if __name__ == "__main__":
+    tasks = [asyncio.create_task(analyze_item(item)) for item in items]
+    failed = 0
+    metrics.ACTIVE_BATCHES.inc()
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            line = await next_done
+            failed += not line.ok
+            yield line.model_dump_json() + "\n"
+    finally:
+        # Client went away mid-stream: stop the remaining downloads
+        for task in tasks:
+            task.cancel()
+        metrics.ACTIVE_BATCHES.dec()
+
+    elapsed = time.time() - started
+    logger.info("Batch done", extra={"items": len(items), "failed": failed, "elapsed_ms": int(elapsed * 1000)})
+    yield json.dumps({"summary": {
+        "items": len(items),
+        "succeeded": len(items) - failed,
+        "failed": failed,
+        "elapsed_ms": int(elapsed * 1000),
+        "recordings_per_second": round(len(items) / elapsed, 2) if elapsed > 0 else None,
+    }}) + "\n"
+
+@app.websocket("/api/ws/audio-stream")
+async def audio_stream(websocket: WebSocket):
+    """Twilio Media Streams endpoint: early human/machine verdict from live audio"""
+    await websocket.accept()
+    if draining:
+        # 1013 "try again later": the stream should reconnect to another instance
+        await websocket.close(code=1013, reason="AMD service shutting down, retry")
+        return
+    await follow_rules_reload()
+    metrics.ACTIVE_STREAMS.inc()
+    call_id = websocket.query_params.get("callId")
+    stream_sid = None
+    detector = StreamingDetector(
+        skip_seconds=STREAM_SKIP_SECONDS,
+        confidence_threshold=STREAM_CONFIDENCE,
+        decision_deadline=STREAM_DEADLINE,
+        vad_threshold=VAD_THRESHOLD,
+        beep=BEEP_DETECTION,
+    )
+
+    try:
+        while True:
+            message = json.loads(await websocket.receive_text())
+            event = message.get("event")
+
+            if event == "start":
+                stream_sid = message["start"].get("streamSid")
+                call_id = message["start"].get("customParameters", {}).get("callId") or call_id
+                logger.info("Stream started", extra={"call_id": call_id, "stream_sid": stream_sid})
+
+            elif event == "media":
+                if message["media"].get("track", "inbound") != "inbound":
+                    continue
+                verdict = detector.push_payload(message["media"]["payload"])
+                if verdict is not None:
+                    logger.info("Stream verdict", extra={"call_id": call_id, **verdict})
+                    metrics.VERDICTS.inc(result=verdict["result"], source="stream", ruleset=verdict["ruleset"])
+                    if "beep_time" in verdict:
+                        metrics.BEEP_VERDICTS.inc(source="stream")
+                    store_stream_result(call_id, verdict)
+                    await websocket.send_text(json.dumps({
+                        "event": "amd",
+                        "streamSid": stream_sid,
+                        "callId": call_id,
+                        **verdict,
+                    }))
+
+            elif event == "stop":
+                break
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        metrics.ACTIVE_STREAMS.dec()
+
+    if detector.verdict is None:
+        logger.warning("Stream ended before a verdict", extra={"call_id": call_id, "audio_seconds": round(detector.elapsed, 1)})
+
+def store_stream_result(call_id: str, verdict: dict):
+    """Keep the latest streaming verdicts for polling, bounded to STREAM_RESULTS_MAX"""
+    if not call_id:
+        return
+    stream_results.put(call_id, verdict)
+
+@app.get("/stream/{call_id}")
+async def stream_result(call_id: str):
+    verdict = await stream_results.get(call_id)
+    if verdict is None:
+        raise HTTPException(status_code=404, detail="No streaming verdict for this call yet")
+    return {"call_id": call_id, **verdict}
+
+def serve():
+    """Run the service under uvicorn with WEB_WORKERS processes.
+
+    With more than one worker, metrics are shared through AMD_METRICS_DIR (a
+    fresh temp directory unless set) and, unless AMD_CACHE_PATH is set, the
+    result cache through a per-port SQLite file, so a webhook retry landing
+    on another worker is still a cache hit. Rule-set reloads, debug traces
+    and streaming verdicts go through AMD_STATE_DIR (likewise a fresh temp
+    directory unless set), so POST /rules/reload reaches every worker and
+    GET /trace or /stream can land on any of them.
+    """
     import uvicorn
-    print("🚀 Starting AMD HuggingFace Service v2.0 with Enhanced Voicemail Detection...")
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
\ No newline at end of file
+
+    owned_metrics_dir = None
+    owned_state_dir = None
+    if WEB_WORKERS > 1:
+        if METRICS_DIR:
+            # Snapshots of a previous run's (dead) workers would still be summed
+            for path in os.listdir(METRICS_DIR):
+                if path.endswith(".json"):
+                    os.remove(os.path.join(METRICS_DIR, path))
+        else:
+            owned_metrics_dir = tempfile.mkdtemp(prefix="amd-metrics-")
+            os.environ["AMD_METRICS_DIR"] = owned_metrics_dir
+        if STATE_DIR:
+            # Nobody is left to evict what a previous run's workers stored
+            for name in ("traces", "streams"):
+                shutil.rmtree(os.path.join(STATE_DIR, name), ignore_errors=True)
+        else:
+            owned_state_dir = tempfile.mkdtemp(prefix="amd-state-")
+            os.environ["AMD_STATE_DIR"] = owned_state_dir
+        if "AMD_CACHE_PATH" not in os.environ and CACHE_MAX_ENTRIES > 0:
+            os.environ["AMD_CACHE_PATH"] = os.path.join(tempfile.gettempdir(), f"amd-cache-{PORT}.sqlite")
+
+    logger.info("Starting AMD HuggingFace Service v2.0", extra={
+        "web_workers": WEB_WORKERS,
+        "dsp_workers_per_web_worker": PROCESS_WORKERS,
+        "host": HOST,
+        "port": PORT,
+        "cache_path": os.getenv("AMD_CACHE_PATH") or None,
+        "metrics_dir": os.getenv("AMD_METRICS_DIR") or None,
+        "state_dir": os.getenv("AMD_STATE_DIR") or None,
+    })
+    try:
+        uvicorn.run(
+            "main:app" if WEB_WORKERS > 1 else app,
+            host=HOST,
+            port=PORT,
+            workers=WEB_WORKERS,
+            timeout_graceful_shutdown=DRAIN_SECONDS,
+            log_level="info",
+        )
+    finally:
+        if owned_metrics_dir:
+            shutil.rmtree(owned_metrics_dir, ignore_errors=True)
+        if owned_state_dir:
+            shutil.rmtree(owned_state_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    serve()
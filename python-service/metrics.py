@@ -0,0 +1,286 @@
+"""
+Prometheus-style metrics rendered in the text exposition format at /metrics.
+
+A tiny in-process registry instead of prometheus_client: the service only
+needs counters, gauges and fixed-bucket histograms, all updated from the
+event loop thread (DSP workers send their stage timings back with the
+result rather than touching metrics themselves).
+
+With several web workers (see main.serve), each one snapshots its registry
+to ``<AMD_METRICS_DIR>/<pid>.json`` every second and whichever worker gets
+the scrape merges every snapshot: counters and histograms are summed over
+all workers that ever ran, gauges over the workers still alive.
+"""
+import bisect
+import glob
+import json
+import math
+import os
+
+# Seconds; covers a sub-ms cache hit up to a slow 30s download
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (64, 96, 128, 192, 256, 384, 512, 768, 1024, 1536, 2048))
+
+REGISTRY = []
+
+# Directory shared by all web workers, set by configure_multiprocess()
+_shared_dir = None
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        # Label values are text in the exposition format; keeping them as str
+        # also keeps the keys sortable when a label gets ints and strings
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> dict:
+        """Current values by label tuple"""
+        return dict(self._values)
+
+    def render(self, samples: dict = None) -> list:
+        lines = self.header()
+        for key, value in sorted((self.samples() if samples is None else samples).items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_value(value)}")
+        return lines
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        if not self.labelnames:
+            self._values[()] = 0
+        self._function = None
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """Read the (unlabelled) value from ``function()`` at scrape time"""
+        self._function = function
+        self._values.pop((), None)
+
+    def samples(self) -> dict:
+        samples = dict(self._values)
+        if self._function is not None:
+            samples[()] = self._function()
+        return samples
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> dict:
+        return {key: [list(counts), total] for key, (counts, total) in self._series.items()}
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return [list(value[0]), value[1]]
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1]]
+
+    def render(self, samples: dict = None) -> list:
+        lines = self.header()
+        for key, (counts, total) in sorted((self.samples() if samples is None else samples).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def configure_multiprocess(directory: str):
+    """Share metrics with the other web workers through ``directory``"""
+    global _shared_dir
+    os.makedirs(directory, exist_ok=True)
+    _shared_dir = directory
+
+
+def write_snapshot():
+    """Publish this process's current values for the other workers to merge"""
+    if _shared_dir is None:
+        return
+    snapshot = {
+        metric.name: [[list(key), value] for key, value in metric.samples().items()] for metric in REGISTRY
+    }
+    path = os.path.join(_shared_dir, f"{os.getpid()}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(path + ".tmp", path)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _collect() -> dict:
+    """Merged samples of every worker's latest snapshot, by metric name"""
+    write_snapshot()
+    merged = {metric.name: {} for metric in REGISTRY}
+    by_name = {metric.name: metric for metric in REGISTRY}
+    for path in glob.glob(os.path.join(_shared_dir, "*.json")):
+        try:
+            pid = int(os.path.basename(path)[:-len(".json")])
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (ValueError, OSError):
+            continue
+        alive = _alive(pid)
+        for name, samples in snapshot.items():
+            metric = by_name.get(name)
+            if metric is None or (metric.kind == "gauge" and not alive):
+                continue
+            target = merged[name]
+            for key, value in samples:
+                key = tuple(key)
+                target[key] = metric.merge(target.get(key), value)
+    return merged
+
+
+def render() -> str:
+    merged = _collect() if _shared_dir is not None else {}
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(merged.get(metric.name)))
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "amd_stage_seconds",
+    "Time spent per pipeline stage (download, decode, resample, beep, segmentation, scoring, classifier, total)",
+    ["stage"],
+)
+VERDICTS = Counter(
+    "amd_verdicts_total",
+    "Verdicts returned, by result, source (analysis, cache, stream) and rule-set version",
+    ["result", "source", "ruleset"],
+)
+WORKER_PEAK_RSS = Histogram(
+    "amd_worker_peak_rss_bytes",
+    "Peak resident memory of the DSP worker while analysing one recording",
+    buckets=MEMORY_BUCKETS,
+)
+CLASSIFIER_DECISIONS = Counter(
+    "amd_classifier_decisions_total",
+    "Classifier-mode verdicts by who decided (classifier, heuristic, beep) and why "
+    "(confident, tie_break, no_speech, over_budget, beep)",
+    ["decided_by", "reason"],
+)
+BEEP_VERDICTS = Counter(
+    "amd_beep_verdicts_total",
+    "Machine verdicts short-circuited by the voicemail beep detector, by source (analysis, stream)",
+    ["source"],
+)
+RULES_FIRED = Counter("amd_rules_fired_total", "Rule tiers that fired during scoring, by rule name", ["rule"])
+REQUESTS = Counter("amd_requests_total", "Analysis requests by endpoint and HTTP status", ["endpoint", "status"])
+DOWNLOAD_BYTES = Counter("amd_download_bytes_total", "Recording bytes downloaded")
+DOWNLOAD_SKIPPED_BYTES = Counter(
+    "amd_download_skipped_bytes_total", "Recording bytes not downloaded because the analysis never reads them"
+)
+DOWNLOAD_RETRIES = Counter(
+    "amd_download_retries_total", "Download attempts retried, by the failed attempt's HTTP status (error = connection)", ["status"]
+)
+COALESCED_REQUESTS = Counter(
+    "amd_coalesced_requests_total", "Requests answered by joining an identical analysis already in flight"
+)
+TRACES_RECORDED = Counter(
+    "amd_traces_recorded_total", "Debug traces recorded, by why the call was traced (requested, sampled)", ["reason"]
+)
+SHADOW_VERDICTS = Counter(
+    "amd_shadow_verdicts_total",
+    "Shadow-variant verdicts, by variant, result and whether they agree with the live verdict",
+    ["variant", "result", "agrees"],
+)
+SHADOW_SECONDS = Histogram(
+    "amd_shadow_seconds",
+    "Seconds a shadow variant took to judge a call on the shared decode",
+    ["variant"],
+    buckets=(0.0001, 0.00025, 0.0005) + LATENCY_BUCKETS,
+)
+SHADOW_SKIPPED = Counter(
+    "amd_shadow_skipped_total", "Calls not shadowed, by reason (beep, busy, unknown_ruleset)", ["reason"]
+)
+IN_FLIGHT = Gauge("amd_in_flight_analyses", "Analyses (download + DSP) currently admitted")
+JOINED_IN_FLIGHT = Gauge(
+    "amd_joined_in_flight_requests", "Requests waiting on an identical analysis in flight (not counted as in flight)"
+)
+ACTIVE_STREAMS = Gauge("amd_active_streams", "Open Media Streams WebSocket sessions")
+ACTIVE_BATCHES = Gauge("amd_active_batches", "Batch requests currently streaming results")
+RULESET_RELOADS = Counter("amd_ruleset_reloads_total", "Rule-set directory reloads, by outcome (ok, error)", ["status"])
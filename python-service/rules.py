@@ -0,0 +1,523 @@
+"""
+Versioned voicemail/human rule sets and their compiled scorers.
+
+A rule set is a JSON file in rulesets/ (see v2-voicemail-enhanced.json):
+every threshold, weight, override and score band the detector uses. Each
+rule is an ordered list of tiers (the old if/elif chain); the first tier
+whose conditions all hold fires. A file is validated and compiled once
+when it is loaded:
+
+* the single-call path becomes one generated Python function that walks
+  the whole table with plain float comparisons (per-call NumPy overhead
+  would dominate at N=1)
+* the batch path keeps (column, operator, threshold) clauses plus per-rule
+  score tables, so an (N_calls x F) matrix is scored in a handful of NumPy
+  operations
+
+RULESETS holds every compiled version in the directory. reload() compiles
+the directory again and swaps the whole set in one assignment, so a call
+keeps the RuleSet object it started with and a broken file never replaces
+a working one. RuleSet objects pickle as their JSON spec and are compiled
+once per process on the receiving side, so a job sent to the process pool
+carries exactly the rules it was admitted with.
+"""
+import hashlib
+import json
+import math
+import operator
+import os
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from features import FEATURE_INDEX, FEATURE_NAMES, as_dict
+
+# Directory of *.json rule sets, and the version used when a request does
+# not pick one. Cached and stored results are attributed to (and keyed by)
+# the version plus a fingerprint of the file contents.
+RULESET_DIR = os.getenv("AMD_RULESET_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "rulesets")
+DEFAULT_RULESET = os.getenv("AMD_RULESET", "v2-voicemail-enhanced")
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+}
+BAND_RESULTS = ("human", "machine", "unknown")
+CONFIDENCE_OF = ("score", "magnitude")
+
+
+class RuleSetError(Exception):
+    """Raised when a rule-set file is missing, malformed or refers to unknown features"""
+
+
+class Tier(NamedTuple):
+    clauses: tuple  # ((feature column, operator symbol, threshold), ...), all must hold
+    score: int
+    indicators: int
+    reason: str
+
+
+class Rule(NamedTuple):
+    name: str
+    tiers: tuple
+
+
+class Band(NamedTuple):
+    result: str
+    condition: tuple  # (operator symbol, threshold) on the final score; () matches anything
+    confidence: dict
+    prefix: str
+    contains: tuple  # keep reasons containing any of these...
+    or_lacks: tuple  # ...or lacking any of these (no filter at all when both are empty)
+    limit: int
+
+
+def _number(value, where: str):
+    # json.load accepts Infinity and NaN; neither is a usable threshold
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise RuleSetError(f"{where}: expected a finite number, got {value!r}")
+    return value
+
+
+def _compile_tier(spec: dict, where: str) -> Tier:
+    clauses = []
+    for clause in spec.get("when") or ():
+        if len(clause) != 3:
+            raise RuleSetError(f"{where}: condition must be [feature, operator, threshold], got {clause!r}")
+        feature, symbol, threshold = clause
+        if feature not in FEATURE_INDEX:
+            raise RuleSetError(f"{where}: unknown feature {feature!r} (known: {', '.join(FEATURE_NAMES)})")
+        if symbol not in OPERATORS:
+            raise RuleSetError(f"{where}: unknown operator {symbol!r}")
+        clauses.append((FEATURE_INDEX[feature], symbol, _number(threshold, where)))
+    if not clauses:
+        raise RuleSetError(f"{where}: a tier needs at least one condition")
+
+    reason = spec.get("reason")
+    if not isinstance(reason, str) or not reason:
+        raise RuleSetError(f"{where}: missing reason")
+    try:
+        reason.format(**dict.fromkeys(FEATURE_NAMES, 0.0))
+    except (KeyError, ValueError, IndexError) as e:
+        raise RuleSetError(f"{where}: bad reason template {reason!r}: {e}")
+
+    return Tier(
+        clauses=tuple(clauses),
+        score=int(_number(spec.get("score"), where)),
+        indicators=int(_number(spec.get("indicators", 0), where)),
+        reason=reason,
+    )
+
+
+def _compile_band(spec: dict, where: str) -> Band:
+    if spec.get("result") not in BAND_RESULTS:
+        raise RuleSetError(f"{where}: result must be one of {BAND_RESULTS}")
+    condition = tuple(spec.get("when") or ())
+    if condition and (len(condition) != 2 or condition[0] not in OPERATORS):
+        raise RuleSetError(f"{where}: condition must be [operator, threshold], got {list(condition)!r}")
+    if condition:
+        _number(condition[1], where)
+
+    confidence = dict(spec.get("confidence") or {})
+    confidence.setdefault("of", "score")
+    if confidence["of"] not in CONFIDENCE_OF:
+        raise RuleSetError(f"{where}: confidence must be computed of {CONFIDENCE_OF}")
+    for key in ("base", "pivot", "slope", "max"):
+        if key in confidence:
+            _number(confidence[key], where)
+    if "base" not in confidence:
+        raise RuleSetError(f"{where}: confidence needs a base")
+
+    keep = spec.get("keep") or {}
+    return Band(
+        result=spec["result"],
+        condition=condition,
+        confidence=confidence,
+        prefix=str(spec.get("prefix", "")),
+        contains=tuple(keep.get("contains", ())),
+        or_lacks=tuple(keep.get("or_lacks", ())),
+        limit=int(_number(spec.get("limit", 3), where)),
+    )
+
+
+def _generate_walk(rules: tuple):
+    """Compile the rule table into one function: feature list -> tier index per rule (-1 for none)"""
+    lines = ["def walk(v):"]
+    for r, rule in enumerate(rules):
+        for t, tier in enumerate(rule.tiers):
+            test = " and ".join(f"v[{i}] {symbol} {threshold!r}" for i, symbol, threshold in tier.clauses)
+            lines.append(f"    {'if' if t == 0 else 'elif'} {test}: r{r} = {t}")
+        lines.append(f"    else: r{r} = -1")
+    lines.append(f"    return ({''.join(f'r{r}, ' for r in range(len(rules)))})")
+    namespace = {}
+    # Only feature indices, whitelisted operators and numbers reach the source
+    exec(compile("\n".join(lines), "<ruleset walk>", "exec"), namespace)
+    return namespace["walk"]
+
+
+class RuleSet:
+    """One compiled rule-set version"""
+
+    def __init__(self, spec: dict, source: str = None):
+        version = spec.get("version")
+        if not isinstance(version, str) or not version:
+            raise RuleSetError(f"{source or 'rule set'}: missing version")
+        self.spec = spec
+        self.source = source
+        self.version = version
+        self.description = spec.get("description", "")
+        self.fingerprint = hashlib.blake2b(
+            json.dumps(spec, sort_keys=True, ensure_ascii=False).encode(), digest_size=6
+        ).hexdigest()
+        self.segment_min_energy = float(_number(spec.get("segment_min_energy", 0.015), f"{version}: segment_min_energy"))
+
+        rules = []
+        for k, rule in enumerate(spec.get("rules") or ()):
+            name = rule.get("name") or f"rule_{k}"
+            tiers = tuple(_compile_tier(tier, f"{version}: {name} tier {t}") for t, tier in enumerate(rule.get("tiers") or ()))
+            if not tiers:
+                raise RuleSetError(f"{version}: rule {name} has no tiers")
+            rules.append(Rule(name, tiers))
+        if not rules:
+            raise RuleSetError(f"{version}: no rules")
+        self.rules = tuple(rules)
+
+        overrides = spec.get("overrides") or {}
+        force = overrides.get("force_machine") or {}
+        reinforce = overrides.get("reinforce") or {}
+        boost = spec.get("machine_boost") or {}
+        self.force_machine = (force.get("min_indicators"), force.get("max_score")) if force else None
+        self.reinforce = (reinforce.get("min_indicators"), reinforce.get("penalty")) if reinforce else None
+        self.machine_boost = (boost.get("min_indicators"), boost.get("add"), boost.get("max")) if boost else None
+        for setting in (self.force_machine, self.reinforce, self.machine_boost):
+            for value in setting or ():
+                _number(value, f"{version}: overrides")
+
+        self.bands = tuple(_compile_band(band, f"{version}: band {b}") for b, band in enumerate(spec.get("bands") or ()))
+        if not self.bands or self.bands[-1].condition:
+            raise RuleSetError(f"{version}: the last band must have no condition (the fallback)")
+        self.band_results = np.array([band.result for band in self.bands])
+
+        self._walk = _generate_walk(self.rules)
+        # Per-rule lookup tables; the trailing 0 is what a rule contributes when no tier fires
+        self._tier_scores = [np.array([t.score for t in rule.tiers] + [0], dtype=np.int64) for rule in self.rules]
+        self._tier_indicators = [np.array([t.indicators for t in rule.tiers] + [0], dtype=np.int64) for rule in self.rules]
+
+        # Score one call through both paths before anybody can be handed this
+        # set: whatever the generated walk or the bands cannot evaluate fails
+        # the load (and a reload) instead of every request that uses it
+        try:
+            self.score_features(np.zeros(len(FEATURE_NAMES)))
+            self.score_batch(np.zeros((1, len(FEATURE_NAMES))))
+        except Exception as e:
+            raise RuleSetError(f"{version}: rule set does not evaluate: {e!r}")
+
+    def __repr__(self):
+        return f"RuleSet({self.version!r}, fingerprint={self.fingerprint!r})"
+
+    def __reduce__(self):
+        return (_restore, (self.spec, self.source, self.fingerprint))
+
+    @property
+    def cache_key(self) -> str:
+        """Version plus content fingerprint, so editing a file in place never serves stale results"""
+        return f"{self.version}#{self.fingerprint}"
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "description": self.description,
+            "source": self.source,
+            "rules": len(self.rules),
+            "tiers": sum(len(rule.tiers) for rule in self.rules),
+        }
+
+    def score_batch(self, X: np.ndarray) -> dict:
+        """Score an (N, F) feature matrix.
+
+        Returns arrays of length N: ``result``, ``confidence``, ``score``,
+        ``voicemail_indicators``, ``band`` (index into ``bands``) and
+        ``fired``, an (N, len(rules)) matrix of the tier index each rule fired
+        (-1 for none).
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        n = X.shape[0]
+
+        fired = np.empty((n, len(self.rules)), dtype=np.int64)
+        score = np.zeros(n, dtype=np.int64)
+        indicators = np.zeros(n, dtype=np.int64)
+        for r, rule in enumerate(self.rules):
+            # Walk tiers last-to-first so the earliest matching tier wins (if/elif order)
+            tier_index = np.full(n, -1, dtype=np.int64)
+            for t in range(len(rule.tiers) - 1, -1, -1):
+                holds = np.ones(n, dtype=bool)
+                for column, symbol, threshold in rule.tiers[t].clauses:
+                    holds &= OPERATORS[symbol](X[:, column], threshold)
+                tier_index = np.where(holds, t, tier_index)
+            fired[:, r] = tier_index
+            score += self._tier_scores[r][tier_index]
+            indicators += self._tier_indicators[r][tier_index]
+
+        decision = self.decide(score, indicators)
+        decision["fired"] = fired
+        return decision
+
+    def decide(self, score: np.ndarray, indicators: np.ndarray) -> dict:
+        """Overrides, score bands and confidence for arrays of raw scores"""
+        n = len(score)
+
+        # ========== OVERRIDE LOGIC ==========
+
+        # Enough strong voicemail indicators force a machine score
+        if self.force_machine:
+            min_indicators, max_score = self.force_machine
+            score = np.where(indicators >= min_indicators, np.minimum(score, max_score), score)
+        # Negative score with voicemail indicators gets reinforced
+        if self.reinforce:
+            min_indicators, penalty = self.reinforce
+            score = np.where((score < 0) & (indicators >= min_indicators), score - penalty, score)
+
+        # ====== FINAL DECISION ======
+
+        magnitude = np.abs(score)
+        fallback = len(self.bands) - 1
+        band = np.full(n, fallback, dtype=np.int64)
+        confidence = np.full(n, self.bands[fallback].confidence["base"])
+        for b in range(fallback - 1, -1, -1):
+            spec = self.bands[b]
+            symbol, threshold = spec.condition
+            holds = OPERATORS[symbol](score, threshold)
+            band = np.where(holds, b, band)
+            confidence = np.where(holds, _band_confidence(spec.confidence, score, magnitude), confidence)
+
+        result = self.band_results[band]
+        if self.machine_boost:
+            min_indicators, add, cap = self.machine_boost
+            confidence = np.where(
+                (result == "machine") & (indicators >= min_indicators), np.minimum(cap, confidence + add), confidence
+            )
+
+        return {
+            "result": result,
+            "confidence": confidence,
+            "score": score,
+            "voicemail_indicators": indicators,
+            "band": band,
+        }
+
+    def _decide_one(self, score: int, indicators: int) -> tuple:
+        """``decide`` for one call with Python numbers: (score, band index, confidence).
+
+        Same operations in the same order as the array version, so the
+        confidence is bit-identical.
+        """
+        if self.force_machine and indicators >= self.force_machine[0]:
+            score = min(score, self.force_machine[1])
+        if self.reinforce and score < 0 and indicators >= self.reinforce[0]:
+            score -= self.reinforce[1]
+
+        fallback = len(self.bands) - 1
+        b = next((b for b in range(fallback) if OPERATORS[self.bands[b].condition[0]](score, self.bands[b].condition[1])), fallback)
+        spec = self.bands[b].confidence
+        x = abs(score) if spec["of"] == "magnitude" else score
+        confidence = spec["base"] + (x - spec.get("pivot", 0)) * spec["slope"] if "slope" in spec else spec["base"]
+        if "max" in spec:
+            confidence = min(spec["max"], confidence)
+
+        if self.machine_boost and self.bands[b].result == "machine" and indicators >= self.machine_boost[0]:
+            confidence = min(self.machine_boost[2], confidence + self.machine_boost[1])
+        return score, b, float(confidence)
+
+    def score_features(self, features: np.ndarray) -> dict:
+        """Score a single feature vector, including human-readable reasons.
+
+        The table is walked by the generated function and decided by
+        ``_decide_one``, the scalar twin of ``decide``.
+        """
+        tiers = self._walk(features.tolist())
+        values = None
+        score = 0
+        indicators = 0
+        reasons = []
+        fired = []
+        for rule, t in zip(self.rules, tiers):
+            if t < 0:
+                continue
+            tier = rule.tiers[t]
+            score += tier.score
+            indicators += tier.indicators
+            if values is None:
+                values = as_dict(features)
+            reasons.append(tier.reason.format(**values))
+            fired.append(rule.name)
+
+        score, b, confidence = self._decide_one(score, indicators)
+        band = self.bands[b]
+        return {
+            "result": band.result,
+            "confidence": confidence,
+            "reasoning": band.prefix + "; ".join([r for r in reasons if _keep(band, r)][:band.limit]),
+            "score": score,
+            "voicemail_indicators": indicators,
+            "reasons": reasons,
+            "rules_fired": fired,
+        }
+
+    def explain(self, features: np.ndarray) -> dict:
+        """Every rule's contribution to the score of one feature vector (debug traces).
+
+        ``rules`` lists each rule with the tier that fired (None when none
+        did) and what it added; ``raw_score`` is their sum before the
+        overrides turn it into ``score``, whose ``band`` gives the result.
+        """
+        values = as_dict(features)
+        contributions = []
+        raw_score = 0
+        indicators = 0
+        for rule, t in zip(self.rules, self._walk(features.tolist())):
+            if t < 0:
+                contributions.append({"rule": rule.name, "tier": None, "score": 0, "indicators": 0})
+                continue
+            tier = rule.tiers[t]
+            raw_score += tier.score
+            indicators += tier.indicators
+            contributions.append({
+                "rule": rule.name,
+                "tier": t,
+                "score": tier.score,
+                "indicators": tier.indicators,
+                "reason": tier.reason.format(**values),
+            })
+
+        score, b, confidence = self._decide_one(raw_score, indicators)
+        return {
+            "rules": contributions,
+            "raw_score": raw_score,
+            "score": score,
+            "voicemail_indicators": indicators,
+            "band": b,
+            "result": self.bands[b].result,
+            "confidence": confidence,
+        }
+
+
+def _band_confidence(confidence: dict, score: np.ndarray, magnitude: np.ndarray) -> np.ndarray:
+    """``base + (x - pivot) * slope``, capped at ``max``; x is the score or its magnitude"""
+    x = magnitude if confidence["of"] == "magnitude" else score
+    if "slope" in confidence:
+        value = confidence["base"] + (x - confidence.get("pivot", 0)) * confidence["slope"]
+    else:
+        value = np.full(len(x), confidence["base"])
+    if "max" in confidence:
+        value = np.minimum(confidence["max"], value)
+    return value
+
+
+def _keep(band: Band, reason: str) -> bool:
+    if not band.contains and not band.or_lacks:
+        return True
+    return any(s in reason for s in band.contains) or any(s not in reason for s in band.or_lacks)
+
+
+# Compiled rule sets received from another process, by fingerprint
+_restored = {}
+_RESTORED_MAX = 16
+
+
+def _restore(spec: dict, source: str, fingerprint: str) -> RuleSet:
+    ruleset = _restored.get(fingerprint)
+    if ruleset is None:
+        loaded = RULESETS.current()
+        ruleset = next((rs for rs in loaded.values() if rs.fingerprint == fingerprint), None) or RuleSet(spec, source)
+        if len(_restored) >= _RESTORED_MAX:
+            _restored.pop(next(iter(_restored)))
+        _restored[fingerprint] = ruleset
+    return ruleset
+
+
+def load_ruleset(path: str) -> RuleSet:
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuleSetError(f"{path}: {e}")
+    if not isinstance(spec, dict):
+        raise RuleSetError(f"{path}: expected a JSON object")
+    return RuleSet(spec, source=os.path.basename(path))
+
+
+class RuleSetRegistry:
+    """Every rule-set version in a directory, replaced as a whole on reload"""
+
+    def __init__(self, directory: str, default: str):
+        self.directory = directory
+        self.default = default
+        self.loaded_at = None
+        self.reloads = 0
+        self._rulesets = {}
+        self._lock = threading.Lock()
+
+    def reload(self) -> dict:
+        """Compile every *.json in the directory, then swap them in.
+
+        Raises RuleSetError (leaving the current set untouched) if any file
+        fails to compile, two files claim the same version, or the default
+        version is missing.
+        """
+        with self._lock:
+            try:
+                names = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+            except OSError as e:
+                raise RuleSetError(f"{self.directory}: {e}")
+            rulesets = {}
+            for name in names:
+                ruleset = load_ruleset(os.path.join(self.directory, name))
+                if ruleset.version in rulesets:
+                    raise RuleSetError(
+                        f"{name}: version {ruleset.version!r} already defined by {rulesets[ruleset.version].source}"
+                    )
+                rulesets[ruleset.version] = ruleset
+            if self.default not in rulesets:
+                raise RuleSetError(f"default rule set {self.default!r} not found in {self.directory}")
+
+            self._rulesets = rulesets
+            self.loaded_at = time.time()
+            self.reloads += 1
+            return rulesets
+
+    def current(self) -> dict:
+        return self._rulesets
+
+    def get(self, version: str = None) -> RuleSet:
+        """The compiled rule set for ``version`` (default: the default version); KeyError if unknown"""
+        rulesets = self._rulesets
+        if not rulesets:
+            rulesets = self.reload()
+        return rulesets[version or self.default]
+
+    def describe(self) -> dict:
+        return {
+            "default": self.default,
+            "directory": self.directory,
+            "loaded_at": self.loaded_at,
+            "versions": {version: rs.describe() for version, rs in self.current().items()},
+        }
+
+
+RULESETS = RuleSetRegistry(RULESET_DIR, DEFAULT_RULESET)
+
+
+def score_batch(X: np.ndarray, ruleset: RuleSet = None) -> dict:
+    """Score an (N, F) feature matrix with ``ruleset`` (default: the default version)"""
+    return (ruleset or RULESETS.get()).score_batch(X)
+
+
+def score_features(features: np.ndarray, ruleset: RuleSet = None) -> dict:
+    """Score one feature vector with ``ruleset`` (default: the default version)"""
+    return (ruleset or RULESETS.get()).score_features(features)
@@ -0,0 +1,127 @@
+"""
+State the web workers share through a directory (AMD_STATE_DIR, see main.serve).
+
+With several uvicorn workers the request that writes some state and the one
+that reads it back can land on different workers, so that state cannot live
+in one worker's memory:
+
+* RecentStore keeps the last values by key (debug traces, streaming
+  verdicts). In a directory every value is a JSON file named after a hash of
+  its key, so whichever worker gets the GET reads the latest one; each worker
+  bounds the files it wrote itself. File I/O runs on one thread per store, in
+  order, off the event loop.
+* ReloadMarker is a file a worker replaces after reloading its rule sets;
+  the others see it change (one stat per request) and reload theirs, so a
+  POST /rules/reload or SIGHUP on one worker reaches them all.
+
+Without a directory (a single worker) values stay in memory.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RecentStore:
+    """The last ``max_entries`` values put by this worker, by key; JSON-serializable values only"""
+
+    def __init__(self, max_entries: int, directory: str = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        # Keys in put order; in memory the values, in a directory nothing
+        self._entries = OrderedDict()
+        self._io = None
+        # Inode of the file this worker last wrote for a key (I/O thread only)
+        self._written = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="amd-state")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, key: str, value: dict):
+        if self._io is None:
+            self._entries[key] = value
+        else:
+            self._entries[key] = None
+            self._io.submit(self._write, key, json.dumps(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            if self._io is not None:
+                self._io.submit(self._remove, evicted)
+
+    async def get(self, key: str):
+        """The latest value put for ``key`` by any worker, or None"""
+        if self._io is None:
+            return self._entries.get(key)
+        return await asyncio.get_running_loop().run_in_executor(self._io, self._read, key)
+
+    def close(self):
+        if self._io is not None:
+            self._io.shutdown(wait=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + ".json")
+
+    def _write(self, key: str, data: str):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+            self._written[key] = os.fstat(f.fileno()).st_ino
+        os.replace(tmp, path)
+
+    def _remove(self, key: str):
+        # Only our own file: another worker may have written the key since
+        inode = self._written.pop(key, None)
+        path = self._path(key)
+        try:
+            if os.stat(path).st_ino == inode:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _read(self, key: str):
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+class ReloadMarker:
+    """A file whose replacement tells every worker watching it to reload"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._seen = _stamp(path)
+
+    def changed(self) -> bool:
+        """Whether another worker signalled since the last call (then it reports False until the next signal)"""
+        stamp = _stamp(self.path)
+        if stamp == self._seen:
+            return False
+        self._seen = stamp
+        return True
+
+    def signal(self):
+        """Tell the other workers; this one already has what they will reload"""
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(f"{os.getpid()}\n")
+        # The rename keeps inode and mtime: seen before it is visible
+        self._seen = _stamp(tmp)
+        os.replace(tmp, self.path)
+
+
+def _stamp(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
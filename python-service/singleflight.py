@@ -0,0 +1,64 @@
+"""
+Single-flight coalescing of concurrent identical calls.
+
+The recording webhook and a dashboard re-check often ask for the same call
+at the same moment; the result cache cannot help because neither has
+finished yet. SingleFlight runs the first caller's coroutine as a task of
+its own and lets every identical caller that arrives while it runs await
+that same task, so the recording is downloaded and decoded once and every
+caller gets the same response (or the same error).
+
+The task is shielded from its callers: one caller going away (a client
+disconnect cancels its request) does not cancel the work the others are
+waiting for. Only when the last caller has gone is the task cancelled, and
+it is dropped from the table at that moment, so a caller arriving later
+starts a fresh computation instead of joining a cancelled one.
+"""
+import asyncio
+
+
+class _Flight:
+    __slots__ = ("task", "callers")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.callers = 0
+
+
+class SingleFlight:
+    """Table of in-flight computations by key; all callers of a key share one task"""
+
+    def __init__(self):
+        self._flights = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    def __contains__(self, key) -> bool:
+        """Whether a call for ``key`` now would join a computation already in flight"""
+        return key in self._flights
+
+    async def run(self, key, start):
+        """Await the computation for ``key``, starting it with ``start()`` if none is in flight.
+
+        ``start`` is a no-argument callable returning the coroutine; its
+        result (or exception) is every caller's.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(start()))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+
+        flight.callers += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.callers -= 1
+            if flight.callers == 0 and not flight.task.done():
+                # Every caller went away: nobody wants the result any more
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,169 @@
+"""
+Real-time AMD over Twilio Media Streams.
+
+Twilio sends 20 ms frames of base64 8 kHz u-law. Each frame costs O(frame)
+work: one table lookup decode and one dot product for its energy, which
+feeds an incremental VAD (vad.StreamingVAD) that opens/closes speech
+segments. The rule engine from detector.py is re-run on the (small) list of
+segments only every few frames, and a verdict is emitted as soon as it is confident enough.
+A voicemail beep (beep.BeepDetector, fed 100 ms of audio at a time)
+decides ``machine`` as soon as the tone ends, whatever the rules say.
+"""
+import base64
+
+import numpy as np
+
+from beep import BeepDetector
+from decoder import MULAW_TABLE
+from detector import BEEP_MIN_CONFIDENCE, score_answer_segments
+from rules import RULESETS, RuleSet
+from vad import StreamingVAD
+
+STREAM_SAMPLE_RATE = 8000
+# Audio handed to the beep detector at once; a beep verdict comes at most
+# this (plus one beep.FRAME_SECONDS frame) late after the tone ends
+BEEP_CHUNK_SAMPLES = STREAM_SAMPLE_RATE // 10
+
+
+class StreamingDetector:
+    """Per-call incremental VAD state and early-decision logic"""
+
+    def __init__(
+        self,
+        skip_seconds: float = 0.0,
+        confidence_threshold: float = 0.85,
+        min_listen_seconds: float = 1.5,
+        decision_deadline: float = 4.0,
+        no_speech_timeout: float = 8.0,
+        top_db: float = 30.0,
+        min_energy: float = None,
+        min_frame_rms: float = 0.005,
+        hangover_ms: int = 200,
+        evaluate_every_ms: int = 200,
+        vad_threshold: str = "relative",
+        ruleset: RuleSet = None,
+        beep: bool = True,
+    ):
+        # The session keeps the rule set it started with across reloads
+        self.ruleset = ruleset or RULESETS.get()
+        self.skip_seconds = skip_seconds
+        self.confidence_threshold = confidence_threshold
+        self.min_listen_seconds = min_listen_seconds
+        self.decision_deadline = decision_deadline
+        self.no_speech_timeout = no_speech_timeout
+        self.evaluate_every_ms = evaluate_every_ms
+
+        # Same criterion as librosa.effects.split(top_db=30) by default, but
+        # relative to the loudest frame heard so far instead of the whole
+        # recording. The absolute floor keeps line hiss from counting before
+        # anyone speaks.
+        self.vad = StreamingVAD(
+            sample_rate=STREAM_SAMPLE_RATE,
+            threshold=vad_threshold,
+            top_db=top_db,
+            min_frame_rms=min_frame_rms,
+            min_energy=self.ruleset.segment_min_energy if min_energy is None else min_energy,
+            hangover_ms=hangover_ms,
+        )
+        self.beeps = BeepDetector(
+            STREAM_SAMPLE_RATE, start_sample=int(skip_seconds * STREAM_SAMPLE_RATE), min_confidence=BEEP_MIN_CONFIDENCE,
+        ) if beep else None
+        self._beep_chunk = []
+        self._beep_chunk_samples = 0
+        self.frames_seen = 0
+        self.verdict = None
+
+    @property
+    def elapsed(self) -> float:
+        return self.vad.elapsed
+
+    def push_payload(self, payload_b64: str):
+        """Feed one Twilio ``media.payload``; returns a verdict dict once decided"""
+        return self.push_samples(MULAW_TABLE[np.frombuffer(base64.b64decode(payload_b64), dtype=np.uint8)])
+
+    def push_samples(self, frame: np.ndarray):
+        """Feed one decoded frame of float32 samples"""
+        if self.verdict is not None or len(frame) == 0:
+            return None
+
+        self.frames_seen += 1
+        frame_ms = 1000.0 * len(frame) / STREAM_SAMPLE_RATE
+
+        if self.vad.elapsed >= self.skip_seconds:
+            self.vad.push(frame)
+        else:
+            self.vad.skip(len(frame))
+
+        if self.beeps is not None:
+            found = self._push_beep(frame)
+            if found is not None:
+                return self._decide({
+                    "result": "machine",
+                    "confidence": round(min(0.99, found.confidence), 2),
+                    "reasoning": f"Voicemail beep: {found.frequency:.0f} Hz tone at {found.start:.2f}s "
+                                 f"for {found.end - found.start:.2f}s",
+                    "beep_time": round(found.end, 3),
+                })
+
+        return self._maybe_decide(frame_ms)
+
+    def _push_beep(self, frame: np.ndarray):
+        self._beep_chunk.append(frame)
+        self._beep_chunk_samples += len(frame)
+        if self._beep_chunk_samples < BEEP_CHUNK_SAMPLES:
+            return None
+        chunk = np.concatenate(self._beep_chunk)
+        self._beep_chunk, self._beep_chunk_samples = [], 0
+        return self.beeps.push(chunk)
+
+    # ====== EARLY DECISION ======
+
+    def _maybe_decide(self, frame_ms: float):
+        # Clock for the decision starts once the skipped lead-in is over
+        now = self.elapsed
+        since_answer = now - self.skip_seconds
+        evaluate_every = max(1, int(self.evaluate_every_ms // frame_ms))
+
+        if self.vad.first_speech_time is None:
+            if since_answer >= self.no_speech_timeout:
+                return self._decide({
+                    "result": "unknown",
+                    "confidence": 0.65,
+                    "reasoning": f"No speech detected in first {self.no_speech_timeout:.0f}s of stream",
+                })
+            return None
+
+        past_deadline = since_answer >= self.decision_deadline
+        listened = now - self.vad.first_speech_time
+        if not past_deadline and (listened < self.min_listen_seconds or self.frames_seen % evaluate_every):
+            return None
+
+        segments = self.vad.current_segments()
+        if not segments:
+            # Only sub-threshold blips so far; keep listening until the no-speech timeout
+            if since_answer >= self.no_speech_timeout:
+                return self._decide({
+                    "result": "unknown",
+                    "confidence": 0.65,
+                    "reasoning": "Only low-energy noise detected in stream",
+                })
+            return None
+
+        verdict = score_answer_segments(segments, answer_end=now, ruleset=self.ruleset)
+        confident = verdict["result"] != "unknown" and verdict["confidence"] >= self.confidence_threshold
+        if confident or past_deadline:
+            return self._decide(verdict)
+        return None
+
+    def _decide(self, verdict: dict) -> dict:
+        self.verdict = {
+            "result": verdict["result"],
+            "confidence": float(verdict["confidence"]),
+            "reasoning": verdict["reasoning"],
+            "decision_time_ms": int(self.elapsed * 1000),
+            "segments": len(self.vad.segments) + self.vad.in_speech,
+            "ruleset": self.ruleset.version,
+        }
+        if "beep_time" in verdict:
+            self.verdict["beep_time"] = verdict["beep_time"]
+        return self.verdict
@@ -0,0 +1,315 @@
+"""
+Single-pass frame-energy voice activity detection.
+
+Replaces ``librosa.effects.split`` plus the per-segment RMS loop. One
+float64 prefix sum of squared samples gives every frame energy (strided
+views into it, no overlapping-frame copies) and every segment energy (two
+lookups per segment), so the signal is squared exactly once. BlockVAD
+computes it block by block and keeps only the boundary values, so long
+recordings are segmented in bounded memory.
+
+The speech/silence threshold is pluggable:
+
+* ``relative`` - within ``top_db`` of the loudest frame; matches
+  librosa.effects.split and is the default.
+* ``absolute`` - above a fixed ``absolute_db`` dBFS level, so loud and quiet
+  lines are judged on the same scale.
+* ``adaptive`` - ``margin_db`` above an estimated noise floor (a low
+  percentile of frame power), robust to line hiss and gain differences.
+
+StreamingVAD applies the same criteria frame by frame for live audio.
+"""
+import math
+
+import numpy as np
+
+THRESHOLD_MODES = ("relative", "absolute", "adaptive")
+
+# librosa's amplitude_to_db floor (amin=1e-5, squared)
+POWER_FLOOR = 1e-10
+
+
+def _power_threshold(frame_power: np.ndarray, mode: str, top_db: float, absolute_db: float,
+                     margin_db: float, noise_percentile: float) -> float:
+    if mode == "relative":
+        return max(float(frame_power.max()), POWER_FLOOR) * 10 ** (-top_db / 10)
+    if mode == "absolute":
+        return 10 ** (absolute_db / 10)
+    if mode == "adaptive":
+        noise_floor = max(float(np.percentile(frame_power, noise_percentile)), POWER_FLOOR)
+        return noise_floor * 10 ** (margin_db / 10)
+    raise ValueError(f"Unknown VAD threshold mode {mode!r}, expected one of {THRESHOLD_MODES}")
+
+
+def detect_speech(
+    audio: np.ndarray,
+    sample_rate: int,
+    frame_seconds: float = 2048 / 16000,
+    hop_seconds: float = 512 / 16000,
+    threshold: str = "relative",
+    top_db: float = 30.0,
+    absolute_db: float = -40.0,
+    margin_db: float = 15.0,
+    noise_percentile: float = 10.0,
+):
+    """Find non-silent intervals and their RMS energy in one pass.
+
+    Framing defaults to librosa's 2048/512 samples at 16 kHz (frames centred
+    with zero padding, like librosa.feature.rms) expressed in seconds so the
+    result does not depend on the sample rate.
+
+    Returns ``(intervals, energies)``: an int64 (k, 2) array of
+    ``[start_sample, end_sample)`` pairs and a float64 (k,) array of the RMS
+    of each interval.
+    """
+    vad = BlockVAD(sample_rate, frame_seconds, hop_seconds, threshold, top_db, absolute_db, margin_db, noise_percentile)
+    vad.push(audio)
+    return vad.finish()
+
+
+class BlockVAD:
+    """detect_speech fed one block at a time, in memory independent of the signal length.
+
+    The prefix sum of squares is carried across blocks (the running total is
+    prepended to each block before the cumulative sum, so every value is
+    bit-identical to one cumsum over the whole signal), but only its values
+    at frame and segment boundaries are kept: a few floats per hop instead
+    of one per sample. ``finish`` then applies exactly the detect_speech
+    thresholds and edge logic.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        frame_seconds: float = 2048 / 16000,
+        hop_seconds: float = 512 / 16000,
+        threshold: str = "relative",
+        top_db: float = 30.0,
+        absolute_db: float = -40.0,
+        margin_db: float = 15.0,
+        noise_percentile: float = 10.0,
+    ):
+        self.frame_length = int(round(frame_seconds * sample_rate))
+        self.hop_length = int(round(hop_seconds * sample_rate))
+        self.pad = self.frame_length // 2
+        self.threshold = (threshold, top_db, absolute_db, margin_db, noise_percentile)
+
+        self.n = 0
+        self._total = 0.0
+        # Positions (in the zero-padded signal) the prefix sum is kept at:
+        # frame starts, frame ends and segment boundaries, one residue each
+        self._residues = sorted({0, self.frame_length % self.hop_length, self.pad % self.hop_length})
+        self._kept = {r: [] for r in self._residues}
+
+    def push(self, block: np.ndarray):
+        m = len(block)
+        if m == 0:
+            return
+        running = np.empty(m + 1, dtype=np.float64)
+        running[0] = self._total
+        np.square(block, dtype=np.float64, out=running[1:])
+        np.cumsum(running, out=running)
+
+        # running[i] is the prefix sum at padded position pad + n + i
+        lo = self.pad + self.n + 1
+        hi = self.pad + self.n + m
+        for r in self._residues:
+            first = lo + (r - lo) % self.hop_length
+            if first <= hi:
+                self._kept[r].append(running[first - lo + 1:hi - lo + 2:self.hop_length].copy())
+
+        self._total = float(running[-1])
+        self.n += m
+
+    def _table(self, r: int) -> np.ndarray:
+        """Prefix sum at padded positions r, r + hop, r + 2*hop, ... up to the padded end"""
+        length = self.n + 2 * self.pad
+        positions = np.arange(r, length + 1, self.hop_length)
+        table = np.zeros(len(positions), dtype=np.float64)
+        inside = (positions > self.pad) & (positions <= self.pad + self.n)
+        if self._kept[r]:
+            table[inside] = np.concatenate(self._kept[r])
+        table[positions > self.pad + self.n] = self._total
+        return table
+
+    def _squares_at(self, positions: np.ndarray, tables: dict) -> np.ndarray:
+        values = np.full(len(positions), self._total)
+        inside = positions < self.pad + self.n
+        residues = positions % self.hop_length
+        for r, table in tables.items():
+            hit = inside & (residues == r)
+            values[hit] = table[(positions[hit] - r) // self.hop_length]
+        return values
+
+    def finish(self):
+        """``(intervals, energies)`` for everything pushed, as detect_speech returns them"""
+        n, pad, frame_length, hop_length = self.n, self.pad, self.frame_length, self.hop_length
+
+        empty = (np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.float64))
+        if n + 2 * pad < frame_length:
+            return empty
+
+        tables = {r: self._table(r) for r in self._residues}
+        n_frames = 1 + (n + 2 * pad - frame_length) // hop_length
+        end_residue = frame_length % hop_length
+        frame_ends = tables[end_residue][(frame_length - end_residue) // hop_length:][:n_frames]
+        frame_starts = tables[0][:n_frames]
+        frame_power = np.maximum(frame_ends - frame_starts, 0.0) / frame_length
+
+        power_threshold = _power_threshold(frame_power, *self.threshold)
+        non_silent = np.maximum(frame_power, POWER_FLOOR) > power_threshold
+        if not non_silent.any():
+            return empty
+
+        # Frame-level run boundaries -> sample boundaries (same as librosa.effects.split)
+        edges = np.flatnonzero(np.diff(non_silent.astype(np.int8))) + 1
+        if non_silent[0]:
+            edges = np.concatenate(([0], edges))
+        if non_silent[-1]:
+            edges = np.concatenate((edges, [n_frames]))
+        intervals = np.minimum(edges * hop_length, n).reshape(-1, 2).astype(np.int64)
+
+        # Segment energies from the same prefix sums (offset by the padding)
+        seg_sum = self._squares_at(intervals[:, 1] + pad, tables) - self._squares_at(intervals[:, 0] + pad, tables)
+        seg_len = np.maximum(intervals[:, 1] - intervals[:, 0], 1)
+        energies = np.sqrt(np.maximum(seg_sum, 0.0) / seg_len)
+
+        return intervals, energies
+
+
+class StreamingVAD:
+    """Incremental frame-by-frame VAD producing the same segment dicts as the batch path.
+
+    ``relative`` compares against the loudest frame heard so far, ``adaptive``
+    against a running noise floor, ``absolute`` against a fixed dBFS level.
+    ``min_frame_rms`` keeps line hiss from opening a segment before anyone
+    speaks; segments close after ``hangover_ms`` of silence and are kept only
+    if their RMS exceeds ``min_energy``.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 8000,
+        threshold: str = "relative",
+        top_db: float = 30.0,
+        absolute_db: float = -40.0,
+        margin_db: float = 15.0,
+        min_frame_rms: float = 0.005,
+        min_energy: float = 0.015,
+        hangover_ms: float = 200,
+        noise_adapt: float = 0.05,
+    ):
+        if threshold not in THRESHOLD_MODES:
+            raise ValueError(f"Unknown VAD threshold mode {threshold!r}, expected one of {THRESHOLD_MODES}")
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.top_db = top_db
+        self.absolute_db = absolute_db
+        self.margin_db = margin_db
+        self.min_frame_rms = min_frame_rms
+        self.min_energy = min_energy
+        self.hangover_ms = hangover_ms
+        self.noise_adapt = noise_adapt
+
+        self.samples_seen = 0
+        self.peak_rms = 0.0
+        self.noise_power = None
+        self.segments = []
+        self.first_speech_time = None
+
+        # Open segment state
+        self._open_start = None
+        self._open_sum_sq = 0.0
+        self._open_samples = 0
+        self._silent_ms = 0.0
+        self._last_speech_end = None
+
+    @property
+    def elapsed(self) -> float:
+        return self.samples_seen / self.sample_rate
+
+    @property
+    def in_speech(self) -> bool:
+        return self._open_start is not None
+
+    def _is_speech(self, rms: float, power: float) -> bool:
+        if rms <= self.min_frame_rms:
+            return False
+        if self.threshold == "relative":
+            return 20 * math.log10(rms / self.peak_rms) > -self.top_db
+        if self.threshold == "absolute":
+            return 10 * math.log10(power) > self.absolute_db
+        # adaptive: compare against the noise floor learnt from non-speech frames
+        if self.noise_power is None:
+            return False
+        return 10 * math.log10(power / self.noise_power) > self.margin_db
+
+    def skip(self, n_samples: int):
+        """Advance the clock past audio that should not be analysed (e.g. a lead-in)"""
+        self.samples_seen += n_samples
+
+    def push(self, frame: np.ndarray) -> bool:
+        """Consume one frame of float samples; returns whether it was speech"""
+        n = len(frame)
+        if n == 0:
+            return False
+        frame_start = self.elapsed
+        self.samples_seen += n
+        frame_ms = 1000.0 * n / self.sample_rate
+
+        sum_sq = float(np.dot(frame, frame))
+        power = max(sum_sq / n, POWER_FLOOR)
+        rms = math.sqrt(sum_sq / n)
+        self.peak_rms = max(self.peak_rms, rms)
+
+        is_speech = self._is_speech(rms, power)
+
+        if not is_speech:
+            # Track the line's noise floor with a slow EMA (seeded by the first frame)
+            if self.noise_power is None:
+                self.noise_power = power
+            else:
+                self.noise_power += self.noise_adapt * (power - self.noise_power)
+
+        if is_speech:
+            if self._open_start is None:
+                self._open_start = frame_start
+                self._open_sum_sq = 0.0
+                self._open_samples = 0
+                if self.first_speech_time is None:
+                    self.first_speech_time = frame_start
+            self._open_sum_sq += sum_sq
+            self._open_samples += n
+            self._silent_ms = 0.0
+            self._last_speech_end = self.elapsed
+        elif self._open_start is not None:
+            self._silent_ms += frame_ms
+            if self._silent_ms >= self.hangover_ms:
+                self._close_segment()
+
+        return is_speech
+
+    def _segment(self, end_time: float) -> dict:
+        return {
+            'index': len(self.segments),
+            'start_time': self._open_start,
+            'end_time': end_time,
+            'duration': end_time - self._open_start,
+            'energy': math.sqrt(self._open_sum_sq / self._open_samples),
+        }
+
+    def _close_segment(self):
+        seg = self._segment(self._last_speech_end)
+        self._open_start = None
+        # Quiet blips are line noise, not speech (same floor as analyze_audio)
+        if seg['energy'] > self.min_energy:
+            self.segments.append(seg)
+
+    def current_segments(self) -> list:
+        """Closed segments plus the still-open one, provisionally"""
+        segments = list(self.segments)
+        if self._open_start is not None:
+            seg = self._segment(self._last_speech_end)
+            if seg['energy'] > self.min_energy:
+                segments.append(seg)
+        return segments